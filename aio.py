@@ -0,0 +1,273 @@
+"""ASGI application: the read-heavy views on an event loop, everything else on the WSGI app.
+
+Requests for an endpoint with an async twin (api.ASYNC_VIEWS, app.ASYNC_VIEWS) run as a coroutine
+inside an ordinary Flask request context: before/after_request hooks, sessions, templates, error
+handlers and signals all behave as under WSGI, and while the view waits on the database through
+aiodb it holds no thread. Every other request is passed to the Flask WSGI app on a bounded thread
+pool, so writes, logins, imports and exports keep their sync code.
+
+Session stores, the throttle, the catalog cache and the in-memory indexes keep their sync clients.
+Calls that may wait on redis or the disk are made on threads: the session is opened and the
+before/after_request hooks run with asyncio.to_thread, and the catalog cache moves its calls off the
+loop unless its backend is in-process.
+"""
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import request, request_started
+from flask.ctx import RequestContext
+from werkzeug.exceptions import HTTPException
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+import aiodb
+
+
+def build_environ(scope):
+    root_path = scope.get('root_path', '')
+    path = scope['path']
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': root_path.encode('utf-8').decode('latin-1'),
+        'PATH_INFO': path.encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(),
+        # the body may come without Content-Length (chunked), so it is read up to its end
+        'wsgi.input_terminated': True,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', ()):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        if name in environ:
+            value = environ[name] + ('; ' if name == 'HTTP_COOKIE' else ',') + value
+        environ[name] = value
+    return environ
+
+
+def _response_start(status, headers):
+    return {
+        'type': 'http.response.start',
+        'status': int(status.split(' ', 1)[0]),
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+    }
+
+
+class RequestBody(io.RawIOBase):
+    """wsgi.input for a view running on a pool thread, pulling the body from the event loop as it is read."""
+
+    def __init__(self, receive, loop):
+        self._receive = receive
+        self._loop = loop
+        self._buffer = b''
+        self._more = True
+
+    def readable(self):
+        return True
+
+    def _fill(self):
+        message = asyncio.run_coroutine_threadsafe(self._receive(), self._loop).result()
+        if message['type'] == 'http.request':
+            self._buffer += message.get('body', b'')
+            self._more = message.get('more_body', False)
+        else:
+            self._more = False
+
+    def read(self, size=-1):
+        while self._more and (size is None or size < 0 or len(self._buffer) < size):
+            self._fill()
+        if size is None or size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def readinto(self, target):
+        data = self.read(len(target))
+        target[:len(data)] = data
+        return len(data)
+
+    def readline(self, size=-1):
+        while self._more and b'\n' not in self._buffer and (size is None or size < 0 or len(self._buffer) < size):
+            self._fill()
+        end = self._buffer.find(b'\n') + 1 or len(self._buffer)
+        if size is not None and size >= 0:
+            end = min(end, size)
+        data, self._buffer = self._buffer[:end], self._buffer[end:]
+        return data
+
+
+async def read_body(receive, limit):
+    """The whole request body, or None when it is longer than `limit`."""
+    body = b''
+    more = True
+    while more:
+        message = await receive()
+        if message['type'] != 'http.request':
+            break
+        body += message.get('body', b'')
+        more = message.get('more_body', False)
+        if len(body) > limit:
+            return None
+    return body
+
+
+class ASGIApp:
+
+    def __init__(self, app, views):
+        self.app = app
+        self.views = views
+        self.executor = ThreadPoolExecutor(app.config['ASYNC_WSGI_THREADS'], thread_name_prefix='wsgi')
+        # app.wsgi_app applies ProxyFix to the requests it serves; the async views bypass it, so do the same here
+        self.proxy_fix = None
+        if app.config['PROXY_COUNT']:
+            self.proxy_fix = ProxyFix(lambda environ, start_response: None, x_for=app.config['PROXY_COUNT'])
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] != 'http':
+            raise ValueError(f"Nieobsługiwany typ połączenia ASGI: {scope['type']}")
+
+        environ = build_environ(scope)
+        view = self._view(environ)
+        if view is None:
+            environ['wsgi.input'] = RequestBody(receive, asyncio.get_running_loop())
+            return await self._call_wsgi(environ, send)
+
+        if self.proxy_fix is not None:
+            self.proxy_fix(environ, None)
+
+        # async views only read small forms, so the body is read in full before the view starts
+        body = await read_body(receive, self.app.config['MAX_FORM_MEMORY_SIZE'] or 500000)
+        if body is None:
+            return await self._send(send, '413 REQUEST ENTITY TOO LARGE', [('Content-Length', '0')], b'')
+        environ['wsgi.input'] = io.BytesIO(body)
+        environ['CONTENT_LENGTH'] = str(len(body))
+        await self._send(send, *await self._dispatch(view, environ))
+
+    def _view(self, environ):
+        adapter = self.app.url_map.bind_to_environ(environ, server_name=self.app.config['SERVER_NAME'])
+        try:
+            endpoint, args = adapter.match()
+        except HTTPException:
+            # 404, 405 and redirects are answered by the WSGI app as usual
+            return None
+        return self.views.get(endpoint)
+
+    async def _dispatch(self, view, environ):
+        # Flask.wsgi_app and full_dispatch_request, with the view awaited instead of called
+        app = self.app
+        incoming = app.request_class(environ)
+        incoming.json_module = app.json
+        # opened before push(), which then keeps it, so a session store read does not block the loop
+        session = await asyncio.to_thread(app.session_interface.open_session, app, incoming)
+        ctx = RequestContext(app, environ, request=incoming, session=session)
+        error = None
+        try:
+            try:
+                ctx.push()
+                try:
+                    request_started.send(app, _async_wrapper=app.ensure_sync)
+                    # the throttle, the session save and other hooks may wait on redis; the threads get
+                    # a copy of this request's context variables
+                    rv = await asyncio.to_thread(app.preprocess_request)
+                    if rv is None:
+                        rv = await view(**request.view_args)
+                except Exception as e:
+                    rv = app.handle_user_exception(e)
+                response = await asyncio.to_thread(app.finalize_request, rv)
+            except Exception as e:
+                error = e
+                response = app.handle_exception(e)
+            started = []
+            iterable = response(environ, lambda status, headers, exc_info=None: started.extend((status, headers)))
+            try:
+                body = b''.join(iterable)
+            finally:
+                iterable.close()
+            return started[0], started[1], body
+        finally:
+            if error is not None and app.should_ignore_error(error):
+                error = None
+            ctx.pop(error)
+
+    async def _send(self, send, status, headers, body):
+        await send(_response_start(status, headers))
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _call_wsgi(self, environ, send):
+        loop = asyncio.get_running_loop()
+
+        def call(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        def run():
+            started = []
+
+            def start_response(status, headers, exc_info=None):
+                if exc_info and started and started[0] is None:
+                    raise exc_info[1].with_traceback(exc_info[2])
+                started[:] = [_response_start(status, headers)]
+
+            iterable = self.app(environ, start_response)
+            try:
+                for chunk in iterable:
+                    if not chunk:
+                        continue
+                    if started[0] is not None:
+                        call(started[0])
+                        started[0] = None
+                    # streamed responses such as exports reach the client chunk by chunk
+                    call({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                if started[0] is not None:
+                    call(started[0])
+                call({'type': 'http.response.body', 'body': b''})
+            finally:
+                if hasattr(iterable, 'close'):
+                    iterable.close()
+
+        await loop.run_in_executor(self.executor, run)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def close(self):
+        await aiodb.backend(self.app).close()
+        self.executor.shutdown(wait=False)
+        # uvicorn has no worker_exit hook to do this; under gunicorn it is repeated harmlessly
+        await asyncio.to_thread(self.app.extensions['lifecycle'].shutdown)
+
+
+def create_asgi_app(app, views=None):
+    if views is None:
+        from api import ASYNC_VIEWS as API_VIEWS
+        from app import ASYNC_VIEWS as PAGE_VIEWS
+        views = {**PAGE_VIEWS, **API_VIEWS}
+    # the sync routes an ASGI worker still serves, e.g. logins hashing passwords, run on this many threads
+    app.config.setdefault('ASYNC_WSGI_THREADS', 8)
+    aiodb.init_app(app)
+    return ASGIApp(app, views)
@@ -0,0 +1,183 @@
+import asyncio
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from flask import current_app
+
+import db
+
+try:
+    import aiomysql
+except ImportError:
+    aiomysql = None
+
+
+class AsyncMySQLBackend:
+    """aiomysql pool of its own, opened on the event loop of the worker on first use."""
+
+    dialect = 'mysql'
+
+    def __init__(self, config):
+        self.config = config
+        self.errors = aiomysql.Error
+        self.integrity_errors = aiomysql.IntegrityError
+        self._pool = None
+        self._opening = asyncio.Lock()
+
+    @staticmethod
+    def sql(query):
+        return query
+
+    async def _open(self):
+        async with self._opening:
+            if self._pool is None:
+                self._pool = await aiomysql.create_pool(
+                    host=self.config['DB_HOST'],
+                    user=self.config['DB_USER'],
+                    password=self.config['DB_PASSWORD'],
+                    db=self.config['DB_NAME'],
+                    minsize=1,
+                    maxsize=self.config['ASYNC_DB_POOL_SIZE'],
+                    charset='utf8mb4',
+                    # every statement sees the latest commit, as each read is its own transaction
+                    autocommit=True,
+                    pool_recycle=3600,
+                )
+        return self._pool
+
+    @asynccontextmanager
+    async def cursor(self):
+        pool = self._pool or await self._open()
+        conn = await asyncio.wait_for(pool.acquire(), self.config['ASYNC_DB_POOL_TIMEOUT'])
+        try:
+            async with conn.cursor() as cursor:
+                yield cursor
+        finally:
+            pool.release(conn)
+
+    async def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            await self._pool.wait_closed()
+            self._pool = None
+
+
+class _SQLiteCursor:
+
+    def __init__(self, conn, run):
+        self._conn = conn
+        self._run = run
+        self._cursor = None
+
+    async def execute(self, query, params=()):
+        self._cursor = await self._run(self._conn.execute, query, params)
+
+    async def fetchone(self):
+        return await self._run(self._cursor.fetchone)
+
+    async def fetchall(self):
+        return await self._run(self._cursor.fetchall)
+
+
+class AsyncSQLiteBackend:
+    """sqlite3 connections of the sync backend's database, each used by one query at a time on a thread pool.
+
+    sqlite3 has no non-blocking API, so this is what an async SQLite driver does as well: the event
+    loop only waits for the result, and queries beyond the pool size queue for a free connection.
+    """
+
+    dialect = 'sqlite'
+    errors = sqlite3.Error
+    integrity_errors = sqlite3.IntegrityError
+    sql = staticmethod(db.SQLiteBackend.sql)
+
+    def __init__(self, sync_backend, config):
+        self.sync_backend = sync_backend
+        self.config = config
+        self._executor = None
+        self._idle = None
+
+    async def _run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    @asynccontextmanager
+    async def cursor(self):
+        if self._idle is None:
+            size = self.config['ASYNC_DB_POOL_SIZE']
+            self._executor = ThreadPoolExecutor(size, thread_name_prefix='aiodb')
+            self._idle = asyncio.Queue()
+            # connections are opened when first needed
+            for _ in range(size):
+                self._idle.put_nowait(None)
+        conn = await asyncio.wait_for(self._idle.get(), self.config['ASYNC_DB_POOL_TIMEOUT'])
+        try:
+            if conn is None:
+                conn = await self._run(self.sync_backend.connect_direct)
+            yield _SQLiteCursor(conn, self._run)
+        finally:
+            self._idle.put_nowait(conn)
+
+    async def close(self):
+        if self._idle is None:
+            return
+        while not self._idle.empty():
+            conn = self._idle.get_nowait()
+            if conn is not None:
+                conn.close()
+        self._executor.shutdown(wait=False)
+        self._idle = self._executor = None
+
+
+class AsyncCursor:
+    """Async driver cursor behind the backend's placeholder style and the common db.Error classes."""
+
+    def __init__(self, cursor, backend):
+        self._cursor = cursor
+        self._backend = backend
+
+    async def _call(self, method, *args):
+        try:
+            return await method(*args)
+        except self._backend.integrity_errors as error:
+            raise db.IntegrityError(*error.args) from error
+        except self._backend.errors as error:
+            raise db.Error(*error.args) from error
+
+    async def execute(self, query, params=()):
+        return await self._call(self._cursor.execute, self._backend.sql(query), params)
+
+    async def fetchone(self):
+        return await self._call(self._cursor.fetchone)
+
+    async def fetchall(self):
+        return await self._call(self._cursor.fetchall)
+
+
+def create_backend(config, sync_backend):
+    if sync_backend.dialect == 'mysql':
+        if aiomysql is None:
+            raise RuntimeError("Tryb ASGI z DB_BACKEND = 'mysql' wymaga pakietu aiomysql")
+        return AsyncMySQLBackend(config)
+    return AsyncSQLiteBackend(sync_backend, config)
+
+
+def backend(app=None):
+    return (app or current_app).extensions['aiodb']
+
+
+@asynccontextmanager
+async def get_cursor():
+    # a connection is held only for the statement, never while the request waits on anything else
+    current = backend()
+    async with current.cursor() as cursor:
+        yield AsyncCursor(cursor, current)
+
+
+def init_app(app):
+    # one event loop serves many more requests than this; the rest wait for a connection
+    app.config.setdefault('ASYNC_DB_POOL_SIZE', 20)
+    app.config.setdefault('ASYNC_DB_POOL_TIMEOUT', 10)
+    async_backend = create_backend(app.config, db.backend(app))
+    app.extensions['aiodb'] = async_backend
+    return async_backend
@@ -0,0 +1,358 @@
+import asyncio
+from html import unescape
+
+from flask import Blueprint, abort, current_app, jsonify, request, url_for
+
+import db
+from batch import delete_many, update_each, update_many
+from auth import is_authenticated
+from books import (delete_book, fetch_book, fetch_book_async, fetch_books, fetch_books_async, fetch_books_page,
+                   fetch_books_page_async, insert_book, update_book)
+from facets import FACET_FIELDS, selected_facets
+from importer import prepare_row
+from models import BOOK_COLUMNS, column_list
+from search import build_search_query, criteria_from_form
+from shelves import LOCATION_FIELDS, fetch_location
+from suggest import SUGGEST_FIELDS
+from validators import BOOK_FIELDS, LOCATION_SCHEMA, SEARCH_SCHEMA
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+
+def _error(status, message, **extra):
+    response = jsonify(error=message, **extra)
+    response.status_code = status
+    return response
+
+
+def _catalog_cache():
+    return current_app.extensions['catalog_cache']
+
+
+@api.before_request
+def require_login():
+    if not is_authenticated():
+        return _error(401, "Wymagane zalogowanie")
+
+
+def _fields():
+    requested = request.args.get('fields')
+    if not requested:
+        return BOOK_COLUMNS
+
+    fields = [field.strip() for field in requested.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in BOOK_COLUMNS]
+    if unknown:
+        abort(_error(400, "Nieznane pola", fields=unknown))
+    return ('id',) + tuple(field for field in fields if field != 'id')
+
+
+def _serialize(book, fields):
+    # text is stored HTML-escaped; the API speaks plain text, so a GET payload can be PUT back as is
+    return {field: unescape(value) if isinstance(value, str) else value
+            for field, value in book.to_dict(fields).items()}
+
+
+def _conditional(payload, last_modified=None):
+    response = jsonify(payload)
+    # the ETag hashes the payload, so it changes with any write whichever worker made it
+    response.add_etag()
+    if last_modified:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+
+def _json_body():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        abort(_error(400, "Oczekiwano obiektu JSON"))
+    return data
+
+
+def _list_args():
+    fields = _fields()
+    limit = request.args.get('limit', current_app.config['CATALOG_PAGE_SIZE'], type=int)
+    limit = max(1, min(limit, current_app.config['CATALOG_MAX_PAGE_SIZE']))
+    after = request.args.get('after', type=int)
+    # the projection is pushed down to SQL, so it is part of the cache key as well
+    return fields, limit, after, (after, None, limit, ','.join(fields))
+
+
+def _book_list(books, fields, next_cursor):
+    return _conditional({
+        'items': [_serialize(book, fields) for book in books],
+        'next_cursor': next_cursor,
+    })
+
+
+@api.route('/ksiazki', methods=['GET'])
+def list_books():
+    fields, limit, after, key = _list_args()
+    books, prev_cursor, next_cursor = _catalog_cache().page(
+        key, lambda: fetch_books_page(after=after, limit=limit, columns=fields))
+    return _book_list(books, fields, next_cursor)
+
+
+def _book_detail(book):
+    if book is None:
+        return _error(404, "Nie znaleziono książki")
+    # zmieniono grows with every write to the row, within one second as well, so If-Modified-Since
+    # alone is enough; lists are validated by ETag only, as a deleted book leaves no row to date them by
+    return _conditional(_serialize(book, _fields()), book.zmieniono)
+
+
+@api.route('/ksiazki/<int:book_id>', methods=['GET'])
+def get_book(book_id):
+    return _book_detail(_catalog_cache().book(book_id, lambda: fetch_book(book_id)))
+
+
+def _search_query(fields):
+    criteria, errors = SEARCH_SCHEMA.clean(criteria_from_form(request.args))
+    if errors:
+        abort(_error(422, "Nieprawidłowe kryteria wyszukiwania", errors=errors))
+    return build_search_query(criteria, columns=column_list(fields),
+                              limit=current_app.config['SEARCH_MAX_RESULTS'], dialect=db.dialect())
+
+
+@api.route('/ksiazki/szukaj', methods=['GET'])
+def search_books():
+    fields = _fields()
+    query, values = _search_query(fields)
+    books = fetch_books(query, values, fields)
+    return _conditional({'items': [_serialize(book, fields) for book in books]})
+
+
+def _location_criteria(**path):
+    # levels given in the path are exact; the ones below may be narrowed with ?regal=2-4 / ?polka=1-3
+    criteria = {field: request.args.get(field, '').strip() for field in LOCATION_FIELDS}
+    criteria.update({field: str(value) for field, value in path.items()})
+    criteria, errors = LOCATION_SCHEMA.clean(criteria)
+    if errors:
+        abort(_error(422, "Nieprawidłowa lokalizacja", errors=errors))
+    return criteria
+
+
+@api.route('/lokalizacje', methods=['GET'])
+def occupancy():
+    counts = current_app.extensions['occupancy'].counts(_location_criteria())
+    return jsonify({
+        'items': [dict(zip(LOCATION_FIELDS, location), liczba=count) for location, count in counts],
+        'liczba': sum(count for location, count in counts),
+    })
+
+
+@api.route('/lokalizacje/<int:rzad>', methods=['GET'])
+@api.route('/lokalizacje/<int:rzad>/<int:regal>', methods=['GET'])
+@api.route('/lokalizacje/<int:rzad>/<int:regal>/<int:polka>', methods=['GET'])
+def books_at_location(**path):
+    fields = _fields()
+    criteria = _location_criteria(**path)
+    limit = current_app.config['LOCATION_MAX_RESULTS']
+    books = fetch_location(criteria, fields, limit=limit + 1)
+
+    return _conditional({
+        **path,
+        'items': [_serialize(book, fields) for book in books[:limit]],
+        'truncated': len(books) > limit,
+    })
+
+
+@api.route(f"/podpowiedzi/<any({', '.join(SUGGEST_FIELDS)}):field>", methods=['GET'])
+def suggestions(field):
+    return _suggestion_list(current_app.extensions['suggestions'].complete(field, *_suggest_args()))
+
+
+def _suggest_args():
+    limit = request.args.get('limit', current_app.config['SUGGEST_LIMIT'], type=int)
+    return request.args.get('q', ''), max(1, min(limit, current_app.config['SUGGEST_MAX_LIMIT']))
+
+
+def _suggestion_list(found):
+    response = jsonify({'items': [{'wartosc': value, 'liczba': count} for value, count in found]})
+    # retyping a prefix within a few seconds is answered by the browser
+    response.headers['Cache-Control'] = 'private, max-age=10'
+    return response
+
+
+@api.route('/fasety', methods=['GET'])
+def facet_counts():
+    limit = request.args.get('limit', current_app.config['FACET_LIMIT'], type=int)
+    limit = max(1, min(limit, current_app.config['FACET_MAX_LIMIT']))
+    selected = selected_facets(request.args)
+    counts = current_app.extensions['facets'].counts(selected, limit)
+    return jsonify({
+        'wybrane': selected,
+        **{field: [{'wartosc': value, 'liczba': count} for value, count in counts[field]] for field in FACET_FIELDS},
+    })
+
+
+@api.route('/zmiany', methods=['GET'])
+def changes():
+    """Books added, changed or deleted after change number ?after=, for incremental sync.
+
+    Start from 0 for a full copy, then pass back "cursor". With ?wait=<seconds> and nothing new
+    the request is held until a change arrives or the time is up.
+    """
+    after, limit, fields, wait = _feed_args()
+    found, has_more = current_app.extensions['change_feed'].read(after, limit, fields, wait)
+    return _feed_page(found, has_more, after, fields)
+
+
+def _feed_args():
+    after = max(0, request.args.get('after', 0, type=int))
+    limit = request.args.get('limit', current_app.config['FEED_PAGE_SIZE'], type=int)
+    limit = max(1, min(limit, current_app.config['FEED_MAX_PAGE_SIZE']))
+    wait = max(0.0, min(request.args.get('wait', 0, type=float), current_app.config['FEED_MAX_WAIT']))
+    return after, limit, _fields(), wait
+
+
+def _feed_page(found, has_more, after, fields):
+    response = jsonify({
+        'items': [{'zmiana': number, 'id': book.id, 'wersja': book.wersja, 'usunieta': deleted,
+                   'ksiazka': None if deleted else _serialize(book, fields)} for number, deleted, book in found],
+        'cursor': found[-1][0] if found else after,
+        'has_more': has_more,
+    })
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+@api.route('/ksiazki', methods=['POST'])
+def create_book():
+    values, errors = prepare_row(_json_body())
+    if errors:
+        return _error(422, "Nieprawidłowe dane książki", errors=errors)
+
+    book_id = insert_book(values)
+    db.commit()
+    _catalog_cache().invalidate(book_id)
+
+    response = jsonify(_serialize(fetch_book(book_id), BOOK_COLUMNS))
+    response.status_code = 201
+    response.headers['Location'] = url_for('api.get_book', book_id=book_id)
+    return response
+
+
+def _batch(data, key):
+    items = data.get(key)
+    if not isinstance(items, list) or not items:
+        abort(_error(400, f"Oczekiwano niepustej listy {key}"))
+    limit = current_app.config['BATCH_MAX_ITEMS']
+    if len(items) > limit:
+        abort(_error(413, f"Za dużo pozycji w jednym żądaniu (maks. {limit})"))
+    return items
+
+
+def _batch_response(report):
+    response = jsonify(report.to_dict())
+    # nothing is written when any item is invalid; missing ids alone do not stop the batch
+    response.status_code = 200 if report.applied else 422
+    return response
+
+
+@api.route('/ksiazki', methods=['PATCH'])
+def change_books():
+    data = _json_body()
+    if 'items' in data:
+        return _batch_response(update_each(_batch(data, 'items'), _catalog_cache()))
+    changes = data.get('zmiany')
+    if not isinstance(changes, dict):
+        return _error(400, "Oczekiwano obiektu zmiany")
+    return _batch_response(update_many(_batch(data, 'ids'), changes, _catalog_cache()))
+
+
+@api.route('/ksiazki', methods=['DELETE'])
+def remove_books():
+    return _batch_response(delete_many(_batch(_json_body(), 'ids'), _catalog_cache()))
+
+
+def _expected_version(data):
+    version = data.get('wersja')
+    if version is not None and (isinstance(version, bool) or not isinstance(version, int)):
+        abort(_error(422, "Nieprawidłowa wersja", errors=["Wersja musi być liczbą całkowitą"]))
+    return version
+
+
+@api.route('/ksiazki/<int:book_id>', methods=['PUT', 'PATCH'])
+def change_book(book_id):
+    data = _json_body()
+    # with "wersja" from an earlier read the write only succeeds if nobody changed the book since
+    version = _expected_version(data)
+    if request.method == 'PATCH':
+        book = fetch_book(book_id)
+        if book is None:
+            return _error(404, "Nie znaleziono książki")
+        current = {field: str(value) for field, value in _serialize(book, BOOK_FIELDS).items()}
+        data = {**current, **data}
+        # the unchanged fields are written back as read, so they must not have changed meanwhile either
+        if version is None:
+            version = book.wersja
+
+    values, errors = prepare_row(data)
+    if errors:
+        return _error(422, "Nieprawidłowe dane książki", errors=errors)
+
+    if not update_book(book_id, values, version):
+        db.rollback()
+        book = fetch_book(book_id)
+        if book is None:
+            return _error(404, "Nie znaleziono książki")
+        return _error(409, "Książka została w międzyczasie zmieniona", wersja=book.wersja)
+    db.commit()
+    _catalog_cache().invalidate(book_id)
+
+    return jsonify(_serialize(fetch_book(book_id), BOOK_COLUMNS))
+
+
+@api.route('/ksiazki/<int:book_id>', methods=['DELETE'])
+def remove_book(book_id):
+    if not delete_book(book_id):
+        db.rollback()
+        return _error(404, "Nie znaleziono książki")
+    db.commit()
+    _catalog_cache().invalidate(book_id)
+    return '', 204
+
+
+# Async twins of the read views above for the ASGI entry point (aio.py); the WSGI app keeps the sync
+# ones. Each shares its arguments, validation and response with its twin and only awaits the reads.
+
+
+async def list_books_async():
+    fields, limit, after, key = _list_args()
+    books, prev_cursor, next_cursor = await _catalog_cache().page_async(
+        key, lambda: fetch_books_page_async(after=after, limit=limit, columns=fields))
+    return _book_list(books, fields, next_cursor)
+
+
+async def get_book_async(book_id):
+    return _book_detail(await _catalog_cache().book_async(book_id, lambda: fetch_book_async(book_id)))
+
+
+async def search_books_async():
+    fields = _fields()
+    query, values = _search_query(fields)
+    books = await fetch_books_async(query, values, fields)
+    return _conditional({'items': [_serialize(book, fields) for book in books]})
+
+
+async def suggestions_async(field):
+    # answered from memory; only a reload of the index reads the table, on a thread instead of the loop
+    found = await asyncio.to_thread(current_app.extensions['suggestions'].complete, field, *_suggest_args())
+    return _suggestion_list(found)
+
+
+async def changes_async():
+    after, limit, fields, wait = _feed_args()
+    found, has_more = await current_app.extensions['change_feed'].read_async(after, limit, fields, wait)
+    return _feed_page(found, has_more, after, fields)
+
+
+ASYNC_VIEWS = {
+    'api.list_books': list_books_async,
+    'api.get_book': get_book_async,
+    'api.search_books': search_books_async,
+    'api.suggestions': suggestions_async,
+    'api.changes': changes_async,
+}
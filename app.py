@@ -1,140 +1,203 @@
-from flask import Flask, flash, render_template, request, redirect, url_for, session
+from flask import Blueprint, Flask, Response, current_app, abort, flash, jsonify, render_template, request, redirect, stream_with_context, url_for, session
 from html import escape
-import mysql.connector
-import hashlib
+import asyncio
+import io
 import os
-import re
+import secrets
 import json
-from datetime import date
-from flask_mail import Mail, Message
+import click
+from flask_mail import Mail
 from random import randint
-
-app = Flask(__name__)
-app.secret_key = "klucz_sesji"
-
-mydb = mysql.connector.connect(
-    host="localhost",
-    user="root",
-    password="",
-    database="biblioteka"
-)
-
-app.config['MAIL_SERVER'] = 'smtp.gmail.com'
-app.config['MAIL_PORT'] = 587  
-app.config['MAIL_USE_TLS'] = True 
-app.config['MAIL_USERNAME'] = 'tutajAdresEmail'
-app.config['MAIL_PASSWORD'] = 'tutajHaslo'
-app.config['MAIL_DEFAULT_SENDER'] = 'tutajAdresEmail'
-
-mail = Mail(app)
+from urllib.parse import urlencode
+from werkzeug.local import LocalProxy
+from werkzeug.middleware.proxy_fix import ProxyFix
+import assets
+import cache
+import changes
+import db
+import facets
+import fragments
+import lifecycle
+import mailer
+import metrics
+import passwords
+import sessions
+import shelves
+import suggest
+import throttle
+from api import api
+from auth import current_user, login_required, login_user, logout_user
+from batch import delete_many, update_many
+from books import (delete_book, fetch_book, fetch_books, fetch_books_async, fetch_books_by_ids, fetch_books_by_ids_async,
+                   fetch_books_page, fetch_books_page_async, insert_book, update_book)
+from exporter import EXPORT_COLUMNS, MIMETYPES, export_chunks
+from facets import (SEARCH_PREFIX, build_counts_query, fetch_counts, fetch_counts_async, page_ids,
+                    selected_facets)
+from importer import format_from_filename, import_books, iter_records
+from models import BOOK_COLUMNS, column_list
+from search import build_search_query, criteria_from_form
+from users import LOGIN_COLUMNS, PASSWORD_COLUMNS, find_user, insert_user, update_password, update_profile
+from validators import (BOOK_SCHEMA, PASSWORD_SCHEMA, PROFILE_SCHEMA, SEARCH_SCHEMA, USER_SCHEMA, validate,
+                        validate_book_year, validate_email, validate_name, validate_password, validate_phone_number,
+                        validate_positive_number)
+
+strony = Blueprint('strony', __name__, cli_group=None)
+
+# fields offered by the catalog's "change selected" form; the API accepts any book field
+BATCH_FORM_FIELDS = ('rzad', 'regal', 'polka', 'seria')
+
+# extensions live on the application built by create_app; views reach them through the current app
+catalog_cache = LocalProxy(lambda: current_app.extensions['catalog_cache'])
+password_hasher = LocalProxy(lambda: current_app.extensions['password_hasher'])
+mail_dispatcher = LocalProxy(lambda: current_app.extensions['mail_dispatcher'])
+facet_index = LocalProxy(lambda: current_app.extensions['facets'])
+
+
+def create_app(config=None):
+    """Builds the application; pools, sockets and worker threads are only opened on first use in each process."""
+    app = Flask(__name__)
+    # sessions are stored server-side, so the key only has to be shared between workers when SESSION_BACKEND = 'cookie'
+    app.secret_key = os.environ.get('SECRET_KEY') or secrets.token_hex(32)
+
+    app.config['SESSION_BACKEND'] = os.environ.get('SESSION_BACKEND', 'file')
+    app.config['SESSION_REDIS_URL'] = os.environ.get('SESSION_REDIS_URL', 'redis://localhost:6379/1')
+    app.config['SESSION_COOKIE_HTTPONLY'] = True
+    app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
+
+    app.config['DB_BACKEND'] = os.environ.get('DB_BACKEND', 'mysql')
+    app.config['DB_HOST'] = os.environ.get('DB_HOST', 'localhost')
+    app.config['DB_USER'] = os.environ.get('DB_USER', 'root')
+    app.config['DB_PASSWORD'] = os.environ.get('DB_PASSWORD', '')
+    app.config['DB_NAME'] = os.environ.get('DB_NAME', 'biblioteka')
+    app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 10))
+    if 'DB_PATH' in os.environ:
+        app.config['DB_PATH'] = os.environ['DB_PATH']
+
+    app.config['CATALOG_PAGE_SIZE'] = 50
+    app.config['CATALOG_MAX_PAGE_SIZE'] = 500
+    app.config['SEARCH_MAX_RESULTS'] = 200
+    app.config['IMPORT_BATCH_SIZE'] = 1000
+    app.config['EXPORT_FETCH_SIZE'] = 1000
+    app.config['BATCH_MAX_ITEMS'] = 1000
+
+    app.config['CACHE_BACKEND'] = os.environ.get('CACHE_BACKEND', 'memory')
+    app.config['CACHE_REDIS_URL'] = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    # room for a few pages of row fragments besides the book and page entries
+    app.config['CACHE_MAX_ENTRIES'] = 10000
+    app.config['CACHE_DEFAULT_TTL'] = 300
+    # build the typeahead index in the gunicorn master (wsgi.py); 0 leaves it to the first request of each worker
+    app.config['SUGGEST_WARM'] = os.environ.get('SUGGEST_WARM', '1') != '0'
+
+    app.config['PASSWORD_ITERATIONS'] = int(os.environ.get('PASSWORD_ITERATIONS', passwords.LEGACY_ITERATIONS))
+    # processes serving the app on this host; gunicorn.conf.py exports its worker count here
+    app.config['WEB_WORKERS'] = int(os.environ.get('WEB_CONCURRENCY', 1))
+    if 'PASSWORD_HASH_WORKERS' in os.environ:
+        app.config['PASSWORD_HASH_WORKERS'] = int(os.environ['PASSWORD_HASH_WORKERS'])
+
+    app.config['MAIL_SERVER'] = 'smtp.gmail.com'
+    app.config['MAIL_PORT'] = 587
+    app.config['MAIL_USE_TLS'] = True
+    app.config['MAIL_USERNAME'] = 'tutajAdresEmail'
+    app.config['MAIL_PASSWORD'] = 'tutajHaslo'
+    app.config['MAIL_DEFAULT_SENDER'] = 'tutajAdresEmail'
+
+    app.config['MAIL_TRANSPORT'] = os.environ.get('MAIL_TRANSPORT', 'smtp')
+
+    # /metrics answers the addresses in METRICS_ALLOWED_ADDRS and scrapers sending "Authorization: Bearer <token>"
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+    app.config['METRICS_ALLOWED_ADDRS'] = tuple(address.strip() for address in
+                                                os.environ.get('METRICS_ALLOWED_ADDRS', '127.0.0.1,::1').split(',')
+                                                if address.strip())
+    app.config['DB_SLOW_QUERY_SECONDS'] = float(os.environ.get('DB_SLOW_QUERY_SECONDS', 0.5))
+    app.config['PROFILER_ENABLED'] = os.environ.get('PROFILER_ENABLED') == '1'
+
+    # reverse proxies in front of the app; their X-Forwarded-For gives the client address the throttle keys on
+    app.config['PROXY_COUNT'] = int(os.environ.get('PROXY_COUNT', 0))
+    app.config['THROTTLE_ENABLED'] = os.environ.get('THROTTLE_ENABLED', '1') != '0'
+    app.config['THROTTLE_BACKEND'] = os.environ.get('THROTTLE_BACKEND', 'memory')
+
+    app.config.update(config or {})
+
+    if app.config['PROXY_COUNT']:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_COUNT'])
+
+    sessions.init_app(app)
+    cache.init_app(app)
+    throttle.init_app(app)
+    shelves.init_app(app)
+    suggest.init_app(app)
+    facets.init_app(app)
+    changes.init_app(app)
+    fragments.init_app(app)
+    assets.init_app(app)
+    passwords.init_app(app)
+    db.init_app(app)
+    mailer.init_app(app, Mail(app))
+    metrics.init_app(app)
+    lifecycle.init_app(app)
+
+    app.register_blueprint(strony)
+    app.register_blueprint(api)
+    return app
 
 def send_verification_code(email, code):
-    msg = Message('Kod weryfikacyjny', recipients=[email])
-    msg.body = f'''Witaj użytkowniku! 
+    body = f'''Witaj użytkowniku! 
 Cieszymy się, że dołączyłeś do naszego serwisu.
 Poniżej podany jest Twój prywatny kod weryfikacyjny, nie pokazuj go nikomu, aby nie utracić kontroli nad swoim kontem.
 Twój kod weryfikacyjny to: {code}
 Wprowadź go w formularzu logowania w celu prawidłowej weryfikacji!
 Do zobaczenia :-)
 '''
-    mail.send(msg)
-
-def validate_name(name):
-    return bool(re.match(r'^[A-Za-zęĘóÓąĄśŚłŁżŻźŹćĆńŃ]+$', name))
+    mail_dispatcher.send('Kod weryfikacyjny', [email], body)
 
-def validate(name):
-    return bool(re.match(r'^[A-Za-z\s.,ęĘóÓąĄśŚłŁżŻźŹćĆńŃ]+$', name))
-
-def validate_phone_number(number):
-    return bool(re.match(r'^\d{9}$', number))
-
-def validate_email(email):
-    return bool(re.match(r'^[\w\.-]+@[\w\.-]+\.\w+$', email))
-
-def validate_password(password):
-    return bool(re.match(r'^(?=.*[a-z])(?=.*[A-Z])(?=.*\d).{8,}$', password))
-
-def validate_book_year(year_str):
-    try:
-        year = int(year_str)
-        current_year = date.today().year
-        return year > 0 and year <= current_year
-    except ValueError:
-        return False
-
-def validate_positive_number(number_str):
-    try:
-        number = int(number_str)
-        return number > 0
-    except ValueError:
-        return False
-
-@app.route('/')
+@strony.route('/')
 def index():
     session.pop('logged_in', None)
     return render_template('index.html')
 
-@app.route('/register', methods=['GET'])
+@strony.route('/register', methods=['GET'])
 def register_form():
     session.pop('logged_in', None)
     return render_template('register.html')
 
-@app.route('/register', methods=['POST'])
+@strony.route('/register', methods=['POST'])
 def register():
     session.pop('logged_in', None)
-    imie = escape(request.form['imie'])
-    nazwisko = escape(request.form['nazwisko'])
-    numer_telefonu = escape(request.form['numer_telefonu'])
-    email = escape(request.form['email'])
-    nazwa_uzytkownika = escape(request.form['nazwa_uzytkownika'])
-    haslo = escape(request.form['haslo'])
-
-    error = None
+    rejected = throttle.reject('rejestracja', request.form.get('nazwa_uzytkownika', ''))
+    if rejected:
+        return rejected
 
-    if not validate_name(imie) or not validate_name(nazwisko):
-        error = "Niepoprawne imię lub nazwisko!"
+    user, errors = USER_SCHEMA.clean(request.form)
 
-    if not validate_phone_number(numer_telefonu):
-        error = "Niepoprawny numer telefonu!"
+    if errors:
+        return render_template('register.html', error=errors[0]), 400
 
-    if not validate_email(email):
-        error = "Niepoprawny adres email!"
+    hexhash = password_hasher.hash(user['haslo'])
 
-    if not validate_password(haslo):
-        error = "Niepoprawne hasło! Powinno posiadać conajmniej 8 znaków, w tym przynajmniej jedną małą literę, dużą literę oraz cyfrę."
+    verification_code = str(randint(1000, 9999))
+    email = user['email']
 
-    if error:
-        return render_template('register.html', error=error)
-
-    salt = os.urandom(32)
-    hash = hashlib.pbkdf2_hmac("sha256", haslo.encode('utf-8'), salt, 10000)
-    hexhash = (salt + hash).hex()
-
-    cursor = mydb.cursor()
-    query = "SELECT * FROM uzytkownicy WHERE nazwa_uzytkownika = %s OR email = %s"
-    values = (nazwa_uzytkownika, email)
-    cursor.execute(query, values)
-    result = cursor.fetchone()
-
-    if result:
+    try:
+        insert_user(user['imie'], user['nazwisko'], user['numer_telefonu'], email, user['nazwa_uzytkownika'],
+                    hexhash, verification_code)
+        db.commit()
+    except db.IntegrityError:
+        db.rollback()
         return render_template('register.html', error="Użytkownik o podanym loginie lub emailu już istnieje!")
-    else:
-        query = "INSERT INTO uzytkownicy (imie, nazwisko, numer_telefonu, email, nazwa_uzytkownika, haslo, verification_code) VALUES (%s, %s, %s, %s, %s, %s, %s)"
-        verification_code = str(randint(1000, 9999))
-        values = (imie, nazwisko, numer_telefonu, email, nazwa_uzytkownika, hexhash, verification_code)
-        cursor.execute(query, values)
-        mydb.commit()
-        send_verification_code(email, verification_code)
+    send_verification_code(email, verification_code)
 
-        session['verification_code'] = verification_code
-        return redirect(url_for('login'))
-        
+    session['verification_code'] = verification_code
+    return redirect(url_for('strony.login'))
 
 
-@app.route('/login', methods=['GET', 'POST'])
+@strony.route('/login', methods=['GET', 'POST'])
 def login():
     error = None
     if request.method == 'POST':
+        rejected = throttle.reject('logowanie', request.form.get('nazwa_uzytkownika', ''))
+        if rejected:
+            return rejected
+
         nazwa_uzytkownika = escape(request.form['nazwa_uzytkownika'])
         haslo = escape(request.form['haslo'])
         kod_weryfikacyjny = escape(request.form['verification_code']) 
@@ -145,26 +208,20 @@ def login():
         if error:
             return render_template('login.html', error=error)
 
-        cursor = mydb.cursor()
-        query = "SELECT * FROM uzytkownicy WHERE nazwa_uzytkownika = %s"
-        values = (nazwa_uzytkownika,)
-        cursor.execute(query, values)
-        result = cursor.fetchone()
-
-        if result:
-            stored_hash = result[6]
-            salt = bytes.fromhex(stored_hash[:64])
-            expected_hash = stored_hash[64:]
-
-            hash = hashlib.pbkdf2_hmac("sha256", haslo.encode('utf-8'), salt, 10000)
-            hexhash = hash.hex()
-
-            if hexhash == expected_hash:
-                stored_verification_code = result[7]  
-                if kod_weryfikacyjny == stored_verification_code:
-                    session['logged_in'] = True
-                    session['nazwa_uzytkownika'] = nazwa_uzytkownika
-                    return redirect(url_for('strona_glowna'))
+        user = find_user(nazwa_uzytkownika, LOGIN_COLUMNS)
+
+        if user:
+            stored_hash = user.haslo
+
+            if password_hasher.verify(haslo, stored_hash):
+                if kod_weryfikacyjny == user.verification_code:
+                    if password_hasher.needs_rehash(stored_hash):
+                        update_password(user.id, password_hasher.hash(haslo))
+                        db.commit()
+
+                    throttle.succeeded('logowanie', request.form['nazwa_uzytkownika'])
+                    login_user(user.id, nazwa_uzytkownika)
+                    return redirect(url_for('strony.strona_glowna'))
                 else:
                     error = "Kod weryfikacyjny jest nieprawidłowy!"
             else:
@@ -172,348 +229,352 @@ def login():
         else:
             error = "Dane są nieprawidłowe, spróbuj jeszcze raz!"
 
+        throttle.failed('logowanie', request.form['nazwa_uzytkownika'])
+
     else:
-        session.pop('logged_in', None)
-        session.pop('nazwa_uzytkownika', None)
+        logout_user()
 
     return render_template('login.html', error=error)
 
 
 
-@app.route('/profil')
+@strony.route('/profil')
+@login_required
 def profil(error_message=None, success_message=None):
-    if not session.get('logged_in'):
-        return redirect(url_for('login'))
-
-    cursor = mydb.cursor()
-    query = "SELECT * FROM uzytkownicy WHERE nazwa_uzytkownika = %s"
-    values = (session['nazwa_uzytkownika'],)
-    cursor.execute(query, values)
-    user = cursor.fetchone()
+    return render_template('user_panel.html', user=current_user(), error_message=error_message, success_message=success_message)
 
-    return render_template('user_panel.html', user=user, error_message=error_message, success_message=success_message)
-
-@app.route('/zmien_haslo', methods=['POST'])
+@strony.route('/zmien_haslo', methods=['POST'])
+@login_required
 def zmien_haslo():
-    if not session.get('logged_in'):
-        return redirect(url_for('login'))
-
-    stare_haslo = escape(request.form['stare_haslo'])
-    nowe_haslo = escape(request.form['nowe_haslo'])
+    form_passwords, errors = PASSWORD_SCHEMA.clean(request.form)
 
-    error = None
-
-    if not validate_password(stare_haslo):
-        error = "Niepoprawne stare hasło! Powinno posiadać co najmniej 8 znaków, w tym przynajmniej jedną małą literę, dużą literę oraz cyfrę."
-
-    if not validate_password(nowe_haslo):
-        error = "Niepoprawne nowe hasło! Powinno posiadać co najmniej 8 znaków, w tym przynajmniej jedną małą literę, dużą literę oraz cyfrę."
-
-    if error:
-        return profil(error_message=error)
-
-    cursor = mydb.cursor()
-    query = "SELECT * FROM uzytkownicy WHERE nazwa_uzytkownika = %s"
-    values = (session['nazwa_uzytkownika'],)
-    cursor.execute(query, values)
-    result = cursor.fetchone()
+    if errors:
+        return profil(error_message=errors[0])
 
-    if result:
-        stored_hash = result[6]
-        salt = bytes.fromhex(stored_hash[:64])
-        expected_hash = stored_hash[64:]
+    stare_haslo = form_passwords['stare_haslo']
+    nowe_haslo = form_passwords['nowe_haslo']
 
-        hash = hashlib.pbkdf2_hmac("sha256", stare_haslo.encode('utf-8'), salt, 10000)
-        hexhash = hash.hex()
+    user = find_user(session['nazwa_uzytkownika'], PASSWORD_COLUMNS)
 
-        if hexhash == expected_hash:
-            new_salt = os.urandom(32)
-            new_hash = hashlib.pbkdf2_hmac("sha256", nowe_haslo.encode('utf-8'), new_salt, 10000)
-            new_hexhash = (new_salt + new_hash).hex()
-
-            query = "UPDATE uzytkownicy SET haslo = %s WHERE nazwa_uzytkownika = %s"
-            values = (new_hexhash, session['nazwa_uzytkownika'])
-            cursor.execute(query, values)
-            mydb.commit()
+    if user:
+        if password_hasher.verify(stare_haslo, user.haslo):
+            update_password(user.id, password_hasher.hash(nowe_haslo))
+            db.commit()
             return profil(success_message="Hasło zostało pomyślnie zaktualizowane!")
         else:
             error = "Niepoprawnie wpisane obecne hasło, spróbuj jeszcze raz!"
             return profil(error_message=error)
     else:
-        return redirect(url_for('login'))
+        return redirect(url_for('strony.login'))
 
-@app.route('/edytuj_dane', methods=['POST'])
+@strony.route('/edytuj_dane', methods=['POST'])
+@login_required
 def edytuj_dane():
-    if not session.get('logged_in'):
-        return redirect(url_for('login'))
-
-    imie = escape(request.form['imie'])
-    nazwisko = escape(request.form['nazwisko'])
-    numer_telefonu = escape(request.form['numer_telefonu'])
-    email = escape(request.form['email'])
-    nazwa_uzytkownika = escape(request.form['nazwa_uzytkownika'])
+    user, errors = PROFILE_SCHEMA.clean(request.form)
 
-    error = None
+    if errors:
+        return profil(error_message=errors[0])
 
-    if not validate_name(imie) or not validate_name(nazwisko):
-        error = "Niepoprawne imię lub nazwisko!"
+    # the profile being edited is always the logged-in user's, whatever the form says
+    update_profile(session['nazwa_uzytkownika'], user['imie'], user['nazwisko'], user['numer_telefonu'], user['email'])
+    db.commit()
 
-    if not validate_phone_number(numer_telefonu):
-        error = "Niepoprawny numer telefonu!"
+    return redirect(url_for('strony.profil'))
 
-    if not validate_email(email):
-        error = "Niepoprawny adres email!"
 
-    if error:
-        return profil(error_message=error)
+def _catalog_args():
+    limit = request.args.get('limit', current_app.config['CATALOG_PAGE_SIZE'], type=int)
+    limit = max(1, min(limit, current_app.config['CATALOG_MAX_PAGE_SIZE']))
+    after = request.args.get('after', type=int)
+    before = request.args.get('before', type=int)
+    selected = selected_facets(request.args)
+    key = (after, before, limit, urlencode(sorted(selected.items()))) if selected else (after, before, limit)
+    return limit, after, before, selected, key
 
-    cursor = mydb.cursor()
-    query = "UPDATE uzytkownicy SET imie = %s, nazwisko = %s, numer_telefonu = %s, email = %s WHERE nazwa_uzytkownika = %s"
-    values = (imie, nazwisko, numer_telefonu, email, nazwa_uzytkownika)
-    cursor.execute(query, values)
-    mydb.commit()
 
-    return redirect(url_for('profil'))
+def _catalog(page, limit, selected, facets):
+    books, prev_cursor, next_cursor = page
+    return render_template('strona_glowna.html', books=books, limit=limit,
+                           prev_cursor=prev_cursor, next_cursor=next_cursor, selected=selected, facets=facets)
 
 
-@app.route('/strona_glowna', methods=['GET'])
+@strony.route('/strona_glowna', methods=['GET'])
+@login_required
 def strona_glowna():
-    if not session.get('logged_in'):
-        return redirect(url_for('login'))
-
-    cursor = mydb.cursor()
-    query = "SELECT * FROM ksiazki"
-    cursor.execute(query)
-    books = cursor.fetchall()
+    limit, after, before, selected, key = _catalog_args()
 
-    return render_template('strona_glowna.html', books=books)
-
-@app.route('/dodaj_ksiazke', methods=['GET', 'POST'])
-def dodaj_ksiazke():
-    if not session.get('logged_in'):
-        return redirect(url_for('login'))
-
-    if request.method == 'POST':
-        tytul = escape(request.form['tytul'])
-        autor = escape(request.form['autor'])
-        wydawnictwo = escape(request.form['wydawnictwo'])
-        seria = escape(request.form['seria'])
-        oprawa = escape(request.form['oprawa'])
-        rok_wydania = escape(request.form['rok_wydania'])
-        ilosc_stron = escape(request.form['ilosc_stron'])
-        rzad = escape(request.form['rzad'])
-        regal = escape(request.form['regal'])
-        polka = escape(request.form['polka'])
-        
-        errors = []
-
-        if not validate(autor):
-            errors.append("Nieprawidłowy autor książki")
-
-        if not validate_name(oprawa):
-            errors.append("Nieprawidłowy rodzaj oprawy książki!")
-
-        if not validate_book_year(rok_wydania):
-            errors.append("Niepoprawny rok wydania książki!")
+    if selected:
+        page = catalog_cache.page(key, lambda: _facet_page(selected, after, before, limit))
+    else:
+        page = catalog_cache.page(key, lambda: fetch_books_page(after=after, before=before, limit=limit))
 
-        if not validate_positive_number(ilosc_stron):
-            errors.append("Nieprawidłowa liczba stron!")
+    return _catalog(page, limit, selected, facet_index.counts(selected, current_app.config['FACET_LIMIT']))
 
-        if not validate_positive_number(rzad):
-            errors.append("Nieprawidłowy numer rzędu!")
 
-        if not validate_positive_number(regal):
-            errors.append("Nieprawidłowy numer regału!")
+def _facet_page(selected, after, before, limit):
+    # the matching ids come from the facet index, so the database is only asked for one page by primary key
+    ids, prev_cursor, next_cursor = page_ids(facet_index.matching(selected), after, before, limit)
+    return fetch_books_by_ids(ids), prev_cursor, next_cursor
 
-        if not validate_positive_number(polka):
-            errors.append("Nieprawidłowy numer półki!")
+@strony.route('/dodaj_ksiazke', methods=['GET', 'POST'])
+@login_required
+def dodaj_ksiazke():
+    if request.method == 'POST':
+        values, errors = BOOK_SCHEMA.row(request.form)
 
         if errors:
-            return render_template('dodaj_ksiazke.html', errors=errors)
+            return render_template('dodaj_ksiazke.html', errors=errors), 400
 
-        cursor = mydb.cursor()
-        query = "INSERT INTO ksiazki (tytul, autor, wydawnictwo, seria, oprawa, rok_wydania, ilosc_stron, rzad, regal, polka) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"
-        values = (tytul, autor, wydawnictwo, seria, oprawa, rok_wydania, ilosc_stron, rzad, regal, polka)
-        cursor.execute(query, values)
-        mydb.commit()
+        book_id = insert_book(values)
+        db.commit()
+        catalog_cache.invalidate(book_id)
 
-        return redirect(url_for('strona_glowna'))
+        return redirect(url_for('strony.strona_glowna'))
     else:
         return render_template('dodaj_ksiazke.html')
 
-@app.route('/usun_ksiazke/<int:book_id>', methods=['POST'])
+@strony.route('/usun_ksiazke/<int:book_id>', methods=['POST'])
+@login_required
 def usun_ksiazke(book_id):
-    if not session.get('logged_in'):
-        return redirect(url_for('login'))
-
-    cursor = mydb.cursor()
-    query = "DELETE FROM ksiazki WHERE id = %s"
-    values = (book_id,)
-    cursor.execute(query, values)
-    mydb.commit()
+    delete_book(book_id)
+    db.commit()
+    catalog_cache.invalidate(book_id)
+
+    return redirect(url_for('strony.strona_glowna'))
+
+@strony.route('/zaznaczone_ksiazki', methods=['POST'])
+@login_required
+def zaznaczone_ksiazki():
+    back = request.form.get('powrot', '')
+    if not back.startswith('/') or back.startswith('//'):
+        back = url_for('strony.strona_glowna')
+
+    ids = request.form.getlist('ids')
+    if not ids:
+        flash("Nie zaznaczono żadnej książki!", 'error')
+        return redirect(back)
+    if len(ids) > current_app.config['BATCH_MAX_ITEMS']:
+        flash(f"Można zaznaczyć najwyżej {current_app.config['BATCH_MAX_ITEMS']} książek naraz!", 'error')
+        return redirect(back)
+
+    if request.form.get('akcja') == 'usun':
+        report = delete_many(ids, catalog_cache)
+        done = "Usunięto"
+    else:
+        values = {field: request.form[field] for field in BATCH_FORM_FIELDS if request.form.get(field, '').strip()}
+        report = update_many(ids, values, catalog_cache)
+        done = "Zmieniono"
 
-    return redirect(url_for('strona_glowna'))
+    for book_id, errors in report.results.items():
+        if errors:
+            flash(f"Książka {book_id}: {' '.join(errors)}", 'error')
+    if report.applied:
+        flash(f"{done} książek: {len(report.ok)}.", 'success')
+    return redirect(back)
 
-@app.route('/edytuj_ksiazke/<int:ksiazka_id>', methods=['GET', 'POST'])
+@strony.route('/edytuj_ksiazke/<int:ksiazka_id>', methods=['GET', 'POST'])
+@login_required
 def edytuj_ksiazke(ksiazka_id):
-    if not session.get('logged_in'):
-        return redirect(url_for('login'))
-
-    cursor = mydb.cursor()
-    errors = [] 
-    
     if request.method == 'POST':
-        tytul = escape(request.form['tytul'])
-        autor = escape(request.form['autor'])
-        wydawnictwo = escape(request.form['wydawnictwo'])
-        seria = escape(request.form['seria'])
-        oprawa = escape(request.form['oprawa'])
-        rok_wydania = escape(request.form['rok_wydania'])
-        ilosc_stron = escape(request.form['ilosc_stron'])
-        rzad = escape(request.form['rzad'])
-        regal = escape(request.form['regal'])
-        polka = escape(request.form['polka'])
-
-        if not validate(autor):
-            errors.append('Nieprawidłowy autor książki!')
-
-        if not validate_name(oprawa):
-            errors.append('Nieprawidłowy rodzaj oprawy książki!')
-
-        if not validate_book_year(rok_wydania):
-            errors.append('Nieprawidłowy rok wydania książki!')
-
-        if not validate_positive_number(ilosc_stron):
-            errors.append('Nieprawidłowa liczba stron!')
-
-        if not validate_positive_number(rzad):
-            errors.append('Nieprawidłowy numer rzędu!')
-
-        if not validate_positive_number(regal):
-            errors.append('Nieprawidłowy numer regału!')
-
-        if not validate_positive_number(polka):
-            errors.append('Nieprawidłowy numer półki!')
+        values, errors = BOOK_SCHEMA.row(request.form)
 
         if errors:
             for error in errors:
                 flash(error, 'error')
-            return redirect(url_for('edytuj_ksiazke', ksiazka_id=ksiazka_id))
-        
-        query = "UPDATE ksiazki SET tytul = %s, autor = %s, wydawnictwo = %s, seria = %s, oprawa = %s, rok_wydania = %s, ilosc_stron = %s, rzad = %s, regal = %s, polka = %s WHERE id = %s"
-        values = (tytul, autor, wydawnictwo, seria, oprawa, rok_wydania, ilosc_stron, rzad, regal, polka, ksiazka_id)
-        cursor.execute(query, values)
-        mydb.commit()
-
-        return redirect(url_for('strona_glowna'))
+            book = catalog_cache.book(ksiazka_id, lambda: fetch_book(ksiazka_id))
+            return render_template('edytuj_ksiazke.html', book=book), 400
+
+        # the version the form was rendered with; a save over someone else's edit is refused
+        if not update_book(ksiazka_id, values, request.form.get('wersja', type=int)):
+            db.rollback()
+            book = fetch_book(ksiazka_id)
+            if book is None:
+                abort(404)
+            flash("Ktoś zmienił tę książkę w międzyczasie. Sprawdź aktualne dane i wprowadź zmiany ponownie.", 'error')
+            return render_template('edytuj_ksiazke.html', book=book), 409
+        db.commit()
+        catalog_cache.invalidate(ksiazka_id)
+
+        return redirect(url_for('strony.strona_glowna'))
     else:
-        query = "SELECT * FROM ksiazki WHERE id = %s"
-        values = (ksiazka_id,)
-        cursor.execute(query, values)
-        book = cursor.fetchone()
+        book = catalog_cache.book(ksiazka_id, lambda: fetch_book(ksiazka_id))
 
         return render_template('edytuj_ksiazke.html', book=book)
 
-@app.route('/wyszukaj_ksiazke', methods=['GET', 'POST'])
+def _search_form():
+    """The submitted search form, or a search linked from its results (facets) in the query string."""
+    form = request.form if request.method == 'POST' else request.args
+    if request.method == 'GET' and not request.args:
+        return None
+    return form
+
+
+def _search_queries(form):
+    """(page of results, facet counts of every result), each a (query, values), or the form errors."""
+    criteria, errors = SEARCH_SCHEMA.clean(criteria_from_form(form))
+    if errors:
+        return None, errors
+    selected = selected_facets(form, SEARCH_PREFIX)
+    results = build_search_query(criteria, columns=column_list(BOOK_COLUMNS),
+                                 limit=current_app.config['SEARCH_MAX_RESULTS'], dialect=db.dialect(), facets=selected)
+    # the facet counts cover every match, not only the SEARCH_MAX_RESULTS shown
+    counts = build_counts_query(criteria, dialect=db.dialect(), facets=selected)
+    return (results, counts), None
+
+
+def _search_results(form, books, facets):
+    search_args = {field: value for field, value in criteria_from_form(form).items() if value}
+    selected = selected_facets(form, SEARCH_PREFIX)
+    export_args = {**search_args, **{SEARCH_PREFIX + field: value for field, value in selected.items()}}
+    return render_template('wyszukaj_ksiazke.html', books=books, export_args=export_args, search_args=search_args,
+                           selected=selected, facets=facets)
+
+
+@strony.route('/wyszukaj_ksiazke', methods=['GET', 'POST'])
+@login_required
 def wyszukaj_ksiazke():
-    if not session.get('logged_in'):
-        return redirect(url_for('login'))
-
-    if request.method == 'POST':
-        tytul = escape(request.form['tytul'].lower())
-        autor = escape(request.form['autor'].lower())
-        wydawnictwo = escape(request.form['wydawnictwo'].lower())
-        seria = escape(request.form['seria'].lower())
-        oprawa = escape(request.form['oprawa'].lower())
-        rok_wydania = escape(request.form['rok_wydania'])
-        ilosc_stron = escape(request.form['ilosc_stron'])
-        rzad = escape(request.form['rzad'])
-        regal = escape(request.form['regal'])
-        polka = escape(request.form['polka'])
-
-        errors = []
-
-        if autor and not validate(autor):
-            errors.append("Nieprawidłowy autor książki")
+    form = _search_form()
+    if form is None:
+        return render_template('wyszukaj_ksiazke.html', books=[])
 
-        if oprawa and not validate_name(oprawa):
-            errors.append("Nieprawidłowy rodzaj oprawy książki!")
+    queries, errors = _search_queries(form)
+    if errors:
+        return render_template('wyszukaj_ksiazke.html', errors=errors)
 
-        if rok_wydania and not validate_book_year(rok_wydania):
-            errors.append("Niepoprawny rok wydania książki!")
+    results, counts = queries
+    return _search_results(form, fetch_books(*results),
+                           fetch_counts(*counts, limit=current_app.config['FACET_LIMIT']))
 
-        if ilosc_stron and not validate_positive_number(ilosc_stron):
-            errors.append("Nieprawidłowa liczba stron!")
 
-        if rzad and not validate_positive_number(rzad):
-            errors.append("Nieprawidłowy numer rzędu!")
+@strony.route('/importuj_ksiazki', methods=['GET', 'POST'])
+@login_required
+def importuj_ksiazki():
+    if request.method == 'POST':
+        plik = request.files.get('plik')
+        if not plik or not plik.filename:
+            return render_template('importuj_ksiazki.html', errors=["Nie wybrano pliku do importu!"])
 
-        if regal and not validate_positive_number(regal):
-            errors.append("Nieprawidłowy numer regału!")
+        fmt = request.form.get('format') or format_from_filename(plik.filename)
+        stream = io.TextIOWrapper(plik.stream, encoding='utf-8-sig', newline='')
 
-        if polka and not validate_positive_number(polka):
-            errors.append("Nieprawidłowy numer półki!")
+        try:
+            report = import_books(iter_records(stream, fmt), batch_size=current_app.config['IMPORT_BATCH_SIZE'])
+        except ValueError as error:
+            return render_template('importuj_ksiazki.html', errors=[str(error)])
 
-        if errors:
-            return render_template('wyszukaj_ksiazke.html', errors=errors)
+        if report.inserted:
+            catalog_cache.invalidate()
 
-        cursor = mydb.cursor()
-        query = "SELECT * FROM ksiazki WHERE 1=1"
-        values = []
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify(report.to_dict())
+        return render_template('importuj_ksiazki.html', report=report)
+    else:
+        return render_template('importuj_ksiazki.html')
+
+@strony.cli.command('import-books')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'json', 'ndjson']), help='Domyślnie według rozszerzenia pliku.')
+@click.option('--batch-size', type=int, help='Liczba wierszy w jednym INSERT/transakcji.')
+def import_books_command(path, fmt, batch_size):
+    """Importuje książki z pliku CSV/JSON/NDJSON."""
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        report = import_books(iter_records(f, fmt or format_from_filename(path)),
+                              batch_size=batch_size or current_app.config['IMPORT_BATCH_SIZE'])
+
+    if report.inserted:
+        catalog_cache.invalidate()
+
+    for row_number, errors in report.errors:
+        click.echo(f"Wiersz {row_number}: {'; '.join(errors)}", err=True)
+    if report.fatal_error:
+        click.echo(f"Przerwano import: {report.fatal_error}", err=True)
+    click.echo(f"Wczytano {report.read}, dodano {report.inserted}, odrzucono {report.rejected} "
+               f"w {report.elapsed:.2f} s ({report.rows_per_second:.0f} wierszy/s)")
+
+
+@strony.route('/eksport/ksiazki.<fmt>')
+@login_required
+def eksport_ksiazek(fmt):
+    if fmt not in MIMETYPES:
+        abort(404)
+
+    criteria, errors = SEARCH_SCHEMA.clean(criteria_from_form(request.args))
+    if errors:
+        return jsonify(errors=errors), 400
+
+    query, values = build_search_query(criteria, columns=', '.join(EXPORT_COLUMNS), dialect=db.dialect(),
+                                       facets=selected_facets(request.args, SEARCH_PREFIX))
+    compress = 'gzip' in request.accept_encodings
+
+    response = Response(
+        stream_with_context(export_chunks(fmt, query, values, current_app.config['EXPORT_FETCH_SIZE'], compress)),
+        mimetype=MIMETYPES[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename=ksiazki.{fmt}'
+    response.headers['Vary'] = 'Accept-Encoding'
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+@strony.route('/statystyki_cache')
+@login_required
+def statystyki_cache():
+    return jsonify(catalog_cache.stats())
+
+
+@strony.route('/wyloguj')
+def wyloguj():
+    logout_user()
+    return redirect(url_for('strony.index'))
 
-        if tytul:
-            query += " AND LOWER(tytul) LIKE %s"
-            values.append('%' + tytul + '%')
 
-        if autor:
-            query += " AND LOWER(autor) LIKE %s"
-            values.append('%' + autor + '%')
+# Async twins of the catalog and search pages for the ASGI entry point (aio.py), sharing arguments,
+# validation and templates with the views above
 
-        if wydawnictwo:
-            query += " AND LOWER(wydawnictwo) LIKE %s"
-            values.append('%' + wydawnictwo + '%')
 
-        if seria:
-            query += " AND LOWER(seria) LIKE %s"
-            values.append('%' + seria + '%')
+@login_required
+async def strona_glowna_async():
+    limit, after, before, selected, key = _catalog_args()
 
-        if oprawa:
-            query += " AND LOWER(oprawa) LIKE %s"
-            values.append('%' + oprawa + '%')
+    if selected:
+        page = await catalog_cache.page_async(key, lambda: _facet_page_async(selected, after, before, limit))
+    else:
+        page = await catalog_cache.page_async(
+            key, lambda: fetch_books_page_async(after=after, before=before, limit=limit))
 
-        if rok_wydania:
-            query += " AND rok_wydania LIKE %s"
-            values.append('%' + rok_wydania + '%')
+    # counted in memory; only a reload of the facet index reads the table, on a thread instead of the loop
+    facets = await asyncio.to_thread(facet_index.counts, selected, current_app.config['FACET_LIMIT'])
+    # the rows are rendered from fragments in the catalog cache, possibly in redis
+    return await asyncio.to_thread(_catalog, page, limit, selected, facets)
 
-        if ilosc_stron:
-            query += " AND ilosc_stron LIKE %s"
-            values.append('%' + ilosc_stron + '%')
 
-        if rzad:
-            query += " AND LOWER(rzad) LIKE %s"
-            values.append('%' + rzad + '%')
+async def _facet_page_async(selected, after, before, limit):
+    matching = await asyncio.to_thread(facet_index.matching, selected)
+    ids, prev_cursor, next_cursor = page_ids(matching, after, before, limit)
+    return await fetch_books_by_ids_async(ids), prev_cursor, next_cursor
 
-        if regal:
-            query += " AND LOWER(regal) LIKE %s"
-            values.append('%' + regal + '%')
 
-        if polka:
-            query += " AND LOWER(polka) LIKE %s"
-            values.append('%' + polka + '%')
+@login_required
+async def wyszukaj_ksiazke_async():
+    form = _search_form()
+    if form is None:
+        return render_template('wyszukaj_ksiazke.html', books=[])
 
-        cursor.execute(query, values)
-        books = cursor.fetchall()
+    queries, errors = _search_queries(form)
+    if errors:
+        return render_template('wyszukaj_ksiazke.html', errors=errors)
 
-        return render_template('wyszukaj_ksiazke.html', books=books)
-    else:
-        return render_template('wyszukaj_ksiazke.html', books=[])
+    results, counts = queries
+    books = await fetch_books_async(*results)
+    facets = await fetch_counts_async(*counts, limit=current_app.config['FACET_LIMIT'])
+    # the rows are rendered from fragments in the catalog cache, possibly in redis
+    return await asyncio.to_thread(_search_results, form, books, facets)
 
 
-@app.route('/wyloguj')
-def wyloguj():
-    session.pop('logged_in', None)
-    session.pop('nazwa_uzytkownika', None)
-    return redirect(url_for('index'))
+ASYNC_VIEWS = {
+    'strony.strona_glowna': strona_glowna_async,
+    'strony.wyszukaj_ksiazke': wyszukaj_ksiazke_async,
+}
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=os.environ.get('FLASK_DEBUG') == '1')
\ No newline at end of file
@@ -0,0 +1,19 @@
+"""ASGI entry point: the catalog, search, book, typeahead and change feed reads served on an event loop.
+
+    uvicorn asgi:application
+    gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker asgi:application
+
+Run more than one process through gunicorn, whose config checks at startup
+that the cache, throttle and sessions are shared between the workers.
+
+Needs an ASGI server (uvicorn) and, with DB_BACKEND = 'mysql', the aiomysql
+driver. Settings are those of wsgi.py, plus ASYNC_DB_POOL_SIZE and
+ASYNC_WSGI_THREADS. A request waiting on the database or on the change feed
+costs a coroutine rather than a thread, so one worker holds thousands of
+slow clients; the remaining routes run on ASYNC_WSGI_THREADS threads as
+under gunicorn's gthread workers.
+"""
+import aio
+from wsgi import app
+
+application = aio.create_asgi_app(app)
@@ -0,0 +1,341 @@
+import base64
+import gzip
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+import urllib.parse
+import urllib.request
+
+import click
+from flask import abort, current_app, request, send_from_directory, url_for
+from markupsafe import Markup, escape
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# third-party files the templates used to load from CDNs; `flask vendor-assets` stores them under static/vendor
+VENDOR = {
+    'vendor/bootstrap-5.3.0-alpha3/bootstrap.min.css': (
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0-alpha3/dist/css/bootstrap.min.css',
+        'sha384-KK94CHFLLe+nY2dmCWGMq91rCGa5gtU4mk92HdvYe+M/SXH301p5ILy+dN9+nJOZ'),
+    'vendor/bootstrap-5.3.0/bootstrap.bundle.min.js': (
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js',
+        'sha384-geWF76RCwLtnZ8qwWowPQNguL3RmwHVBC9FhGdlKrxdiJJigb/j/68SIy3Te4Bkz'),
+    'vendor/bootstrap-4.6.0/bootstrap.min.css': (
+        'https://cdnjs.cloudflare.com/ajax/libs/twitter-bootstrap/4.6.0/css/bootstrap.min.css', None),
+    'vendor/bootstrap-4.6.0/bootstrap.min.js': (
+        'https://cdnjs.cloudflare.com/ajax/libs/twitter-bootstrap/4.6.0/js/bootstrap.min.js', None),
+    'vendor/font-awesome-4.7.0/css/font-awesome.min.css': (
+        'https://maxcdn.bootstrapcdn.com/font-awesome/4.7.0/css/font-awesome.min.css', None),
+    'vendor/jquery-3.6.0/jquery.min.js': (
+        'https://cdnjs.cloudflare.com/ajax/libs/jquery/3.6.0/jquery.min.js', None),
+    'vendor/jquery-3.6.4/jquery.min.js': (
+        'https://code.jquery.com/jquery-3.6.4.min.js', None),
+}
+
+# one file per bundle in production; the sources one by one (vendor ones from the CDN if not vendored) otherwise
+BUNDLES = {
+    'vendor.css': ['vendor/bootstrap-5.3.0-alpha3/bootstrap.min.css',
+                   'vendor/font-awesome-4.7.0/css/font-awesome.min.css'],
+    'bootstrap4.css': ['vendor/bootstrap-4.6.0/bootstrap.min.css'],
+    'bootstrap4.js': ['vendor/jquery-3.6.0/jquery.min.js', 'vendor/bootstrap-4.6.0/bootstrap.min.js'],
+    'bootstrap5.js': ['vendor/jquery-3.6.4/jquery.min.js', 'vendor/bootstrap-5.3.0/bootstrap.bundle.min.js'],
+}
+
+# images displayed far smaller than they are stored; resized (at 2x for HiDPI) when Pillow is installed
+IMAGE_SIZES = {
+    'images/bookicon.png': (140, 100),
+    'images/search.png': (80, 80),
+    'images/profil3.png': (80, 80),
+}
+
+COMPRESSIBLE = {'.css', '.js', '.svg', '.eot', '.ttf', '.otf', '.json'}
+
+CSS_STRING = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')''')
+CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+CSS_SPACE = re.compile(r'\s+')
+CSS_PUNCTUATION = re.compile(r'\s*([{};,>])\s*')
+CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+
+
+def _minify_code(css):
+    css = CSS_SPACE.sub(' ', css)
+    css = CSS_PUNCTUATION.sub(r'\1', css)
+    # only after the colon: before it, "a :hover" and "a:hover" are different selectors
+    return re.sub(r':\s+', ':', css).replace(';}', '}')
+
+
+def minify_css(css):
+    # quoted strings (content, data: URIs) are kept verbatim; split() puts them at the odd indexes
+    parts = CSS_STRING.split(CSS_COMMENT.sub('', css))
+    return ''.join(part if index % 2 else _minify_code(part) for index, part in enumerate(parts)).strip()
+
+
+def fingerprint(name, content):
+    stem, ext = posixpath.splitext(name)
+    return f'{stem}.{hashlib.sha256(content).hexdigest()[:12]}{ext}'
+
+
+def _resolve(reference, source):
+    """Logical asset name a url() in `source` points at, or None for data:, external and unknown references."""
+    path = urllib.parse.urlsplit(reference).path
+    if not path or reference.startswith(('data:', '#')) or urllib.parse.urlsplit(reference).scheme:
+        return None
+    if path.startswith('/static/'):
+        return path[len('/static/'):]
+    if path.startswith('/'):
+        return None
+    return posixpath.normpath(posixpath.join(posixpath.dirname(source), path))
+
+
+def _optimize_image(name, content):
+    size = IMAGE_SIZES.get(name)
+    if Image is None or size is None:
+        return content
+    image = Image.open(io.BytesIO(content))
+    image.thumbnail(size)
+    output = io.BytesIO()
+    image.save(output, format=image.format, optimize=True)
+    return output.getvalue() if output.tell() < len(content) else content
+
+
+def _compress(path, content):
+    encodings = []
+    variants = [('gzip', '.gz', lambda data: gzip.compress(data, 9, mtime=0))]
+    if brotli is not None:
+        variants.insert(0, ('br', '.br', lambda data: brotli.compress(data, quality=11)))
+    for encoding, suffix, compress in variants:
+        compressed = compress(content)
+        # not worth a second file (and a Vary round trip) for a few percent
+        if len(compressed) < len(content) * 0.9:
+            with open(path + suffix, 'wb') as f:
+                f.write(compressed)
+            encodings.append(encoding)
+    return encodings
+
+
+class Builder:
+    """Minifies, bundles, fingerprints and pre-compresses static/ into an output directory."""
+
+    def __init__(self, source_dir, output_dir, url_prefix='/assets', bundles=BUNDLES):
+        self.source_dir = source_dir
+        self.output_dir = output_dir
+        self.url_prefix = url_prefix.rstrip('/')
+        self.bundles = bundles
+        self.assets = {}
+        self.compressed = {}
+
+    def _read(self, name):
+        with open(os.path.join(self.source_dir, *name.split('/')), 'rb') as f:
+            return f.read()
+
+    def _write(self, name, content):
+        built = fingerprint(name, content)
+        path = os.path.join(self.output_dir, *built.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+        if posixpath.splitext(name)[1] in COMPRESSIBLE:
+            encodings = _compress(path, content)
+            if encodings:
+                self.compressed[built] = encodings
+        self.assets[name] = built
+        return built
+
+    def _sources(self, extensions):
+        for root, dirs, files in os.walk(self.source_dir):
+            dirs[:] = sorted(d for d in dirs
+                             if os.path.abspath(os.path.join(root, d)) != os.path.abspath(self.output_dir))
+            for filename in sorted(files):
+                name = os.path.relpath(os.path.join(root, filename), self.source_dir).replace(os.sep, '/')
+                if posixpath.splitext(name)[1] in extensions:
+                    yield name
+
+    def _rewrite_urls(self, css, source):
+        def replace(match):
+            name = _resolve(match.group(2), source)
+            if name is None or name not in self.assets:
+                return match.group(0)
+            return f'url({self.url_prefix}/{self.assets[name]})'
+        return CSS_URL.sub(replace, css)
+
+    def _css(self, sources):
+        parts = []
+        for source in sources:
+            css = self._rewrite_urls(self._read(source).decode('utf-8'), source)
+            parts.append(css.strip() if source.endswith('.min.css') else minify_css(css))
+        return '\n'.join(parts).encode('utf-8')
+
+    def build(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        bundled = {source for sources in self.bundles.values() for source in sources}
+
+        # files referenced from CSS first, so the stylesheets can point at their fingerprinted names
+        for name in self._sources({'.png', '.jpg', '.jpeg', '.gif', '.svg', '.ico', '.webp',
+                                   '.eot', '.ttf', '.otf', '.woff', '.woff2'}):
+            self._write(name, _optimize_image(name, self._read(name)))
+
+        for name in self._sources({'.css', '.js'}):
+            if name in bundled:
+                continue
+            content = self._css([name]) if name.endswith('.css') else self._read(name)
+            self._write(name, content)
+
+        for name, sources in self.bundles.items():
+            missing = [source for source in sources if not os.path.exists(os.path.join(self.source_dir, source))]
+            if missing:
+                raise click.ClickException(f"Brak plików {', '.join(missing)}; uruchom najpierw flask vendor-assets")
+            if name.endswith('.css'):
+                content = self._css(sources)
+            else:
+                content = b';\n'.join(self._read(source).rstrip().rstrip(b';') for source in sources) + b';\n'
+            self._write(name, content)
+
+        manifest = {'assets': self.assets, 'compressed': self.compressed}
+        with open(os.path.join(self.output_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        return manifest
+
+
+def _fetch(url):
+    with urllib.request.urlopen(url, timeout=30) as response:
+        return response.read()
+
+
+def vendor(static_dir, fetch=_fetch):
+    """Downloads VENDOR (and the fonts/images their CSS refers to) into static/vendor."""
+    fetched = []
+    for name, (url, integrity) in VENDOR.items():
+        content = fetch(url)
+        if integrity:
+            algorithm, expected = integrity.split('-', 1)
+            actual = base64.b64encode(hashlib.new(algorithm, content).digest()).decode()
+            if actual != expected:
+                raise click.ClickException(f'Niezgodna suma kontrolna {url}')
+        files = [(name, content)]
+        if name.endswith('.css'):
+            for reference in sorted({match.group(2) for match in CSS_URL.finditer(content.decode('utf-8'))}):
+                target = _resolve(reference, name)
+                if target is not None and target.startswith('vendor/'):
+                    files.append((target, fetch(urllib.parse.urljoin(url, urllib.parse.urlsplit(reference).path))))
+        for target, data in files:
+            path = os.path.join(static_dir, *target.split('/'))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(data)
+            fetched.append(target)
+    return fetched
+
+
+class Assets:
+    """Template helpers resolving logical asset names through the build manifest."""
+
+    def __init__(self, app):
+        self.app = app
+        self.directory = app.config['ASSETS_DIR']
+        self.assets = {}
+        self.built = set()
+        self.compressed = {}
+        self.reload()
+
+    def reload(self):
+        path = os.path.join(self.directory, 'manifest.json')
+        if not os.path.exists(path):
+            self.assets, self.built, self.compressed = {}, set(), {}
+            return
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        self.assets = manifest['assets']
+        self.built = set(self.assets.values())
+        self.compressed = {built: set(encodings) for built, encodings in manifest['compressed'].items()}
+
+    def url(self, name):
+        built = self.assets.get(name)
+        if built is not None:
+            return url_for('asset', filename=built)
+        if name in VENDOR and not os.path.exists(os.path.join(self.app.static_folder, *name.split('/'))):
+            return VENDOR[name][0]
+        return url_for('static', filename=name)
+
+    def _urls(self, name):
+        if name in self.assets or name not in BUNDLES:
+            return [(self.url(name), None)]
+        urls = []
+        for source in BUNDLES[name]:
+            url = self.url(source)
+            # subresource integrity only matters for files still loaded from a CDN
+            urls.append((url, VENDOR[source][1] if url == VENDOR.get(source, (None,))[0] else None))
+        return urls
+
+    def stylesheet(self, name):
+        return Markup(''.join(
+            f'<link rel="stylesheet" href="{escape(url)}"'
+            + (f' integrity="{integrity}" crossorigin="anonymous"' if integrity else '') + '>'
+            for url, integrity in self._urls(name)))
+
+    def script(self, name):
+        return Markup(''.join(
+            f'<script src="{escape(url)}"'
+            + (f' integrity="{integrity}" crossorigin="anonymous"' if integrity else '') + '></script>'
+            for url, integrity in self._urls(name)))
+
+
+def serve_asset(filename):
+    assets = current_app.extensions['assets']
+    if filename not in assets.built:
+        abort(404)
+    encodings = assets.compressed.get(filename, ())
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    encoding = next((encoding for encoding in ('br', 'gzip')
+                     if encoding in encodings and encoding in request.accept_encodings), None)
+
+    suffix = {'br': '.br', 'gzip': '.gz'}.get(encoding, '')
+    response = send_from_directory(assets.directory, filename + suffix, mimetype=mimetype, max_age=31536000)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if encodings:
+        response.vary.add('Accept-Encoding')
+    # the name changes with the content, so the file never has to be revalidated
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def init_app(app):
+    app.config.setdefault('ASSETS_DIR', os.path.join(app.static_folder, 'dist'))
+    app.config.setdefault('ASSETS_URL', '/assets')
+
+    assets = Assets(app)
+    app.extensions['assets'] = assets
+    app.add_url_rule(app.config['ASSETS_URL'] + '/<path:filename>', 'asset', serve_asset)
+    app.jinja_env.globals.update(asset_url=assets.url, stylesheet=assets.stylesheet, script=assets.script)
+
+    @app.cli.command('vendor-assets')
+    def vendor_assets_command():
+        """Pobiera zależności z CDN do static/vendor."""
+        for name in vendor(app.static_folder):
+            click.echo(name)
+
+    @app.cli.command('build-assets')
+    @click.option('--clean', is_flag=True, help='Usuń wcześniejsze wersje plików.')
+    def build_assets_command(clean):
+        """Minifikuje, łączy, oznacza skrótem i kompresuje pliki statyczne."""
+        if clean and os.path.isdir(assets.directory):
+            shutil.rmtree(assets.directory)
+        manifest = Builder(app.static_folder, assets.directory, app.config['ASSETS_URL']).build()
+        assets.reload()
+        click.echo(f"Zbudowano {len(manifest['assets'])} plików, skompresowano {len(manifest['compressed'])}")
+
+    return assets
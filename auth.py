@@ -0,0 +1,52 @@
+import inspect
+from functools import wraps
+
+from flask import g, redirect, session, url_for
+
+from users import PROFILE_COLUMNS, find_user
+
+
+def login_user(user_id, nazwa_uzytkownika):
+    regenerate = getattr(session, 'regenerate', None)
+    if regenerate is not None:
+        regenerate()
+    session['logged_in'] = True
+    session['user_id'] = user_id
+    session['nazwa_uzytkownika'] = nazwa_uzytkownika
+    g.pop('user', None)
+
+
+def logout_user():
+    session.pop('logged_in', None)
+    session.pop('user_id', None)
+    session.pop('nazwa_uzytkownika', None)
+    g.pop('user', None)
+
+
+def is_authenticated():
+    return bool(session.get('logged_in'))
+
+
+def current_user():
+    """Profile of the logged-in user, loaded at most once per request."""
+    if 'user' not in g:
+        nazwa_uzytkownika = session.get('nazwa_uzytkownika')
+        g.user = find_user(nazwa_uzytkownika, PROFILE_COLUMNS) if is_authenticated() and nazwa_uzytkownika else None
+    return g.user
+
+
+def login_required(view):
+    if inspect.iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapped_async(*args, **kwargs):
+            if not is_authenticated():
+                return redirect(url_for('strony.login'))
+            return await view(*args, **kwargs)
+        return wrapped_async
+
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if not is_authenticated():
+            return redirect(url_for('strony.login'))
+        return view(*args, **kwargs)
+    return wrapped
@@ -0,0 +1,129 @@
+import db
+from books import delete_books, fetch_existing_ids, update_books, update_books_each
+from validators import BOOK_FIELDS, BOOK_SCHEMA
+
+NOT_FOUND = "Nie znaleziono książki"
+
+
+class BatchReport:
+    """Outcome of a batch, per book id in the order given.
+
+    A batch with any invalid id or value writes nothing; ids that do not exist are only reported.
+    """
+
+    def __init__(self):
+        self.results = {}
+        self.applied = False
+
+    def reject(self, book_id, errors):
+        self.results[book_id] = errors
+
+    def accept(self, book_id):
+        self.results.setdefault(book_id, [])
+
+    @property
+    def ok(self):
+        return [book_id for book_id, errors in self.results.items() if not errors]
+
+    @property
+    def rejected(self):
+        return [book_id for book_id, errors in self.results.items() if errors]
+
+    def to_dict(self):
+        return {
+            'zmienione': len(self.ok) if self.applied else 0,
+            'odrzucone': len(self.rejected),
+            'wyniki': [{'id': book_id, 'ok': self.applied and not errors, 'errors': errors}
+                       for book_id, errors in self.results.items()],
+        }
+
+
+def parse_ids(values, report, repeats_allowed=True):
+    """Positive integer ids, each once; anything else is rejected in the report."""
+    ids = []
+    for value in values:
+        try:
+            book_id = None if isinstance(value, (bool, float)) else int(value)
+        except (TypeError, ValueError):
+            book_id = None
+        if book_id is None or book_id < 1:
+            report.reject(str(value), ["Nieprawidłowy identyfikator"])
+        elif book_id in report.results:
+            if not repeats_allowed:
+                report.reject(book_id, ["Powtórzony identyfikator"])
+        else:
+            report.accept(book_id)
+            ids.append(book_id)
+    return ids
+
+
+def _clean_changes(values):
+    unknown = [field for field in values if field not in BOOK_FIELDS]
+    if unknown:
+        return None, ["Nieznane pola: " + ", ".join(unknown)]
+    if not values:
+        return None, ["Brak zmian"]
+    return BOOK_SCHEMA.partial(values).clean(values)
+
+
+def _apply(report, ids, write, catalog_cache):
+    # validation has already passed for every item; ids that no longer exist are reported and skipped
+    existing = fetch_existing_ids(ids)
+    for book_id in ids:
+        if book_id not in existing:
+            report.reject(book_id, [NOT_FOUND])
+    ids = [book_id for book_id in ids if book_id in existing]
+    try:
+        write(ids)
+        db.commit()
+    except db.Error:
+        db.rollback()
+        raise
+    report.applied = True
+    if ids:
+        catalog_cache.invalidate_many(ids)
+    return report
+
+
+def update_many(ids, values, catalog_cache):
+    """Sets the same fields on every book: validated once, written with one UPDATE ... WHERE id IN."""
+    report = BatchReport()
+    ids = parse_ids(ids, report)
+    changes, errors = _clean_changes(values)
+    if errors:
+        for book_id in ids:
+            report.reject(book_id, errors)
+    if report.rejected:
+        return report
+    return _apply(report, ids, lambda ids: update_books(ids, changes), catalog_cache)
+
+
+def update_each(items, catalog_cache):
+    """[{'id': ..., field: value, ...}, ...] with different values per book, written with executemany."""
+    report = BatchReport()
+    changes = {}
+    for item in items:
+        if not isinstance(item, dict):
+            report.reject(str(item), ["Oczekiwano obiektu"])
+            continue
+        ids = parse_ids([item.get('id')], report, repeats_allowed=False)
+        if not ids:
+            continue
+        cleaned, errors = _clean_changes({field: value for field, value in item.items() if field != 'id'})
+        if errors:
+            report.reject(ids[0], errors)
+        else:
+            changes[ids[0]] = cleaned
+    if report.rejected:
+        return report
+    return _apply(report, list(changes),
+                  lambda ids: update_books_each([(book_id, changes[book_id]) for book_id in ids]), catalog_cache)
+
+
+def delete_many(ids, catalog_cache):
+    """Deletes the given books with one DELETE ... WHERE id IN."""
+    report = BatchReport()
+    ids = parse_ids(ids, report)
+    if report.rejected:
+        return report
+    return _apply(report, ids, delete_books, catalog_cache)
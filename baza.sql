@@ -6,7 +6,7 @@ numer_telefonu VARCHAR(255) NOT NULL,
 email VARCHAR(255) NOT NULL,
 nazwa_uzytkownika VARCHAR(255) NOT NULL, 
 haslo VARCHAR(255) NOT NULL,
-verification_code VARCHAR(255) NOT NULL,
+verification_code VARCHAR(255) NOT NULL
 );
 
 
@@ -34,6 +34,6 @@ INSERT INTO ksiazki (id, tytul, autor, wydawnictwo, seria, oprawa, rok_wydania,
 (7, 'Harry Potter i Komnata Tajemnic', 'J.K. Rowling', 'Bloomsbury', 'Harry Potter', 'Miękka', 1998, 367, 1, 2, 3),
 (8, 'Wiedźmin: Ostatnie życzenie', 'Andrzej Sapkowski', 'SuperNOWA', 'Saga o Wiedźminie', 'Twarda', 1993, 277, 2, 1, 1),
 (9, 'Mroczne materie', 'Philip Pullman', 'Scholastic', 'Mroczne materie', 'Miękka', 1995, 399, 3, 3, 4),
-(10, 'Człowiek z wysokiego zamku', 'Philip K. Dick', 'G.P. Putnam's Sons', 'Brak', 'Twarda', 1962, 259, 1, 4, 2),
+(10, 'Człowiek z wysokiego zamku', 'Philip K. Dick', 'G.P. Putnam''s Sons', 'Brak', 'Twarda', 1962, 259, 1, 4, 2),
 (11, 'Zabójstwo w Orient Expressie', 'Agatha Christie', 'Agatha Christie', 'Hercule Poirot', 'Twarda', 1934, 256, 2, 5, 2),
 (12, 'Zawód: Pisarz', 'John Doe, Jane Smith', 'J.B. Lippincott & Co.', 'Brak', 'Twarda', 2022, 400, 2, 3, 1);
\ No newline at end of file
@@ -0,0 +1,359 @@
+"""Concurrent load test of the main pages, reporting latency percentiles and throughput.
+
+    python -m benchmarks.load [--driver client|server|url] [--mode sync|async|both] [--concurrency 8]
+                              [--duration 10] [--scenario strona_glowna,wyszukaj_ksiazke,login,dodaj_ksiazke]
+
+client drives the app through the Flask test client (no network), server
+starts it in a threaded WSGI server on a local port, and url targets an
+already running deployment (--url). --mode async runs the same scenarios
+against the ASGI app instead (aio.create_asgi_app): in process on an event
+loop thread with client, under uvicorn with server; --mode both runs sync
+and then async and prints both. The api_* scenarios read the JSON API,
+whose read endpoints have async views. Run benchmarks.seed first; the
+login scenario signs in as the benchmark user it creates. Every simulated
+user logs in from one address as one account, so the client and server
+drivers turn login throttling off; start a deployment measured with --url
+with THROTTLE_ENABLED=0.
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import logging
+import math
+import random
+import socket
+import sys
+import threading
+import time
+from http.cookies import SimpleCookie
+from pathlib import Path
+from urllib.parse import urlencode, urlsplit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.seed import BENCHMARK_CODE, BENCHMARK_PASSWORD, BENCHMARK_USER, WORDS, synthetic_books  # noqa: E402
+
+LOGIN_FORM = {'nazwa_uzytkownika': BENCHMARK_USER, 'haslo': BENCHMARK_PASSWORD, 'verification_code': BENCHMARK_CODE}
+
+
+def percentile(sorted_values, fraction):
+    # nearest-rank method
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+class ClientSession:
+    """One simulated user on the Flask test client."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, form=None):
+        response = self.client.open(path, method=method, data=form)
+        response.close()
+        return response.status_code
+
+
+class HTTPSession:
+    """One simulated user on a keep-alive HTTP connection, with its own cookie jar."""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+        self.prefix = parts.path.rstrip('/')
+        self.cookies = SimpleCookie()
+
+    def request(self, method, path, form=None):
+        headers = {}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{key}={morsel.value}' for key, morsel in self.cookies.items())
+        body = None
+        if form is not None:
+            body = urlencode(form)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        self.connection.request(method, self.prefix + path, body=body, headers=headers)
+        response = self.connection.getresponse()
+        response.read()
+        for header in response.headers.get_all('Set-Cookie') or ():
+            self.cookies.load(header)
+        return response.status
+
+
+class ASGISession:
+    """One simulated user calling an ASGI app running on `loop` in another thread, with its own cookie jar."""
+
+    def __init__(self, application, loop):
+        self.application = application
+        self.loop = loop
+        self.cookies = SimpleCookie()
+
+    async def _call(self, method, path, form):
+        path, _, query = path.partition('?')
+        headers = []
+        if self.cookies:
+            headers.append((b'cookie', '; '.join(f'{key}={morsel.value}'
+                                                 for key, morsel in self.cookies.items()).encode('latin-1')))
+        body = b''
+        if form is not None:
+            body = urlencode(form).encode()
+            headers.append((b'content-type', b'application/x-www-form-urlencoded'))
+        scope = {'type': 'http', 'http_version': '1.1', 'method': method, 'scheme': 'http', 'path': path,
+                 'root_path': '', 'query_string': query.encode('latin-1'), 'headers': headers,
+                 'server': ('localhost', 80), 'client': ('127.0.0.1', 0)}
+        messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        started = []
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            await asyncio.Event().wait()
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                started.append(message)
+
+        await self.application(scope, receive, send)
+        for name, value in started[0]['headers']:
+            if name == b'set-cookie':
+                self.cookies.load(value.decode('latin-1'))
+        return started[0]['status']
+
+    def request(self, method, path, form=None):
+        return asyncio.run_coroutine_threadsafe(self._call(method, path, form), self.loop).result()
+
+
+class Scenarios:
+
+    def __init__(self, max_id):
+        self.max_id = max_id
+        self.books = synthetic_books(10 ** 9, seed=random.randrange(10 ** 6))
+        self._books_lock = threading.Lock()
+
+    def strona_glowna(self, session, rng):
+        return session.request('GET', f'/strona_glowna?after={rng.randint(0, self.max_id)}')
+
+    def wyszukaj_ksiazke(self, session, rng):
+        form = dict.fromkeys(('tytul', 'autor', 'wydawnictwo', 'seria', 'oprawa', 'rok_wydania', 'ilosc_stron',
+                              'rzad', 'regal', 'polka'), '')
+        form['tytul'] = rng.choice(WORDS)
+        if rng.random() < 0.5:
+            form['rok_wydania'] = f'{rng.randint(1800, 1990)}-{rng.randint(1991, 2023)}'
+        return session.request('POST', '/wyszukaj_ksiazke', form)
+
+    def login(self, session, rng):
+        return session.request('POST', '/login', LOGIN_FORM)
+
+    def dodaj_ksiazke(self, session, rng):
+        fields = ('tytul', 'autor', 'wydawnictwo', 'seria', 'oprawa', 'rok_wydania', 'ilosc_stron', 'rzad', 'regal',
+                  'polka')
+        with self._books_lock:
+            book = next(self.books)
+        return session.request('POST', '/dodaj_ksiazke', dict(zip(fields, map(str, book))))
+
+    def api_ksiazki(self, session, rng):
+        return session.request('GET', f'/api/v1/ksiazki?after={rng.randint(0, self.max_id)}')
+
+    def api_ksiazka(self, session, rng):
+        return session.request('GET', f'/api/v1/ksiazki/{rng.randint(1, self.max_id)}')
+
+    def api_szukaj(self, session, rng):
+        return session.request('GET', '/api/v1/ksiazki/szukaj?' + urlencode({'tytul': rng.choice(WORDS)}))
+
+    def api_podpowiedzi(self, session, rng):
+        return session.request('GET', '/api/v1/podpowiedzi/tytul?' + urlencode({'q': rng.choice(WORDS)[:3]}))
+
+
+class Result:
+
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def record(self, latency, ok):
+        with self._lock:
+            self.latencies.append(latency)
+            if not ok:
+                self.errors += 1
+
+    def summary(self, elapsed):
+        latencies = sorted(self.latencies)
+        return {
+            'scenario': self.name,
+            'requests': len(latencies),
+            'errors': self.errors,
+            'rps': len(latencies) / elapsed if elapsed else 0.0,
+            'p50_ms': percentile(latencies, 0.50) * 1000,
+            'p95_ms': percentile(latencies, 0.95) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+        }
+
+
+def run(make_session, scenario_names, scenarios, concurrency, duration):
+    results = {name: Result(name) for name in scenario_names}
+    deadline = time.perf_counter() + duration
+    failures = []
+
+    def worker(number):
+        rng = random.Random(number)
+        try:
+            session = make_session()
+            if session.request('POST', '/login', LOGIN_FORM) not in (200, 302):
+                raise RuntimeError('logowanie użytkownika testowego nie powiodło się; uruchom benchmarks.seed')
+            while time.perf_counter() < deadline:
+                name = rng.choice(scenario_names)
+                started = time.perf_counter()
+                status = getattr(scenarios, name)(session, rng)
+                results[name].record(time.perf_counter() - started, status < 400)
+        except Exception as error:
+            failures.append(error)
+
+    threads = [threading.Thread(target=worker, args=(number,)) for number in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    if failures:
+        raise failures[0]
+    return [results[name].summary(elapsed) for name in scenario_names], elapsed
+
+
+def start_server(app, host='127.0.0.1'):
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    # keep-alive, so the numbers measure the app rather than TCP handshakes
+    WSGIRequestHandler.protocol_version = 'HTTP/1.1'
+    server = make_server(host, 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f'http://{host}:{server.server_port}'
+
+
+def start_loop():
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    return loop, thread
+
+
+def stop_loop(loop, thread, application):
+    asyncio.run_coroutine_threadsafe(application.close(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+def start_asgi_server(application, host='127.0.0.1'):
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit('--driver server --mode async wymaga pakietu uvicorn') from None
+
+    with socket.socket() as probe:
+        probe.bind((host, 0))
+        port = probe.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(application, host=host, port=port, log_level='warning'))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise SystemExit('serwer uvicorn nie wystartował')
+        time.sleep(0.05)
+    return server, thread, f'http://{host}:{port}'
+
+
+def measure(args, mode, scenario_names):
+    """Runs the scenarios against the app in `mode`; returns (rows, elapsed)."""
+    scenarios = Scenarios(args.max_id)
+    if args.driver == 'url':
+        return run(lambda: HTTPSession(args.url), scenario_names, scenarios, args.concurrency, args.duration)
+
+    from wsgi import app
+    app.config['THROTTLE_ENABLED'] = False
+    if mode == 'sync':
+        if args.driver == 'client':
+            return run(lambda: ClientSession(app), scenario_names, scenarios, args.concurrency, args.duration)
+        server, url = start_server(app)
+        try:
+            return run(lambda: HTTPSession(url), scenario_names, scenarios, args.concurrency, args.duration)
+        finally:
+            server.shutdown()
+
+    from aio import create_asgi_app
+    application = create_asgi_app(app)
+    if args.driver == 'client':
+        loop, thread = start_loop()
+        try:
+            return run(lambda: ASGISession(application, loop), scenario_names, scenarios, args.concurrency,
+                       args.duration)
+        finally:
+            stop_loop(loop, thread, application)
+    server, thread, url = start_asgi_server(application)
+    try:
+        return run(lambda: HTTPSession(url), scenario_names, scenarios, args.concurrency, args.duration)
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+def print_report(rows, elapsed):
+    print(f"{'scenariusz':<18}{'żądania':>9}{'błędy':>7}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for row in rows:
+        print(f"{row['scenario']:<18}{row['requests']:>9}{row['errors']:>7}{row['rps']:>9.1f}"
+              f"{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}")
+    total = sum(row['requests'] for row in rows)
+    print(f"razem: {total} żądań w {elapsed:.1f} s ({total / elapsed:.1f} req/s)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--driver', choices=('client', 'server', 'url'), default='client')
+    parser.add_argument('--url', help='adres działającej aplikacji dla --driver url')
+    parser.add_argument('--mode', choices=('sync', 'async', 'both'), default='sync',
+                        help='aplikacja WSGI, aplikacja ASGI albo obie po kolei')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0, help='sekundy')
+    parser.add_argument('--scenario', default='strona_glowna,wyszukaj_ksiazke,login,dodaj_ksiazke')
+    parser.add_argument('--max-id', type=int, default=1000, help='zakres kursorów stronicowania (liczba zasianych książek)')
+    parser.add_argument('--json', action='store_true', help='wynik jako JSON, np. do porównań w CI')
+    args = parser.parse_args(argv)
+
+    scenario_names = [name.strip() for name in args.scenario.split(',') if name.strip()]
+    unknown = [name for name in scenario_names if not hasattr(Scenarios, name)]
+    if unknown:
+        parser.error(f"nieznane scenariusze: {', '.join(unknown)}")
+
+    if args.driver == 'url':
+        if not args.url:
+            parser.error('--driver url wymaga --url')
+        if args.mode != 'sync':
+            parser.error('z --driver url tryb wynika z uruchomionej aplikacji; --mode nie ma zastosowania')
+
+    modes = ('sync', 'async') if args.mode == 'both' else (args.mode,)
+    results = {mode: measure(args, mode, scenario_names) for mode in modes}
+
+    if args.json:
+        report = {mode: {'driver': args.driver, 'mode': mode, 'concurrency': args.concurrency, 'elapsed': elapsed,
+                         'scenarios': rows} for mode, (rows, elapsed) in results.items()}
+        print(json.dumps(report[args.mode] if args.mode != 'both' else report, indent=2))
+        return
+    for mode, (rows, elapsed) in results.items():
+        if len(results) > 1:
+            print(f'tryb {mode}:')
+        print_report(rows, elapsed)
+    if len(results) > 1:
+        print(f"{'scenariusz':<18}{'req/s sync':>12}{'req/s async':>13}{'p95 sync':>10}{'p95 async':>11}")
+        for sync, asynchronous in zip(results['sync'][0], results['async'][0]):
+            print(f"{sync['scenario']:<18}{sync['rps']:>12.1f}{asynchronous['rps']:>13.1f}"
+                  f"{sync['p95_ms']:>10.1f}{asynchronous['p95_ms']:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Fill ksiazki with a synthetic catalog and create the benchmark user.
+
+    python -m benchmarks.seed --rows 100000 [--truncate]
+
+Rows are generated from a fixed random seed, so the same --rows always
+produces the same catalog. Database settings come from the app config;
+create the schema first with `python migrate.py up`.
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import db  # noqa: E402
+from books import INSERT_BOOK, changed_at, reserve_changes  # noqa: E402
+from db import get_cursor  # noqa: E402
+from users import find_user, insert_user  # noqa: E402
+
+SIZES = (1000, 10000, 100000, 1000000)
+
+BENCHMARK_USER = 'benchmark'
+BENCHMARK_PASSWORD = 'Benchmark1'
+BENCHMARK_CODE = '1234'
+
+WORDS = ('Pan', 'Lalka', 'Wiedźmin', 'Noc', 'Dzień', 'Miasto', 'Ogród', 'Zamek', 'Rzeka', 'Las', 'Morze', 'Droga',
+         'Krew', 'Pieśń', 'Ziemia', 'Dom', 'Czas', 'Sen', 'Wiatr', 'Kamień', 'Światło', 'Cień', 'Wojna', 'Pokój')
+CONNECTORS = ('i', 'w', 'na', 'pod', 'za', 'bez')
+FIRST_NAMES = ('Adam', 'Anna', 'Jan', 'Maria', 'Piotr', 'Zofia', 'Andrzej', 'Olga', 'Henryk', 'Wisława', 'Stanisław')
+LAST_NAMES = ('Nowak', 'Kowalska', 'Mickiewicz', 'Tokarczuk', 'Sienkiewicz', 'Szymborska', 'Lem', 'Prus', 'Sapkowski')
+PUBLISHERS = ('Znak', 'Czytelnik', 'SuperNOWA', 'Wydawnictwo Literackie', 'Iskry', 'Agora', 'Prószyński i S-ka')
+SERIES = ('Brak', 'Brak', 'Brak', 'Saga', 'Kanon', 'Klasyka', 'Fantastyka')
+BINDINGS = ('Twarda', 'Miękka')
+
+
+def synthetic_books(count, seed=0):
+    rng = random.Random(seed)
+    for number in range(count):
+        title = f'{rng.choice(WORDS)} {rng.choice(CONNECTORS)} {rng.choice(WORDS)} {number}'
+        author = f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+        yield (title, author, rng.choice(PUBLISHERS), rng.choice(SERIES), rng.choice(BINDINGS),
+               rng.randint(1800, 2023), rng.randint(50, 1200), rng.randint(1, 20), rng.randint(1, 10),
+               rng.randint(1, 6))
+
+
+def seed_books(count, batch_size=5000, truncate=False):
+    if truncate:
+        with get_cursor() as cursor:
+            cursor.execute("DELETE FROM ksiazki")
+        db.commit()
+
+    batch = []
+    for book in synthetic_books(count):
+        batch.append(book)
+        if len(batch) >= batch_size:
+            _insert(batch)
+            batch = []
+    if batch:
+        _insert(batch)
+
+
+def _insert(batch):
+    with get_cursor() as cursor:
+        number = reserve_changes(cursor, len(batch))
+        now = changed_at()
+        cursor.executemany(INSERT_BOOK, [book + (number + index, now) for index, book in enumerate(batch)])
+    db.commit()
+
+
+def seed_user(password_hasher):
+    if find_user(BENCHMARK_USER, ('id',)) is not None:
+        return
+    insert_user('Test', 'Obciazeniowy', '123456789', 'benchmark@example.com', BENCHMARK_USER,
+                password_hasher.hash(BENCHMARK_PASSWORD), BENCHMARK_CODE)
+    db.commit()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=SIZES[0], help=f'typowo jedna z: {", ".join(map(str, SIZES))}')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--truncate', action='store_true', help='usuń istniejące książki przed zasianiem')
+    args = parser.parse_args(argv)
+
+    from wsgi import app
+
+    started = time.perf_counter()
+    with app.app_context():
+        seed_books(args.rows, args.batch_size, args.truncate)
+        seed_user(app.extensions['password_hasher'])
+    elapsed = time.perf_counter() - started
+    print(f"Zasiano {args.rows} książek w {elapsed:.1f} s ({args.rows / elapsed:.0f} wierszy/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Per-row cost of book validation.
+
+    python -m benchmarks.validation [--rows N]
+
+Compares the schema validator with the previous per-field approach
+(escape every field, then re.match with a pattern string on each call).
+"""
+import argparse
+import re
+import sys
+import time
+from html import escape
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from validators import BOOK_FIELDS, BOOK_SCHEMA, validate_book_year, validate_positive_number  # noqa: E402
+
+VALID = {'tytul': 'Lalka', 'autor': 'Bolesław Prus', 'wydawnictwo': 'Gebethner i Wolff', 'seria': 'Brak',
+         'oprawa': 'Twarda', 'rok_wydania': '1890', 'ilosc_stron': '680', 'rzad': '1', 'regal': '2', 'polka': '3'}
+INVALID = {**VALID, 'autor': 'Autor 123', 'ilosc_stron': 'abc'}
+
+
+def legacy_row(record):
+    book = {field: escape(record[field]) for field in BOOK_FIELDS}
+    errors = []
+    if not re.match(r'^[A-Za-z\s.,ęĘóÓąĄśŚłŁżŻźŹćĆńŃ]+$', book['autor']):
+        errors.append("Nieprawidłowy autor książki")
+    if not re.match(r'^[A-Za-zęĘóÓąĄśŚłŁżŻźŹćĆńŃ]+$', book['oprawa']):
+        errors.append("Nieprawidłowy rodzaj oprawy książki!")
+    if not validate_book_year(book['rok_wydania']):
+        errors.append("Niepoprawny rok wydania książki!")
+    for field in ('ilosc_stron', 'rzad', 'regal', 'polka'):
+        if not validate_positive_number(book[field]):
+            errors.append(field)
+    return tuple(book.values()), errors
+
+
+def measure(name, validate_rows, records):
+    started = time.perf_counter()
+    validate_rows(records)
+    elapsed = time.perf_counter() - started
+    print(f"{name:<10} {len(records):>8} wierszy  {elapsed * 1e6 / len(records):8.2f} µs/wiersz")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    args = parser.parse_args(argv)
+
+    # one row in ten is invalid, roughly what a hand-made import file looks like
+    records = [INVALID if i % 10 == 0 else VALID for i in range(args.rows)]
+
+    measure('legacy', lambda rows: [legacy_row(row) for row in rows], records)
+    measure('schema', BOOK_SCHEMA.rows, records)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+import time
+
+import aiodb
+from db import get_cursor
+from models import BOOK_COLUMNS, Book, column_list
+from validators import BOOK_FIELDS
+
+# zmieniono is the time of the last write in whole seconds, for Last-Modified; a write within the same
+# second as the one before moves it on by one instead, so it grows with every write to the row.
+# Takes changed_at() twice.
+TOUCH = "zmieniono = CASE WHEN zmieniono < %s THEN %s ELSE zmieniono + 1 END"
+
+# the last values are the change number from reserve_changes() and changed_at()
+INSERT_BOOK = ("INSERT INTO ksiazki (" + ", ".join(BOOK_FIELDS) + ", zmiana, zmieniono) VALUES ("
+               + ", ".join(["%s"] * (len(BOOK_FIELDS) + 2)) + ")")
+UPDATE_BOOK = ("UPDATE ksiazki SET " + ", ".join(f"{field} = %s" for field in BOOK_FIELDS)
+               + f", wersja = wersja + 1, zmiana = %s, {TOUCH} WHERE id = %s")
+
+
+def changed_at():
+    return int(time.time())
+
+
+def fetch_book(book_id, columns=BOOK_COLUMNS):
+    with get_cursor() as cursor:
+        query = f"SELECT {column_list(columns)} FROM ksiazki WHERE id = %s"
+        values = (book_id,)
+        cursor.execute(query, values)
+        return Book.from_row(cursor.fetchone(), columns)
+
+
+def fetch_books(query, values=(), columns=BOOK_COLUMNS):
+    with get_cursor() as cursor:
+        cursor.execute(query, values)
+        return [Book.from_row(row, columns) for row in cursor.fetchall()]
+
+
+def _placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def fetch_books_by_ids(ids, columns=BOOK_COLUMNS):
+    if not ids:
+        return []
+    query = f"SELECT {column_list(columns)} FROM ksiazki WHERE id IN ({_placeholders(ids)}) ORDER BY id"
+    return fetch_books(query, tuple(ids), columns)
+
+
+def fetch_existing_ids(ids):
+    if not ids:
+        return set()
+    with get_cursor() as cursor:
+        cursor.execute(f"SELECT id FROM ksiazki WHERE id IN ({_placeholders(ids)})", tuple(ids))
+        return {row[0] for row in cursor.fetchall()}
+
+
+def _page_query(after, before, limit, columns):
+    if before is not None:
+        query = f"SELECT {column_list(columns)} FROM ksiazki WHERE id < %s ORDER BY id DESC LIMIT %s"
+        return query, (before, limit + 1)
+    query = f"SELECT {column_list(columns)} FROM ksiazki WHERE id > %s ORDER BY id LIMIT %s"
+    return query, (after or 0, limit + 1)
+
+
+def _page(books, after, before, limit):
+    has_more = len(books) > limit
+    books = books[:limit]
+
+    if before is not None:
+        books.reverse()
+        prev_cursor = books[0].id if has_more else None
+        next_cursor = books[-1].id if books else None
+    else:
+        prev_cursor = books[0].id if after and books else None
+        next_cursor = books[-1].id if has_more else None
+
+    return books, prev_cursor, next_cursor
+
+
+def fetch_books_page(after=None, before=None, limit=50, columns=BOOK_COLUMNS):
+    query, values = _page_query(after, before, limit, columns)
+    return _page(fetch_books(query, values, columns), after, before, limit)
+
+
+# the same reads for the ASGI views, on the async pool from aiodb
+async def fetch_book_async(book_id, columns=BOOK_COLUMNS):
+    async with aiodb.get_cursor() as cursor:
+        await cursor.execute(f"SELECT {column_list(columns)} FROM ksiazki WHERE id = %s", (book_id,))
+        return Book.from_row(await cursor.fetchone(), columns)
+
+
+async def fetch_books_async(query, values=(), columns=BOOK_COLUMNS):
+    async with aiodb.get_cursor() as cursor:
+        await cursor.execute(query, values)
+        return [Book.from_row(row, columns) for row in await cursor.fetchall()]
+
+
+async def fetch_books_by_ids_async(ids, columns=BOOK_COLUMNS):
+    if not ids:
+        return []
+    query = f"SELECT {column_list(columns)} FROM ksiazki WHERE id IN ({_placeholders(ids)}) ORDER BY id"
+    return await fetch_books_async(query, tuple(ids), columns)
+
+
+async def fetch_books_page_async(after=None, before=None, limit=50, columns=BOOK_COLUMNS):
+    query, values = _page_query(after, before, limit, columns)
+    return _page(await fetch_books_async(query, values, columns), after, before, limit)
+
+
+def reserve_changes(cursor, count=1):
+    """First of `count` consecutive change numbers for rows written in the current transaction.
+
+    The counter row stays locked until the transaction ends, so writers take numbers one after
+    another and a number is never visible before a smaller one: a change feed reader that has seen
+    number n has seen every change up to n. Take the numbers before touching ksiazki, so all
+    writers lock in the same order.
+    """
+    cursor.execute("UPDATE licznik_zmian SET numer = numer + %s WHERE id = 1", (count,))
+    cursor.execute("SELECT numer FROM licznik_zmian WHERE id = 1")
+    return cursor.fetchone()[0] - count + 1
+
+
+def _numbered(ids, first):
+    # CASE id WHEN ... THEN ... END gives every book its own change number in one statement
+    return "CASE id " + "WHEN %s THEN %s " * len(ids) + "END", tuple(
+        value for index, book_id in enumerate(ids) for value in (book_id, first + index))
+
+
+def insert_book(values):
+    with get_cursor() as cursor:
+        number = reserve_changes(cursor)
+        cursor.execute(INSERT_BOOK, tuple(values) + (number, changed_at()))
+        return cursor.lastrowid
+
+
+def update_book(book_id, values, version=None):
+    """Rows changed; with `version`, 0 also when the book has meanwhile moved past that version."""
+    query = UPDATE_BOOK
+    with get_cursor() as cursor:
+        now = changed_at()
+        params = tuple(values) + (reserve_changes(cursor), now, now, book_id)
+        if version is not None:
+            query += " AND wersja = %s"
+            params += (version,)
+        cursor.execute(query, params)
+        return cursor.rowcount
+
+
+def delete_book(book_id):
+    return delete_books([book_id])
+
+
+def update_books(ids, values):
+    """Sets the same {field: value} on every book in ids with one statement."""
+    if not ids:
+        return 0
+    assignments = ", ".join(f"{field} = %s" for field in values)
+    with get_cursor() as cursor:
+        numbers, numbered = _numbered(ids, reserve_changes(cursor, len(ids)))
+        now = changed_at()
+        cursor.execute(f"UPDATE ksiazki SET {assignments}, wersja = wersja + 1, zmiana = {numbers}, {TOUCH} "
+                       f"WHERE id IN ({_placeholders(ids)})",
+                       tuple(values.values()) + numbered + (now, now) + tuple(ids))
+        return cursor.rowcount
+
+
+def update_books_each(changes):
+    """Applies [(book_id, {field: value}), ...], one executemany per distinct set of fields."""
+    groups = {}
+    with get_cursor() as cursor:
+        number = reserve_changes(cursor, len(changes))
+        now = changed_at()
+        for index, (book_id, values) in enumerate(changes):
+            groups.setdefault(tuple(values), []).append(tuple(values.values()) + (number + index, now, now, book_id))
+        for fields, rows in groups.items():
+            assignments = ", ".join(f"{field} = %s" for field in fields)
+            cursor.executemany(f"UPDATE ksiazki SET {assignments}, wersja = wersja + 1, zmiana = %s, {TOUCH} "
+                               f"WHERE id = %s", rows)
+
+
+def delete_books(ids):
+    """Deletes the books, leaving a tombstone in usuniete_ksiazki for the change feed."""
+    if not ids:
+        return 0
+    with get_cursor() as cursor:
+        numbers, numbered = _numbered(ids, reserve_changes(cursor, len(ids)))
+        cursor.execute(f"INSERT INTO usuniete_ksiazki (zmiana, ksiazka_id, wersja) "
+                       f"SELECT {numbers}, id, wersja + 1 FROM ksiazki WHERE id IN ({_placeholders(ids)})",
+                       numbered + tuple(ids))
+        cursor.execute(f"DELETE FROM ksiazki WHERE id IN ({_placeholders(ids)})", tuple(ids))
+        return cursor.rowcount
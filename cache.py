@@ -0,0 +1,400 @@
+import asyncio
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from blinker import Namespace
+
+import metrics
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+_signals = Namespace()
+
+# sent by CatalogCache.invalidate / invalidate_many, i.e. after a committed write; with book_id (one book),
+# book_ids (a batch) or neither, when any row may have changed
+catalog_changed = _signals.signal('catalog-changed')
+
+
+class MemoryCache:
+    """Per-process cache with TTL expiry and LRU eviction."""
+
+    # calls return without waiting on I/O, so the async views make them on the event loop
+    in_process = True
+
+    def __init__(self, max_entries=1024, default_ttl=300):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._data = OrderedDict()
+        # counters (e.g. the catalog generation) are kept outside the LRU so they are never evicted
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._counters:
+                return self._counters[key]
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def get_many(self, keys):
+        return [self.get(key) for key in keys]
+
+    def counter(self, key):
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+            self._counters.pop(key, None)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def sweep(self):
+        now = time.monotonic()
+        with self._lock:
+            expired = [key for key, (value, expires_at) in self._data.items()
+                       if expires_at is not None and expires_at <= now]
+            for key in expired:
+                del self._data[key]
+        return len(expired)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._counters.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class LocalRedis:
+    """In-process stand-in for the subset of the Redis client used by SharedCache."""
+
+    def __init__(self):
+        self._cache = MemoryCache(max_entries=float('inf'), default_ttl=0)
+
+    def get(self, key):
+        value = self._cache.get(key)
+        if value is None or isinstance(value, bytes):
+            return value
+        return str(value).encode()
+
+    def mget(self, keys):
+        return [self.get(key) for key in keys]
+
+    def set(self, key, value, ex=None):
+        self._cache.set(key, value, ttl=ex)
+
+    def delete(self, *keys):
+        for key in keys:
+            self._cache.delete(key)
+
+    def incr(self, key):
+        return self._cache.incr(key)
+
+    def sweep(self):
+        # Redis expires keys on its own; the stand-in has to be swept
+        return self._cache.sweep()
+
+    def flushdb(self):
+        self._cache.clear()
+
+
+class SharedCache:
+    """Cache stored in Redis (or LocalRedis) so all worker processes see one copy."""
+
+    in_process = False
+
+    def __init__(self, client, default_ttl=300, prefix='biblioteka:'):
+        self.client = client
+        self.default_ttl = default_ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return None if raw is None else pickle.loads(raw)
+
+    def get_many(self, keys):
+        # one round trip for a whole page of fragments
+        raws = self.client.mget([self.prefix + key for key in keys]) if keys else []
+        return [None if raw is None else pickle.loads(raw) for raw in raws]
+
+    def counter(self, key):
+        return int(self.client.get(self.prefix + key) or 0)
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        # pickled rather than JSON so Book records come back as records, not lists
+        self.client.set(self.prefix + key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), ex=ttl or None)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def incr(self, key):
+        return self.client.incr(self.prefix + key)
+
+    def clear(self):
+        self.client.flushdb()
+
+
+class NullCache:
+
+    in_process = True
+
+    def get(self, key):
+        return None
+
+    def get_many(self, keys):
+        return [None] * len(keys)
+
+    def counter(self, key):
+        return 0
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def incr(self, key):
+        return 0
+
+    def clear(self):
+        pass
+
+
+class CatalogCache:
+    """Book rows and listing pages, invalidated by the catalog write paths."""
+
+    GENERATION_KEY = 'ksiazki:generacja'
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _get_or_load(self, key, loader):
+        value = self.backend.get(key)
+        if value is not None:
+            self._count(True)
+            return value
+        self._count(False)
+        generation = self.generation()
+        value = loader()
+        if value is not None:
+            self._store(key, value, generation)
+        return value
+
+    async def _get_or_load_async(self, key, loader):
+        # the same entries as _get_or_load, filled by a coroutine for the ASGI views
+        value = await self._call_async(self.backend.get, key)
+        if value is not None:
+            self._count(True)
+            return value
+        self._count(False)
+        generation = await self._call_async(self.generation)
+        value = await loader()
+        if value is not None:
+            await self._call_async(self._store, key, value, generation)
+        return value
+
+    async def _call_async(self, function, *args):
+        # a shared backend is a network round trip: made on a thread, so the event loop keeps serving
+        if self.backend.in_process:
+            return function(*args)
+        return await asyncio.to_thread(function, *args)
+
+    def _store(self, key, value, generation):
+        # a write that committed while the value was loading bumps the generation before deleting
+        # its keys, so either that delete comes after this set or the check below sees the bump;
+        # a row read before the write is never left behind to fail the next edit's wersja check
+        self.backend.set(key, value)
+        if self.generation() != generation:
+            self.backend.delete(key)
+
+    def fragments(self, keys, render, ttl=None):
+        """Cached HTML fragments, one per key; render(index) produces the missing ones."""
+        fragments = self.backend.get_many(keys)
+        misses = 0
+        for index, fragment in enumerate(fragments):
+            if fragment is None:
+                fragments[index] = render(index)
+                self.backend.set(keys[index], fragments[index], ttl)
+                misses += 1
+        with self._lock:
+            self.hits += len(keys) - misses
+            self.misses += misses
+        return fragments
+
+    def generation(self):
+        return self.backend.counter(self.GENERATION_KEY)
+
+    def book(self, book_id, loader):
+        return self._get_or_load(f'ksiazka:{book_id}', loader)
+
+    def page(self, params, loader):
+        return self._get_or_load(self._page_key(params), loader)
+
+    async def book_async(self, book_id, loader):
+        return await self._get_or_load_async(f'ksiazka:{book_id}', loader)
+
+    async def page_async(self, params, loader):
+        return await self._get_or_load_async(await self._call_async(self._page_key, params), loader)
+
+    def _page_key(self, params):
+        return f'ksiazki:{self.generation()}:strona:' + ':'.join(str(param) for param in params)
+
+    def invalidate(self, book_id=None):
+        # the generation first, see _store
+        self.backend.incr(self.GENERATION_KEY)
+        if book_id is not None:
+            self.backend.delete(f'ksiazka:{book_id}')
+        with self._lock:
+            self.invalidations += 1
+        catalog_changed.send(self, book_id=book_id)
+
+    def invalidate_many(self, book_ids):
+        """One generation bump for a batch write, instead of one invalidate() per book."""
+        book_ids = tuple(book_ids)
+        self.backend.incr(self.GENERATION_KEY)
+        for book_id in book_ids:
+            self.backend.delete(f'ksiazka:{book_id}')
+        with self._lock:
+            self.invalidations += 1
+        catalog_changed.send(self, book_ids=book_ids)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'hit_ratio': self.hits / total if total else 0.0,
+        }
+
+
+class CatalogIndex:
+    """In-memory structure derived from ksiazki, kept current from the change numbers of its rows.
+
+    Subclasses implement _load() (rebuild from the table) and _update(book_id) (re-read one book);
+    both run under self._lock. The database is only queried when the catalog generation has moved:
+    the books changed after the last applied change number are then re-read one by one, whichever
+    worker wrote them. With several workers the generation comes from the shared cache backend.
+    """
+
+    # batches larger than this are cheaper to pick up with one reload than with a query per book
+    MAX_PATCH = 100
+
+    def __init__(self, catalog_cache):
+        self.catalog_cache = catalog_cache
+        self.generation = None
+        # highest change number applied; None until loaded and after a write of unknown rows
+        self.last_change = None
+        self._lock = threading.Lock()
+        catalog_changed.connect(self._catalog_changed, catalog_cache)
+
+    def _ensure_loaded(self):
+        # read first, so a write racing with the catch-up moves it again and is picked up by the next read
+        generation = self.catalog_cache.generation()
+        if self.last_change is None:
+            self._reload()
+        elif generation != self.generation:
+            self._catch_up()
+        self.generation = generation
+
+    def _reload(self):
+        # imported here, as changes imports this module
+        from changes import last_change
+        # taken before the load: a change committed in between is applied again by the next catch-up
+        change = last_change()
+        self._load()
+        self.last_change = change
+
+    def _catch_up(self):
+        from changes import fetch_changes
+        changes, has_more = fetch_changes(self.last_change, self.MAX_PATCH, ('id',))
+        if has_more:
+            self._reload()
+            return
+        for number, deleted, book in changes:
+            self._update(book.id)
+            self.last_change = number
+
+    def _catalog_changed(self, sender, book_id=None, book_ids=None):
+        with self._lock:
+            if book_id is None and book_ids is None:
+                # rows may have been changed without new change numbers: reload on the next read
+                self.last_change = None
+            else:
+                self.generation = None
+
+    def _load(self):
+        raise NotImplementedError
+
+    def _update(self, book_id):
+        raise NotImplementedError
+
+
+def create_backend(config):
+    backend = config.get('CACHE_BACKEND', 'memory')
+    ttl = config.get('CACHE_DEFAULT_TTL', 300)
+
+    if backend == 'memory':
+        return MemoryCache(max_entries=config.get('CACHE_MAX_ENTRIES', 1024), default_ttl=ttl)
+    if backend == 'local':
+        return SharedCache(LocalRedis(), default_ttl=ttl)
+    if backend == 'redis':
+        if redis is None:
+            raise RuntimeError("CACHE_BACKEND = 'redis' wymaga pakietu redis")
+        return SharedCache(redis.Redis.from_url(config['CACHE_REDIS_URL']), default_ttl=ttl)
+    if backend == 'null':
+        return NullCache()
+    raise ValueError(f'Nieznany CACHE_BACKEND: {backend}')
+
+
+def init_app(app):
+    catalog_cache = CatalogCache(create_backend(app.config))
+    app.extensions['catalog_cache'] = catalog_cache
+
+    @metrics.collector(app)
+    def cache_metrics():
+        stats = catalog_cache.stats()
+        for name in ('hits', 'misses', 'invalidations'):
+            yield f'biblioteka_catalog_cache_{name}_total', 'counter', f'Pamięć podręczna katalogu: {name}.', [({}, stats[name])]
+
+    return catalog_cache
@@ -0,0 +1,142 @@
+import asyncio
+import threading
+import time
+
+import aiodb
+import db
+from cache import catalog_changed
+from db import get_cursor
+from models import Book, column_list
+
+# tombstones only know which book it was and the version that removed it
+_TOMBSTONE_COLUMNS = {'id': 'ksiazka_id', 'wersja': 'wersja'}
+
+
+def _changes_query(after, limit, columns):
+    tombstone = ', '.join(f"{_TOMBSTONE_COLUMNS[column]} AS {column}" if column in _TOMBSTONE_COLUMNS
+                          else f"NULL AS {column}" for column in columns)
+    query = (
+        f"SELECT * FROM (SELECT zmiana, 0 AS usunieta, {column_list(columns)} FROM ksiazki "
+        f"WHERE zmiana > %s ORDER BY zmiana LIMIT %s) AS zmienione "
+        f"UNION ALL "
+        f"SELECT * FROM (SELECT zmiana, 1 AS usunieta, {tombstone} FROM usuniete_ksiazki "
+        f"WHERE zmiana > %s ORDER BY zmiana LIMIT %s) AS usuniete "
+        f"ORDER BY zmiana LIMIT %s"
+    )
+    return query, (after, limit + 1, after, limit + 1, limit + 1)
+
+
+def _with_version(columns):
+    return tuple(columns) + (() if 'wersja' in columns else ('wersja',))
+
+
+def _changes(rows, limit, columns):
+    return [(row[0], bool(row[1]), Book.from_row(row[2:], columns)) for row in rows[:limit]], len(rows) > limit
+
+
+def last_change():
+    """The number of the newest committed change; every change up to it is visible."""
+    with get_cursor() as cursor:
+        cursor.execute("SELECT numer FROM licznik_zmian WHERE id = 1")
+        return cursor.fetchone()[0]
+
+
+def fetch_changes(after, limit, columns):
+    """Up to `limit` (number, deleted, book) after change number `after`, oldest first, and whether more follow.
+
+    A book appears once, at its latest change; a deleted one as a Book holding only id and wersja.
+    Both tables are read in one statement, so the page is a single snapshot, and each side is
+    cut to the page size by its zmiana index: the cost follows the page, not the catalog.
+    """
+    columns = _with_version(columns)
+    with get_cursor() as cursor:
+        cursor.execute(*_changes_query(after, limit, columns))
+        return _changes(cursor.fetchall(), limit, columns)
+
+
+async def fetch_changes_async(after, limit, columns):
+    columns = _with_version(columns)
+    async with aiodb.get_cursor() as cursor:
+        await cursor.execute(*_changes_query(after, limit, columns))
+        return _changes(await cursor.fetchall(), limit, columns)
+
+
+class ChangeFeed:
+    """Reads pages of the change feed, waiting for the next write when there is nothing new yet.
+
+    Writes in this process wake waiting readers at once through catalog_changed; writes in other
+    workers are noticed by querying again every poll_interval seconds. read() waits on a thread,
+    read_async() on an event loop, where a waiting request costs no thread at all.
+    """
+
+    def __init__(self, catalog_cache, poll_interval=1.0):
+        self.poll_interval = poll_interval
+        self.stopped = False
+        self._writes = 0
+        self._changed = threading.Condition()
+        # (loop, asyncio.Event) of every waiting read_async(); writes come from other threads
+        self._async_waiters = set()
+        catalog_changed.connect(self._catalog_changed, catalog_cache)
+
+    def _wake(self):
+        self._changed.notify_all()
+        for loop, event in self._async_waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    def _catalog_changed(self, sender, **extra):
+        with self._changed:
+            self._writes += 1
+            self._wake()
+
+    def read(self, after, limit, columns, wait=0):
+        deadline = time.monotonic() + wait
+        while True:
+            with self._changed:
+                writes = self._writes
+            changes, has_more = fetch_changes(after, limit, columns)
+            remaining = deadline - time.monotonic()
+            if changes or remaining <= 0 or self.stopped:
+                return changes, has_more
+            # no pooled connection is held while waiting, and the next query starts a fresh snapshot
+            db.close_db()
+            with self._changed:
+                if self._writes == writes and not self.stopped:
+                    self._changed.wait(min(remaining, self.poll_interval))
+
+    async def read_async(self, after, limit, columns, wait=0):
+        deadline = time.monotonic() + wait
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._changed:
+            self._async_waiters.add(waiter)
+        try:
+            while True:
+                # cleared before the query, so a write committed after it still ends the wait below
+                waiter[1].clear()
+                changes, has_more = await fetch_changes_async(after, limit, columns)
+                remaining = deadline - time.monotonic()
+                if changes or remaining <= 0 or self.stopped:
+                    return changes, has_more
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), min(remaining, self.poll_interval))
+                except TimeoutError:
+                    pass
+        finally:
+            with self._changed:
+                self._async_waiters.discard(waiter)
+
+    def stop(self):
+        """Answers waiting readers now, e.g. so a draining worker is not held up by long polls."""
+        with self._changed:
+            self.stopped = True
+            self._wake()
+
+
+def init_app(app):
+    app.config.setdefault('FEED_PAGE_SIZE', 100)
+    app.config.setdefault('FEED_MAX_PAGE_SIZE', 1000)
+    # every waiting request holds one of the worker's threads for up to this many seconds
+    app.config.setdefault('FEED_MAX_WAIT', 25)
+    app.config.setdefault('FEED_POLL_INTERVAL', 1.0)
+    feed = ChangeFeed(app.extensions['catalog_cache'], app.config['FEED_POLL_INTERVAL'])
+    app.extensions['change_feed'] = feed
+    return feed
@@ -0,0 +1,284 @@
+import functools
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g
+
+import metrics
+
+try:
+    import mysql.connector
+    from mysql.connector import errors, pooling
+except ImportError:
+    mysql = None
+
+_pools = {}
+# a pool inherited from a pre-fork parent shares its sockets; workers start with none and fill it lazily
+os.register_at_fork(after_in_child=_pools.clear)
+
+
+class Error(Exception):
+    """Database error, whichever backend raised it."""
+
+
+class IntegrityError(Error):
+    pass
+
+
+def init_app(app):
+    app.config.setdefault('DB_BACKEND', 'mysql')
+    app.config.setdefault('DB_HOST', 'localhost')
+    app.config.setdefault('DB_USER', 'root')
+    app.config.setdefault('DB_PASSWORD', '')
+    app.config.setdefault('DB_NAME', 'biblioteka')
+    app.config.setdefault('DB_POOL_NAME', 'biblioteka')
+    app.config.setdefault('DB_POOL_SIZE', 10)
+    app.config.setdefault('DB_POOL_TIMEOUT', 5)
+    app.config.setdefault('DB_CONNECT_ATTEMPTS', 3)
+    app.config.setdefault('DB_CONNECT_DELAY', 1)
+    app.config.setdefault('DB_PATH', os.path.join(app.instance_path, 'biblioteka.sqlite3'))
+    app.extensions['db'] = create_backend(app.config)
+    app.teardown_appcontext(close_db)
+
+
+def create_backend(config):
+    backend = config['DB_BACKEND']
+    if backend == 'mysql':
+        if mysql is None:
+            raise RuntimeError("DB_BACKEND = 'mysql' wymaga pakietu mysql-connector-python")
+        return MySQLBackend(config['DB_POOL_NAME'])
+    if backend == 'sqlite':
+        return SQLiteBackend(config['DB_PATH'])
+    raise ValueError(f'Nieznany DB_BACKEND: {backend}')
+
+
+class MySQLBackend:
+    """Connections from a per-process pool, checked out once per request."""
+
+    dialect = 'mysql'
+
+    def __init__(self, pool_name='biblioteka'):
+        self.pool_name = pool_name
+        self.errors = mysql.connector.Error
+        self.integrity_errors = mysql.connector.IntegrityError
+
+    def sql(self, query):
+        return query
+
+    def connect(self, config):
+        conn = _checkout(get_pool(current_app), config['DB_POOL_TIMEOUT'])
+        try:
+            conn.ping(reconnect=True,
+                      attempts=config['DB_CONNECT_ATTEMPTS'],
+                      delay=config['DB_CONNECT_DELAY'])
+        except mysql.connector.Error:
+            conn.close()
+            raise
+        return conn
+
+    def release(self, conn, exception=None):
+        try:
+            if exception is not None and conn.in_transaction:
+                conn.rollback()
+        except mysql.connector.Error:
+            pass
+        conn.close()
+
+    def connect_direct(self, config):
+        return mysql.connector.connect(
+            host=config['DB_HOST'],
+            user=config['DB_USER'],
+            password=config['DB_PASSWORD'],
+            database=config['DB_NAME'],
+        )
+
+    def close(self):
+        pool = _pools.pop(self.pool_name, None)
+        if pool is not None:
+            # only idle connections; checked-out ones are closed when their request ends
+            pool._remove_connections()
+
+
+_memory_databases = itertools.count()
+
+
+class SQLiteBackend:
+    """Local SQLite file in WAL mode; one connection per thread, reused across requests."""
+
+    dialect = 'sqlite'
+    errors = sqlite3.Error
+    integrity_errors = sqlite3.IntegrityError
+
+    def __init__(self, path, timeout=5):
+        self.timeout = timeout
+        self._local = threading.local()
+        self._anchor = None
+        if path == ':memory:':
+            # a named shared-cache database, so every thread sees the same data;
+            # it lives as long as the anchor connection stays open
+            self.path = f'file:biblioteka-{os.getpid()}-{next(_memory_databases)}?mode=memory&cache=shared'
+            self._anchor = self.connect_direct()
+        else:
+            self.path = path
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=512)
+    def sql(query):
+        return query.replace('%s', '?')
+
+    def connect_direct(self, config=None):
+        conn = sqlite3.connect(self.path, timeout=self.timeout, uri=self.path.startswith('file:'),
+                               check_same_thread=False)
+        if not self.path.startswith('file:'):
+            conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def connect(self, config):
+        conn = getattr(self._local, 'conn', None)
+        # a connection opened before fork() must not be used by the child
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._local.conn = self.connect_direct()
+            self._local.pid = os.getpid()
+        return conn
+
+    def release(self, conn, exception=None):
+        # the connection stays open for the next request on this thread; only end its transaction
+        if conn.in_transaction:
+            conn.rollback()
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            conn.close()
+            self._local.conn = None
+        if self._anchor is not None:
+            self._anchor.close()
+            self._anchor = None
+
+
+class Cursor:
+    """Driver cursor behind the backend's placeholder style and the common Error classes."""
+
+    def __init__(self, cursor, backend):
+        self._cursor = cursor
+        self._backend = backend
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def _call(self, method, *args):
+        try:
+            return method(*args)
+        except self._backend.errors as error:
+            raise _translate(self._backend, error) from error
+
+    def execute(self, query, params=()):
+        return self._call(self._cursor.execute, self._backend.sql(query), params)
+
+    def executemany(self, query, seq_params):
+        return self._call(self._cursor.executemany, self._backend.sql(query), seq_params)
+
+    def fetchone(self):
+        return self._call(self._cursor.fetchone)
+
+    def fetchmany(self, size=1):
+        return self._call(self._cursor.fetchmany, size)
+
+    def fetchall(self):
+        return self._call(self._cursor.fetchall)
+
+
+def _translate(backend, error):
+    if isinstance(error, backend.integrity_errors):
+        return IntegrityError(*error.args)
+    return Error(*error.args)
+
+
+def backend(app=None):
+    return (app or current_app).extensions['db']
+
+
+def dialect():
+    return backend().dialect
+
+
+def get_pool(app=None):
+    app = app or current_app
+    name = app.config['DB_POOL_NAME']
+    pool = _pools.get(name)
+    if pool is None:
+        pool = pooling.MySQLConnectionPool(
+            pool_name=name,
+            pool_size=app.config['DB_POOL_SIZE'],
+            pool_reset_session=True,
+            host=app.config['DB_HOST'],
+            user=app.config['DB_USER'],
+            password=app.config['DB_PASSWORD'],
+            database=app.config['DB_NAME'],
+            consume_results=True,
+        )
+        _pools[name] = pool
+    return pool
+
+
+def _checkout(pool, timeout):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return pool.get_connection()
+        except errors.PoolError:
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(0.01)
+
+
+def get_db():
+    if 'db' not in g:
+        g.db = backend().connect(current_app.config)
+    return g.db
+
+
+def close_db(exception=None):
+    conn = g.pop('db', None)
+    if conn is None:
+        return
+    backend().release(conn, exception)
+
+
+@contextmanager
+def get_cursor(**kwargs):
+    current = backend()
+    # cursor options such as buffered=False only exist in mysql-connector
+    raw = get_db().cursor(**kwargs) if current.dialect == 'mysql' else get_db().cursor()
+    cursor = Cursor(raw, current)
+    config = current_app.config
+    if config.get('METRICS_ENABLED'):
+        cursor = metrics.InstrumentedCursor(cursor, config.get('DB_SLOW_QUERY_SECONDS'))
+    try:
+        yield cursor
+    finally:
+        cursor.close()
+
+
+def commit():
+    current = backend()
+    try:
+        get_db().commit()
+    except current.errors as error:
+        raise _translate(current, error) from error
+
+
+def rollback():
+    get_db().rollback()
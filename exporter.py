@@ -0,0 +1,91 @@
+import csv
+import io
+import json
+import zlib
+from html import unescape
+
+from db import get_cursor
+from validators import BOOK_FIELDS
+
+# the row version is bookkeeping of this database, not part of the exported data
+EXPORT_COLUMNS = ('id',) + BOOK_FIELDS
+
+MIMETYPES = {
+    'csv': 'text/csv',
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def iter_rows(query, values=(), fetch_size=1000):
+    """Rows from an unbuffered cursor, so only fetch_size rows are held in memory at a time."""
+    with get_cursor(buffered=False) as cursor:
+        cursor.execute(query, values)
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                return
+            yield rows
+
+
+def plain_rows(batches):
+    """Batches with the text turned back from its stored HTML-escaped form, as the importer expects it."""
+    for rows in batches:
+        yield [tuple(unescape(value) if isinstance(value, str) else value for value in row) for row in rows]
+
+
+def csv_chunks(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    yield buffer.getvalue()
+    for rows in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue()
+
+
+def json_chunks(batches):
+    yield '['
+    separator = '\n'
+    for rows in batches:
+        chunk = []
+        for row in rows:
+            chunk.append(separator + json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False, default=str))
+            separator = ',\n'
+        yield ''.join(chunk)
+    yield '\n]\n'
+
+
+def ndjson_chunks(batches):
+    for rows in batches:
+        yield ''.join(json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False, default=str) + '\n'
+                      for row in rows)
+
+
+SERIALIZERS = {
+    'csv': csv_chunks,
+    'json': json_chunks,
+    'ndjson': ndjson_chunks,
+}
+
+
+def encode_chunks(chunks):
+    for chunk in chunks:
+        yield chunk.encode('utf-8')
+
+
+def gzip_chunks(chunks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        # sync-flush every chunk so each batch reaches the client without waiting for the next one
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def export_chunks(fmt, query, values=(), fetch_size=1000, compress=False):
+    chunks = encode_chunks(SERIALIZERS[fmt](plain_rows(iter_rows(query, values, fetch_size))))
+    if compress:
+        chunks = gzip_chunks(chunks)
+    return chunks
@@ -0,0 +1,194 @@
+import bisect
+import heapq
+from collections import Counter
+
+from flask import url_for
+
+import aiodb
+from cache import CatalogIndex
+from db import get_cursor
+from search import search_conditions
+
+FACET_FIELDS = ('autor', 'wydawnictwo', 'seria', 'oprawa', 'dekada')
+FACET_LABELS = {'autor': 'Autor', 'wydawnictwo': 'Wydawnictwo', 'seria': 'Seria', 'oprawa': 'Oprawa',
+                'dekada': 'Dekada wydania'}
+
+# columns read for each facet, in FACET_FIELDS order; the decade is derived from rok_wydania
+_COLUMNS = ('autor', 'wydawnictwo', 'seria', 'oprawa', 'rok_wydania')
+
+# facets chosen on the search results page, kept apart from the search fields of the same name
+SEARCH_PREFIX = 'faseta_'
+
+
+def decade(year):
+    return None if year is None else int(year) // 10 * 10
+
+
+def selected_facets(args, prefix=''):
+    """{field: value} for the facets chosen in the query string; unusable decades are ignored."""
+    selected = {}
+    for field in FACET_FIELDS:
+        value = args.get(prefix + field, '').strip()
+        if not value:
+            continue
+        if field == 'dekada':
+            if not value.isdigit():
+                continue
+            value = int(value)
+        selected[field] = value
+    return selected
+
+
+def facet_url(selected, field, value=None, search=None):
+    """Catalog narrowed by `selected` plus field=value, or with `field` dropped when value is None.
+
+    With `search`, the criteria of a search, the same search results narrowed instead.
+    """
+    args = {name: chosen for name, chosen in selected.items() if name != field}
+    if value is not None:
+        args[field] = value
+    if search is None:
+        return url_for('strony.strona_glowna', **args)
+    return url_for('strony.wyszukaj_ksiazke', **search,
+                   **{SEARCH_PREFIX + name: chosen for name, chosen in args.items()})
+
+
+def _values(row):
+    return tuple(row[:-1]) + (decade(row[-1]),)
+
+
+def _top(counts, limit):
+    # most books first, then alphabetically
+    return heapq.nsmallest(limit, counts, key=lambda item: (-item[1], item[0]))
+
+
+def build_counts_query(criteria, dialect='mysql', facets=None):
+    """(query, values) counting every book the search finds per facet value, in one statement.
+
+    One GROUP BY per column, without the relevance ordering or the result limit of the search;
+    years are grouped as they are and summed into decades by fetch_counts.
+    """
+    where, values, _, _ = search_conditions(criteria, dialect, facets)
+    condition = " AND ".join(where) if where else "1 = 1"
+    query = " UNION ALL ".join(
+        f"SELECT '{column}', {column}, COUNT(*) FROM ksiazki WHERE {condition} AND {column} IS NOT NULL "
+        f"GROUP BY {column}" for column in _COLUMNS)
+    return query, list(values) * len(_COLUMNS)
+
+
+def _counts_from_rows(rows, limit):
+    counts = {field: Counter() for field in FACET_FIELDS}
+    for column, value, count in rows:
+        if value in (None, ''):
+            continue
+        if column == 'rok_wydania':
+            counts['dekada'][decade(value)] += count
+        else:
+            counts[column][value] += count
+    return {field: _top(counts[field].items(), limit) for field in FACET_FIELDS}
+
+
+def fetch_counts(query, values=(), limit=10):
+    with get_cursor() as cursor:
+        cursor.execute(query, values)
+        return _counts_from_rows(cursor.fetchall(), limit)
+
+
+async def fetch_counts_async(query, values=(), limit=10):
+    async with aiodb.get_cursor() as cursor:
+        await cursor.execute(query, values)
+        return _counts_from_rows(await cursor.fetchall(), limit)
+
+
+def page_ids(ids, after=None, before=None, limit=50):
+    """A page of the sorted `ids`, with the same cursors as books.fetch_books_page."""
+    if before is not None:
+        end = bisect.bisect_left(ids, before)
+        start = max(0, end - limit)
+        page = ids[start:end]
+        prev_cursor = page[0] if start > 0 and page else None
+        next_cursor = page[-1] if page else None
+    else:
+        start = bisect.bisect_right(ids, after or 0)
+        page = ids[start:start + limit]
+        prev_cursor = page[0] if after and page else None
+        next_cursor = page[-1] if start + limit < len(ids) else None
+    return page, prev_cursor, next_cursor
+
+
+class FacetIndex(CatalogIndex):
+    """Ids of the books with each author, publisher, series, binding and decade, kept in memory."""
+
+    def __init__(self, catalog_cache):
+        super().__init__(catalog_cache)
+        self._books = {}
+        self._members = {field: {} for field in FACET_FIELDS}
+        self._overall = None
+
+    def _load(self):
+        with get_cursor() as cursor:
+            cursor.execute(f"SELECT id, {', '.join(_COLUMNS)} FROM ksiazki")
+            rows = cursor.fetchall()
+        self._books = {}
+        self._members = {field: {} for field in FACET_FIELDS}
+        for row in rows:
+            self._add(row[0], _values(row[1:]))
+        self._overall = None
+
+    def _update(self, book_id):
+        with get_cursor() as cursor:
+            cursor.execute(f"SELECT {', '.join(_COLUMNS)} FROM ksiazki WHERE id = %s", (book_id,))
+            row = cursor.fetchone()
+        previous = self._books.pop(book_id, None)
+        if previous is not None:
+            for field, value in zip(FACET_FIELDS, previous):
+                members = self._members[field].get(value)
+                if members is not None:
+                    members.discard(book_id)
+                    if not members:
+                        del self._members[field][value]
+        if row:
+            self._add(book_id, _values(row))
+        self._overall = None
+
+    def _add(self, book_id, values):
+        self._books[book_id] = values
+        for field, value in zip(FACET_FIELDS, values):
+            if value not in (None, ''):
+                self._members[field].setdefault(value, set()).add(book_id)
+
+    def _matching(self, selected):
+        sets = sorted((self._members[field].get(value, set()) for field, value in selected.items()), key=len)
+        return set(sets[0]).intersection(*sets[1:])
+
+    def counts(self, selected=None, limit=10):
+        """{field: [(value, number of books), ...]} within the books matching every selected facet."""
+        with self._lock:
+            self._ensure_loaded()
+            if not selected:
+                # the unfiltered counts are what most page views ask for; kept until the next change
+                if self._overall is None or self._overall[0] != limit:
+                    self._overall = (limit, {field: _top(((value, len(ids)) for value, ids in members.items()), limit)
+                                             for field, members in self._members.items()})
+                return self._overall[1]
+            counts = {field: Counter() for field in FACET_FIELDS}
+            for book_id in self._matching(selected):
+                for field, value in zip(FACET_FIELDS, self._books[book_id]):
+                    if value not in (None, ''):
+                        counts[field][value] += 1
+        return {field: _top(counts[field].items(), limit) for field in FACET_FIELDS}
+
+    def matching(self, selected):
+        """Sorted ids of the books matching every selected facet."""
+        with self._lock:
+            self._ensure_loaded()
+            return sorted(self._matching(selected))
+
+
+def init_app(app):
+    app.config.setdefault('FACET_LIMIT', 10)
+    app.config.setdefault('FACET_MAX_LIMIT', 100)
+    facets = FacetIndex(app.extensions['catalog_cache'])
+    app.extensions['facets'] = facets
+    app.jinja_env.globals.update(FACET_LABELS=FACET_LABELS, facet_url=facet_url)
+    return facets
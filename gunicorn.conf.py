@@ -0,0 +1,39 @@
+"""Gunicorn settings for wsgi:app; every value can be overridden on the command line."""
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+# several workers need the cache and throttle in redis (lifecycle.check_workers refuses to start
+# otherwise); with the in-process defaults of create_app one worker serves on its threads
+_SHARED_STATE = (os.environ.get('CACHE_BACKEND') == 'redis'
+                 and (os.environ.get('THROTTLE_BACKEND') == 'redis' or os.environ.get('THROTTLE_ENABLED') == '0')
+                 and os.environ.get('SESSION_BACKEND', 'file') not in ('memory', 'local'))
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1 if _SHARED_STATE else 1))
+# threads keep a worker responsive while its requests wait on MySQL or the PBKDF2 pool
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# import once in the master: workers fork with the code loaded and start in milliseconds
+preload_app = True
+timeout = 60
+keepalive = 5
+# on SIGTERM/HUP workers stop accepting and get this long to finish in-flight requests
+graceful_timeout = int(os.environ.get('GRACEFUL_TIMEOUT', 30))
+max_requests = 10000
+max_requests_jitter = 1000
+
+
+def on_starting(server):
+    from lifecycle import check_workers
+    from passwords import pool_size
+    from wsgi import app
+    # the cache, throttle and sessions must be shared once there is more than one worker
+    check_workers(app, server.cfg.workers)
+    if 'PASSWORD_HASH_WORKERS' not in os.environ:
+        # the final worker count, -w included; the pools are only started after the fork
+        app.extensions['password_hasher'].resize(pool_size(server.cfg.workers))
+
+
+def worker_exit(server, worker):
+    from wsgi import app
+    app.extensions['lifecycle'].shutdown(timeout=graceful_timeout)
@@ -0,0 +1,177 @@
+import csv
+import json
+import time
+
+import db
+from books import INSERT_BOOK, changed_at, reserve_changes
+from db import get_cursor
+from validators import BOOK_SCHEMA
+
+_CHUNK_SIZE = 64 * 1024
+
+
+class ImportReport:
+
+    def __init__(self, max_errors=1000):
+        self.read = 0
+        self.inserted = 0
+        self.rejected = 0
+        self.errors = []
+        self.max_errors = max_errors
+        self.fatal_error = None
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def reject(self, row_number, errors):
+        self.rejected += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append((row_number, errors))
+
+    @property
+    def rows_per_second(self):
+        return self.read / self.elapsed if self.elapsed else 0.0
+
+    def to_dict(self):
+        return {
+            'read': self.read,
+            'inserted': self.inserted,
+            'rejected': self.rejected,
+            'errors': [{'row': row, 'errors': errors} for row, errors in self.errors],
+            'fatal_error': self.fatal_error,
+            'elapsed': round(self.elapsed, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+        }
+
+
+def iter_csv(stream):
+    for record in csv.DictReader(stream):
+        yield record
+
+
+def iter_json(stream):
+    """Yields objects from a JSON array or from NDJSON, reading the stream in chunks."""
+    decoder = json.JSONDecoder()
+    buffer = stream.read(_CHUNK_SIZE).lstrip()
+
+    if not buffer.startswith('['):
+        for line in _read_lines(buffer, stream):
+            if line.strip():
+                yield json.loads(line)
+        return
+
+    buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip()
+        if buffer.startswith(','):
+            buffer = buffer[1:].lstrip()
+        if not buffer:
+            buffer = stream.read(_CHUNK_SIZE)
+            if not buffer:
+                raise ValueError('Niezakończona tablica JSON')
+            continue
+        if buffer.startswith(']'):
+            return
+        try:
+            record, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = stream.read(_CHUNK_SIZE)
+            if not chunk:
+                raise
+            buffer += chunk
+            continue
+        yield record
+        buffer = buffer[end:]
+
+
+def _read_lines(buffer, stream):
+    while True:
+        *lines, buffer = buffer.split('\n')
+        yield from lines
+        chunk = stream.read(_CHUNK_SIZE)
+        if not chunk:
+            if buffer:
+                yield buffer
+            return
+        buffer += chunk
+
+
+def iter_records(stream, fmt):
+    if fmt == 'csv':
+        return iter_csv(stream)
+    if fmt in ('json', 'ndjson'):
+        return iter_json(stream)
+    raise ValueError(f'Nieobsługiwany format importu: {fmt}')
+
+
+def format_from_filename(filename):
+    return filename.rsplit('.', 1)[-1].lower() if '.' in filename else 'csv'
+
+
+def prepare_row(record):
+    return BOOK_SCHEMA.row(record)
+
+
+def _insert_batch(batch, report):
+    try:
+        with get_cursor() as cursor:
+            number = reserve_changes(cursor, len(batch))
+            now = changed_at()
+            cursor.executemany(INSERT_BOOK, [tuple(values) + (number + index, now)
+                                             for index, (row_number, values) in enumerate(batch)])
+        db.commit()
+        report.inserted += len(batch)
+        return
+    except db.Error:
+        db.rollback()
+
+    # the batch was rejected as a whole: retry row by row to find the offending rows
+    with get_cursor() as cursor:
+        # numbers of rejected rows are simply left unused
+        number = reserve_changes(cursor, len(batch))
+        now = changed_at()
+        for index, (row_number, values) in enumerate(batch):
+            try:
+                cursor.execute(INSERT_BOOK, tuple(values) + (number + index, now))
+                report.inserted += 1
+            except db.Error as error:
+                report.reject(row_number, [str(error)])
+    db.commit()
+
+
+def import_books(records, batch_size=1000):
+    report = ImportReport()
+    batch = []
+    row_number = 0
+    records = iter(records)
+
+    while True:
+        try:
+            record = next(records)
+        except StopIteration:
+            break
+        except (ValueError, csv.Error) as error:
+            # a malformed file cannot be resumed; keep what was imported so far
+            report.fatal_error = f"Wiersz {row_number + 1}: {error}"
+            break
+
+        row_number += 1
+        report.read += 1
+        if not isinstance(record, dict):
+            report.reject(row_number, ["Wiersz nie jest obiektem"])
+            continue
+
+        values, errors = prepare_row(record)
+        if errors:
+            report.reject(row_number, errors)
+            continue
+
+        batch.append((row_number, values))
+        if len(batch) >= batch_size:
+            _insert_batch(batch, report)
+            batch = []
+
+    if batch:
+        _insert_batch(batch, report)
+
+    report.elapsed = time.perf_counter() - report.started
+    return report
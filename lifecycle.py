@@ -0,0 +1,113 @@
+import logging
+import threading
+
+from flask import current_app, jsonify, request, request_started, request_tearing_down
+
+import db
+
+logger = logging.getLogger(__name__)
+
+
+class Lifecycle:
+    """Tracks in-flight requests so a worker can stop reporting ready and finish them before exiting."""
+
+    ENVIRON_KEY = 'biblioteka.in_flight'
+
+    def __init__(self, app):
+        self.app = app
+        self.draining = False
+        self._in_flight = 0
+        self._idle = threading.Condition()
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def request_started(self, sender, **extra):
+        request.environ[self.ENVIRON_KEY] = True
+        with self._idle:
+            self._in_flight += 1
+
+    def request_finished(self, sender, **extra):
+        # teardown also runs for requests that failed before dispatch and were never counted
+        if not request.environ.pop(self.ENVIRON_KEY, False):
+            return
+        with self._idle:
+            self._in_flight -= 1
+            if not self._in_flight:
+                self._idle.notify_all()
+
+    def drain(self, timeout=None):
+        """Fail readiness from now on and wait for in-flight requests; False if some were still running."""
+        self.draining = True
+        # long-polling change feed requests answer now instead of holding the drain up
+        self.app.extensions['change_feed'].stop()
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._in_flight, timeout)
+
+    def shutdown(self, timeout=None):
+        finished = self.drain(timeout)
+        if not finished:
+            logger.warning('Zamykanie z %s niezakończonymi żądaniami', self._in_flight)
+        extensions = self.app.extensions
+        extensions['mail_dispatcher'].stop(timeout)
+        extensions['password_hasher'].shutdown()
+        extensions['db'].close()
+        return finished
+
+
+# backends whose state lives in one process; every worker process would have its own copy
+PROCESS_LOCAL_BACKENDS = {
+    'CACHE_BACKEND': ('memory', 'local'),
+    'THROTTLE_BACKEND': ('memory', 'local'),
+    'SESSION_BACKEND': ('memory', 'local'),
+}
+
+
+def check_workers(app, workers):
+    """Raises RuntimeError when `workers` processes would each keep their own cache, throttle or sessions.
+
+    Invalidation only reaches the worker that made the write, so the others would serve stale pages
+    and 304s until the entries expire, and every worker would allow the full login limits.
+    """
+    if workers <= 1:
+        return
+    local = [f"{name} = '{app.config[name]}'" for name, backends in PROCESS_LOCAL_BACKENDS.items()
+             if app.config[name] in backends and (name != 'THROTTLE_BACKEND' or app.config['THROTTLE_ENABLED'])]
+    if local:
+        raise RuntimeError(f"{workers} procesów roboczych nie współdzieli stanu przy {', '.join(local)}; "
+                           f"ustaw backend 'redis' albo uruchom jeden proces (WEB_CONCURRENCY=1)")
+
+
+def _lifecycle():
+    return current_app.extensions['lifecycle']
+
+
+def liveness():
+    return jsonify(status='ok')
+
+
+def readiness():
+    if _lifecycle().draining:
+        return jsonify(status='draining'), 503
+    try:
+        with db.get_cursor() as cursor:
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+    except Exception:
+        logger.exception('Baza danych niedostępna')
+        return jsonify(status='error', error='Baza danych niedostępna'), 503
+    return jsonify(status='ok')
+
+
+def init_app(app):
+    lifecycle = Lifecycle(app)
+    app.extensions['lifecycle'] = lifecycle
+
+    # signals rather than before/teardown hooks, so a request is counted even when a before_request answers it
+    request_started.connect(lifecycle.request_started, app)
+    request_tearing_down.connect(lifecycle.request_finished, app)
+
+    app.add_url_rule('/healthz', 'healthz', liveness)
+    app.add_url_rule('/readyz', 'readyz', readiness)
+    return lifecycle
@@ -0,0 +1,269 @@
+import json
+import logging
+import os
+import smtplib
+import sqlite3
+import threading
+import time
+import uuid
+
+from flask_mail import Message
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# errors that break the SMTP session; anything else only fails the current message
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+
+class MailQueue:
+    """Durable outbox kept in a local SQLite file, shared by all worker processes."""
+
+    def __init__(self, path, lease_seconds=300):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS outbox ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "subject TEXT NOT NULL, "
+                "recipients TEXT NOT NULL, "
+                "body TEXT NOT NULL, "
+                "status TEXT NOT NULL DEFAULT 'pending', "
+                "attempts INTEGER NOT NULL DEFAULT 0, "
+                "next_attempt REAL NOT NULL, "
+                "claim TEXT, "
+                "last_error TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_outbox_status ON outbox (status, next_attempt)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def enqueue(self, subject, recipients, body):
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO outbox (subject, recipients, body, next_attempt) VALUES (?, ?, ?, ?)",
+                (subject, json.dumps(recipients), body, time.time()))
+            return cursor.lastrowid
+
+    def claim(self, limit):
+        now = time.time()
+        claim = uuid.uuid4().hex
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "UPDATE outbox SET status = 'sending', claim = ?, next_attempt = ? WHERE id IN ("
+                "SELECT id FROM outbox WHERE status IN ('pending', 'sending') AND next_attempt <= ? "
+                "ORDER BY next_attempt LIMIT ?)",
+                (claim, now + self.lease_seconds, now, limit))
+            rows = conn.execute(
+                "SELECT id, subject, recipients, body, attempts FROM outbox WHERE claim = ? ORDER BY id",
+                (claim,)).fetchall()
+            conn.commit()
+        finally:
+            conn.close()
+        return [(row[0], row[1], json.loads(row[2]), row[3], row[4]) for row in rows]
+
+    def mark_sent(self, mail_id):
+        # the body holds a verification code, so nothing of a delivered message is kept
+        with self._connect() as conn:
+            conn.execute("DELETE FROM outbox WHERE id = ?", (mail_id,))
+
+    def mark_retry(self, mail_id, attempts, error, delay):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE outbox SET status = 'pending', claim = NULL, attempts = ?, next_attempt = ?, last_error = ? WHERE id = ?",
+                (attempts, time.time() + delay, str(error), mail_id))
+
+    def mark_failed(self, mail_id, attempts, error):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE outbox SET status = 'failed', claim = NULL, attempts = ?, last_error = ? WHERE id = ?",
+                (attempts, str(error), mail_id))
+
+    def counts(self):
+        with self._connect() as conn:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+
+
+class SMTPTransport:
+    """Sends through Flask-Mail, reusing one SMTP connection for a whole batch."""
+
+    def __init__(self, mail):
+        self.mail = mail
+
+    def connect(self):
+        metrics.SMTP_CONNECTIONS.inc()
+        return self.mail.connect()
+
+
+class MemorySink:
+    """Local fake SMTP server for tests: keeps every message instead of sending it."""
+
+    def __init__(self):
+        self.outbox = []
+        self.connections = 0
+        self.fail_next = 0
+
+    def connect(self):
+        return _MemoryConnection(self)
+
+
+class _MemoryConnection:
+
+    def __init__(self, sink):
+        self.sink = sink
+
+    def __enter__(self):
+        self.sink.connections += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        pass
+
+    def send(self, message):
+        if self.sink.fail_next:
+            self.sink.fail_next -= 1
+            raise ConnectionError('MemorySink: symulowany błąd SMTP')
+        self.sink.outbox.append(message)
+
+
+class MailDispatcher:
+    """Background thread delivering queued mail in batches with exponential back-off."""
+
+    def __init__(self, app, queue, transport, batch_size=50, max_attempts=8,
+                 retry_delay=30, max_retry_delay=3600, poll_interval=5):
+        self.app = app
+        self.queue = queue
+        self.transport = transport
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def send(self, subject, recipients, body):
+        mail_id = self.queue.enqueue(subject, recipients, body)
+        self.start()
+        self._wakeup.set()
+        return mail_id
+
+    def start(self):
+        """Starts the thread unless it is running or the dispatcher was stopped; cheap enough for every request."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._stopping.is_set():
+                return
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='mail-dispatcher', daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                sent = self.dispatch_batch()
+            except Exception:
+                logger.exception('Błąd wysyłki kolejki e-mail')
+                sent = 0
+            if not sent:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def _backoff(self, attempts):
+        return min(self.retry_delay * 2 ** (attempts - 1), self.max_retry_delay)
+
+    def _retry(self, item, error):
+        mail_id, subject, recipients, body, attempts = item
+        attempts += 1
+        if attempts >= self.max_attempts:
+            logger.error('Porzucono e-mail %s po %s próbach: %s', mail_id, attempts, error)
+            self.queue.mark_failed(mail_id, attempts, error)
+        else:
+            self.queue.mark_retry(mail_id, attempts, error, self._backoff(attempts))
+
+    def dispatch_batch(self):
+        batch = self.queue.claim(self.batch_size)
+        if not batch:
+            return 0
+
+        sent = 0
+        handled = set()
+        with self.app.app_context():
+            try:
+                with self.transport.connect() as connection:
+                    for item in batch:
+                        mail_id, subject, recipients, body, attempts = item
+                        try:
+                            connection.send(Message(subject, recipients=recipients, body=body))
+                        except CONNECTION_ERRORS:
+                            metrics.SMTP_MESSAGES.inc('error')
+                            raise
+                        except Exception as error:
+                            metrics.SMTP_MESSAGES.inc('error')
+                            self._retry(item, error)
+                        else:
+                            metrics.SMTP_MESSAGES.inc('sent')
+                            self.queue.mark_sent(mail_id)
+                            sent += 1
+                        handled.add(mail_id)
+            except Exception as error:
+                for item in batch:
+                    if item[0] not in handled:
+                        self._retry(item, error)
+        return sent
+
+    def flush(self):
+        total = 0
+        while True:
+            sent = self.dispatch_batch()
+            if not sent:
+                return total
+            total += sent
+
+
+def init_app(app, mail):
+    app.config.setdefault('MAIL_QUEUE_PATH', os.path.join(app.instance_path, 'mail_queue.sqlite3'))
+    app.config.setdefault('MAIL_TRANSPORT', 'smtp')
+    app.config.setdefault('MAIL_BATCH_SIZE', 50)
+    app.config.setdefault('MAIL_MAX_ATTEMPTS', 8)
+    app.config.setdefault('MAIL_RETRY_DELAY', 30)
+
+    transport = MemorySink() if app.config['MAIL_TRANSPORT'] == 'memory' else SMTPTransport(mail)
+    dispatcher = MailDispatcher(
+        app,
+        MailQueue(app.config['MAIL_QUEUE_PATH']),
+        transport,
+        batch_size=app.config['MAIL_BATCH_SIZE'],
+        max_attempts=app.config['MAIL_MAX_ATTEMPTS'],
+        retry_delay=app.config['MAIL_RETRY_DELAY'],
+    )
+    app.extensions['mail_dispatcher'] = dispatcher
+    # started by the first request of each worker rather than the first send(): mail left queued or
+    # backing off by a recycled worker is delivered without waiting for someone to register
+    app.before_request(dispatcher.start)
+
+    @metrics.collector(app)
+    def queue_metrics():
+        counts = dispatcher.queue.counts()
+        yield ('biblioteka_mail_queue_messages', 'gauge', 'Wiadomości w kolejce e-mail według stanu.',
+               [({'status': status}, count) for status, count in sorted(counts.items())])
+
+    return dispatcher
@@ -0,0 +1,329 @@
+import bisect
+import cProfile
+import functools
+import hmac
+import logging
+import os
+import re
+import threading
+import time
+
+from flask import Response, current_app, g, request
+
+slow_query_logger = logging.getLogger('biblioteka.sql')
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for name, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            yield self.name + _format_labels(self.labels, labels), value
+
+
+class Histogram:
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # per label set: [count per bucket (non-cumulative, last is +Inf), sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, *labels):
+        state = self._values.get(labels)
+        return state[2] if state else 0
+
+    def samples(self):
+        with self._lock:
+            items = sorted((labels, (list(state[0]), state[1], state[2])) for labels, state in self._values.items())
+        for labels, (buckets, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), buckets):
+                cumulative += bucket_count
+                yield self.name + '_bucket' + _format_labels(self.labels, labels, [('le', _format_value(bound))]), cumulative
+            yield self.name + '_sum' + _format_labels(self.labels, labels), total
+            yield self.name + '_count' + _format_labels(self.labels, labels), count
+
+
+class Registry:
+    """Metrics of this process, rendered in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation, labels=()):
+        return self._register(Counter(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def render(self, collectors=()):
+        """The metrics, then what each of `collectors` yields (see collector())."""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(f'{name} {_format_value(value)}' for name, value in metric.samples())
+        for collector in collectors:
+            for name, kind, documentation, samples in collector():
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples:
+                    lines.append(f'{name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def collector(app):
+    """Decorator adding function() to the /metrics of `app`, for values owned by the app's extensions.
+
+    function() yields (name, kind, documentation, [(labels dict, value), ...]). The collectors go with
+    the app rather than REGISTRY, so another create_app() in the same process does not add a second copy.
+    """
+    def register(function):
+        app.extensions.setdefault('metrics_collectors', []).append(function)
+        return function
+    return register
+
+REQUEST_DURATION = REGISTRY.histogram(
+    'biblioteka_http_request_duration_seconds', 'Czas obsługi żądania HTTP.', ('endpoint', 'method'))
+REQUESTS = REGISTRY.counter(
+    'biblioteka_http_requests_total', 'Liczba obsłużonych żądań HTTP.', ('endpoint', 'method', 'status'))
+QUERY_DURATION = REGISTRY.histogram(
+    'biblioteka_db_query_duration_seconds', 'Czas wykonania zapytania SQL.', ('operation', 'table'))
+QUERY_ROWS = REGISTRY.counter(
+    'biblioteka_db_rows_total', 'Wiersze pobrane lub zmienione przez zapytania SQL.', ('operation', 'table'))
+SLOW_QUERIES = REGISTRY.counter(
+    'biblioteka_db_slow_queries_total', 'Zapytania SQL dłuższe niż DB_SLOW_QUERY_SECONDS.', ('operation', 'table'))
+PASSWORD_HASHES = REGISTRY.counter(
+    'biblioteka_pbkdf2_calls_total', 'Wywołania PBKDF2.', ('operation',))
+PASSWORD_HASH_DURATION = REGISTRY.histogram(
+    'biblioteka_pbkdf2_duration_seconds', 'Czas wywołania PBKDF2 (z oczekiwaniem na pulę procesów).', ('operation',))
+SMTP_CONNECTIONS = REGISTRY.counter(
+    'biblioteka_smtp_connections_total', 'Otwarte połączenia SMTP.')
+SMTP_MESSAGES = REGISTRY.counter(
+    'biblioteka_smtp_messages_total', 'Wiadomości przekazane do SMTP.', ('result',))
+
+_TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE)\s+`?(\w+)', re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=512)
+def statement_labels(query):
+    # labels are per statement type and table, not per SQL text, to keep the number of series small
+    words = query.split(None, 1)
+    match = _TABLE.search(query)
+    return (words[0].upper() if words else 'OTHER'), (match.group(1) if match else '')
+
+
+class _Redacted:
+    # shown in place of a text parameter: its type and length, never its content
+
+    def __init__(self, value):
+        self.value = value
+
+    def __repr__(self):
+        return f'<{type(self.value).__name__}:{len(self.value)}>'
+
+
+def redact(params):
+    """Bound parameters for the log: numbers, booleans and None as they are, text and bytes by length only.
+
+    The values bound to a query include password hashes, e-mail addresses and reset tokens.
+    """
+    if isinstance(params, (list, tuple)):
+        return type(params)(redact(value) for value in params)
+    if isinstance(params, dict):
+        return {name: redact(value) for name, value in params.items()}
+    if isinstance(params, (str, bytes, bytearray)):
+        return _Redacted(params)
+    return params
+
+
+class InstrumentedCursor:
+    """Cursor proxy recording query time, row counts and slow queries."""
+
+    def __init__(self, cursor, slow_query_seconds):
+        self._cursor = cursor
+        self._slow_query_seconds = slow_query_seconds
+        self._labels = ('OTHER', '')
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def _timed(self, method, query, params):
+        self._labels = statement_labels(query)
+        started = time.perf_counter()
+        try:
+            return method(query, params)
+        finally:
+            elapsed = time.perf_counter() - started
+            QUERY_DURATION.observe(elapsed, *self._labels)
+            if self._labels[0] not in ('SELECT', 'WITH', 'SHOW'):
+                rowcount = getattr(self._cursor, 'rowcount', None)
+                if isinstance(rowcount, int) and rowcount > 0:
+                    QUERY_ROWS.inc(*self._labels, amount=rowcount)
+            if self._slow_query_seconds is not None and elapsed >= self._slow_query_seconds:
+                SLOW_QUERIES.inc(*self._labels)
+                slow_query_logger.warning('Wolne zapytanie (%.3f s): %s; parametry: %r', elapsed, query, redact(params))
+
+    def execute(self, query, params=()):
+        return self._timed(self._cursor.execute, query, params)
+
+    def executemany(self, query, seq_params):
+        seq_params = list(seq_params)
+        return self._timed(self._cursor.executemany, query, seq_params)
+
+    def _rows(self, rows):
+        if rows:
+            QUERY_ROWS.inc(*self._labels, amount=len(rows))
+        return rows
+
+    def fetchall(self):
+        return self._rows(self._cursor.fetchall())
+
+    def fetchmany(self, size=1):
+        return self._rows(self._cursor.fetchmany(size))
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            QUERY_ROWS.inc(*self._labels)
+        return row
+
+
+class _Timer:
+
+    def __init__(self, histogram, *labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+def time_password_hash(operation):
+    PASSWORD_HASHES.inc(operation)
+    return _Timer(PASSWORD_HASH_DURATION, operation)
+
+
+def _before_request():
+    g.request_started = time.perf_counter()
+    config = current_app.config
+    if config['PROFILER_ENABLED'] and request.args.get('profile') == '1':
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+
+def _after_request(response):
+    started = g.pop('request_started', None)
+    endpoint = request.endpoint or 'brak'
+    if started is not None:
+        REQUEST_DURATION.observe(time.perf_counter() - started, endpoint, request.method)
+    REQUESTS.inc(endpoint, request.method, str(response.status_code))
+
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        # streamed responses are profiled only up to the first byte
+        profiler.disable()
+        directory = current_app.config['PROFILER_DIR']
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{endpoint}-{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}.prof')
+        profiler.dump_stats(path)
+        response.headers['X-Profile'] = os.path.basename(path)
+    return response
+
+
+def _metrics_allowed():
+    config = current_app.config
+    if request.remote_addr in config['METRICS_ALLOWED_ADDRS']:
+        return True
+    token = config['METRICS_TOKEN']
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    return bool(token) and hmac.compare_digest(supplied.encode(), token.encode())
+
+
+def metrics_view():
+    # endpoint names, table names and traffic are not for everyone: a scraper on an allowed address or with the token
+    if not _metrics_allowed():
+        return Response('Forbidden\n', status=403, mimetype='text/plain')
+    return Response(REGISTRY.render(current_app.extensions.get('metrics_collectors', ())),
+                    mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+def init_app(app):
+    app.config.setdefault('METRICS_ENABLED', True)
+    app.config.setdefault('METRICS_TOKEN', None)
+    app.config.setdefault('METRICS_ALLOWED_ADDRS', ('127.0.0.1', '::1'))
+    app.config.setdefault('DB_SLOW_QUERY_SECONDS', 0.5)
+    app.config.setdefault('PROFILER_ENABLED', False)
+    app.config.setdefault('PROFILER_DIR', os.path.join(app.instance_path, 'profile'))
+
+    if not app.config['METRICS_ENABLED']:
+        return REGISTRY
+
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+    return REGISTRY
@@ -0,0 +1,136 @@
+import argparse
+import os
+import re
+import sys
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+# SQLite keeps its own scripts, numbered in step with the MySQL ones
+DIALECT_DIRS = {
+    'mysql': MIGRATIONS_DIR,
+    'sqlite': os.path.join(MIGRATIONS_DIR, 'sqlite'),
+}
+PLACEHOLDERS = {'mysql': '%s', 'sqlite': '?'}
+
+_MIGRATION_FILE = re.compile(r'^(\d+)_(\w+)\.up\.sql$')
+
+
+class Migration:
+
+    def __init__(self, version, name, directory=MIGRATIONS_DIR):
+        self.version = version
+        self.name = name
+        self.directory = directory
+
+    def _read(self, direction):
+        path = os.path.join(self.directory, f'{self.version}_{self.name}.{direction}.sql')
+        with open(path, encoding='utf-8') as f:
+            return f.read()
+
+    def statements(self, direction):
+        return [statement.strip() for statement in self._read(direction).split(';') if statement.strip()]
+
+    def __repr__(self):
+        return f'{self.version}_{self.name}'
+
+
+def available_migrations(dialect='mysql'):
+    directory = DIALECT_DIRS[dialect]
+    migrations = []
+    for filename in os.listdir(directory):
+        match = _MIGRATION_FILE.match(filename)
+        if match:
+            migrations.append(Migration(match.group(1), match.group(2), directory))
+    return sorted(migrations, key=lambda migration: migration.version)
+
+
+def applied_versions(conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version VARCHAR(32) PRIMARY KEY, "
+            "applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+        )
+        cursor.execute("SELECT version FROM schema_migrations")
+        return {row[0] for row in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+
+def _run(conn, migration, direction, dialect='mysql'):
+    placeholder = PLACEHOLDERS[dialect]
+    cursor = conn.cursor()
+    try:
+        for statement in migration.statements(direction):
+            cursor.execute(statement)
+        if direction == 'up':
+            cursor.execute(f"INSERT INTO schema_migrations (version) VALUES ({placeholder})", (migration.version,))
+        else:
+            cursor.execute(f"DELETE FROM schema_migrations WHERE version = {placeholder}", (migration.version,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def upgrade(conn, target=None, dialect='mysql'):
+    applied = applied_versions(conn)
+    done = []
+    for migration in available_migrations(dialect):
+        if target is not None and migration.version > target:
+            break
+        if migration.version not in applied:
+            _run(conn, migration, 'up', dialect)
+            done.append(migration)
+    return done
+
+
+def downgrade(conn, target, dialect='mysql'):
+    applied = applied_versions(conn)
+    done = []
+    for migration in reversed(available_migrations(dialect)):
+        if migration.version <= target:
+            break
+        if migration.version in applied:
+            _run(conn, migration, 'down', dialect)
+            done.append(migration)
+    return done
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Migracje schematu bazy biblioteka')
+    parser.add_argument('command', choices=['up', 'down', 'status'])
+    parser.add_argument('--target', help='wersja docelowa, np. 0001 (dla "down" wymagana; 0000 cofa wszystko)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'down' and args.target is None:
+        parser.error('"down" wymaga --target')
+
+    import db
+    from app import create_app
+    # settings come from the environment, as for wsgi.py, but without warming anything up
+    app = create_app()
+    backend = db.backend(app)
+    dialect = backend.dialect
+    conn = backend.connect_direct(app.config)
+    try:
+        if args.command == 'status':
+            applied = applied_versions(conn)
+            for migration in available_migrations(dialect):
+                state = 'zastosowana' if migration.version in applied else 'oczekuje'
+                print(f'{migration!r}: {state}')
+        elif args.command == 'up':
+            for migration in upgrade(conn, args.target, dialect):
+                print(f'up {migration!r}')
+        else:
+            for migration in downgrade(conn, args.target, dialect):
+                print(f'down {migration!r}')
+    finally:
+        conn.close()
+        app.extensions['lifecycle'].shutdown()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
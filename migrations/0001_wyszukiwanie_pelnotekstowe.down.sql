@@ -0,0 +1,7 @@
+ALTER TABLE ksiazki DROP INDEX ft_ksiazki_seria;
+ALTER TABLE ksiazki DROP INDEX ft_ksiazki_wydawnictwo;
+ALTER TABLE ksiazki DROP INDEX ft_ksiazki_autor;
+ALTER TABLE ksiazki DROP INDEX ft_ksiazki_tytul;
+
+-- ksiazki was created without a character set, i.e. with the database default
+ALTER TABLE ksiazki CONVERT TO CHARACTER SET DEFAULT;
@@ -0,0 +1,6 @@
+ALTER TABLE ksiazki CONVERT TO CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci;
+
+ALTER TABLE ksiazki ADD FULLTEXT INDEX ft_ksiazki_tytul (tytul) WITH PARSER ngram;
+ALTER TABLE ksiazki ADD FULLTEXT INDEX ft_ksiazki_autor (autor) WITH PARSER ngram;
+ALTER TABLE ksiazki ADD FULLTEXT INDEX ft_ksiazki_wydawnictwo (wydawnictwo) WITH PARSER ngram;
+ALTER TABLE ksiazki ADD FULLTEXT INDEX ft_ksiazki_seria (seria) WITH PARSER ngram;
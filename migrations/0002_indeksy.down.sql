@@ -0,0 +1,5 @@
+ALTER TABLE ksiazki DROP INDEX ix_ksiazki_autor_tytul;
+ALTER TABLE ksiazki DROP INDEX ix_ksiazki_lokalizacja;
+
+ALTER TABLE uzytkownicy DROP INDEX ux_uzytkownicy_email;
+ALTER TABLE uzytkownicy DROP INDEX ux_uzytkownicy_nazwa_uzytkownika;
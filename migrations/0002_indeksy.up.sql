@@ -0,0 +1,5 @@
+ALTER TABLE uzytkownicy ADD UNIQUE INDEX ux_uzytkownicy_nazwa_uzytkownika (nazwa_uzytkownika);
+ALTER TABLE uzytkownicy ADD UNIQUE INDEX ux_uzytkownicy_email (email);
+
+ALTER TABLE ksiazki ADD INDEX ix_ksiazki_lokalizacja (rzad, regal, polka);
+ALTER TABLE ksiazki ADD INDEX ix_ksiazki_autor_tytul (autor, tytul);
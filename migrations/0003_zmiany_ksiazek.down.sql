@@ -0,0 +1,5 @@
+DROP TABLE licznik_zmian;
+DROP TABLE usuniete_ksiazki;
+
+ALTER TABLE ksiazki DROP INDEX ix_ksiazki_zmiana;
+ALTER TABLE ksiazki DROP COLUMN zmiana, DROP COLUMN wersja;
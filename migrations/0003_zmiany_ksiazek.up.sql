@@ -0,0 +1,16 @@
+ALTER TABLE ksiazki ADD COLUMN wersja INT NOT NULL DEFAULT 1, ADD COLUMN zmiana BIGINT NOT NULL DEFAULT 0;
+UPDATE ksiazki SET zmiana = id;
+ALTER TABLE ksiazki ADD INDEX ix_ksiazki_zmiana (zmiana);
+
+CREATE TABLE usuniete_ksiazki (
+  zmiana BIGINT PRIMARY KEY,
+  ksiazka_id INT NOT NULL,
+  wersja INT NOT NULL,
+  usunieto TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE licznik_zmian (
+  id TINYINT PRIMARY KEY,
+  numer BIGINT NOT NULL
+);
+INSERT INTO licznik_zmian (id, numer) SELECT 1, COALESCE(MAX(zmiana), 0) FROM ksiazki;
@@ -0,0 +1,2 @@
+ALTER TABLE ksiazki ADD COLUMN zmieniono BIGINT NOT NULL DEFAULT 0;
+UPDATE ksiazki SET zmieniono = UNIX_TIMESTAMP();
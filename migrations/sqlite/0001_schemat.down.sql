@@ -0,0 +1,2 @@
+DROP TABLE ksiazki;
+DROP TABLE uzytkownicy;
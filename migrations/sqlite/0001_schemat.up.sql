@@ -0,0 +1,24 @@
+CREATE TABLE uzytkownicy (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  imie TEXT NOT NULL,
+  nazwisko TEXT NOT NULL,
+  numer_telefonu TEXT NOT NULL,
+  email TEXT NOT NULL,
+  nazwa_uzytkownika TEXT NOT NULL,
+  haslo TEXT NOT NULL,
+  verification_code TEXT NOT NULL
+);
+
+CREATE TABLE ksiazki (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  tytul TEXT NOT NULL,
+  autor TEXT NOT NULL,
+  wydawnictwo TEXT NOT NULL,
+  seria TEXT NOT NULL,
+  oprawa TEXT NOT NULL,
+  rok_wydania INTEGER NOT NULL,
+  ilosc_stron INTEGER NOT NULL,
+  rzad INTEGER NOT NULL,
+  regal INTEGER NOT NULL,
+  polka INTEGER NOT NULL
+);
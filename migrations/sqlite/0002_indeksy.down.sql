@@ -0,0 +1,4 @@
+DROP INDEX ix_ksiazki_autor_tytul;
+DROP INDEX ix_ksiazki_lokalizacja;
+DROP INDEX ux_uzytkownicy_email;
+DROP INDEX ux_uzytkownicy_nazwa_uzytkownika;
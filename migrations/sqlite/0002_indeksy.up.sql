@@ -0,0 +1,5 @@
+CREATE UNIQUE INDEX ux_uzytkownicy_nazwa_uzytkownika ON uzytkownicy (nazwa_uzytkownika);
+CREATE UNIQUE INDEX ux_uzytkownicy_email ON uzytkownicy (email);
+
+CREATE INDEX ix_ksiazki_lokalizacja ON ksiazki (rzad, regal, polka);
+CREATE INDEX ix_ksiazki_autor_tytul ON ksiazki (autor, tytul);
@@ -0,0 +1,6 @@
+DROP TABLE licznik_zmian;
+DROP TABLE usuniete_ksiazki;
+
+DROP INDEX ix_ksiazki_zmiana;
+ALTER TABLE ksiazki DROP COLUMN zmiana;
+ALTER TABLE ksiazki DROP COLUMN wersja;
@@ -0,0 +1,17 @@
+ALTER TABLE ksiazki ADD COLUMN wersja INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE ksiazki ADD COLUMN zmiana INTEGER NOT NULL DEFAULT 0;
+UPDATE ksiazki SET zmiana = id;
+CREATE INDEX ix_ksiazki_zmiana ON ksiazki (zmiana);
+
+CREATE TABLE usuniete_ksiazki (
+  zmiana INTEGER PRIMARY KEY,
+  ksiazka_id INTEGER NOT NULL,
+  wersja INTEGER NOT NULL,
+  usunieto TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE licznik_zmian (
+  id INTEGER PRIMARY KEY,
+  numer INTEGER NOT NULL
+);
+INSERT INTO licznik_zmian (id, numer) SELECT 1, COALESCE(MAX(zmiana), 0) FROM ksiazki;
@@ -0,0 +1 @@
+ALTER TABLE ksiazki DROP COLUMN zmieniono;
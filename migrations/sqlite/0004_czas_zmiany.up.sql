@@ -0,0 +1,2 @@
+ALTER TABLE ksiazki ADD COLUMN zmieniono INTEGER NOT NULL DEFAULT 0;
+UPDATE ksiazki SET zmieniono = CAST(strftime('%s', 'now') AS INTEGER);
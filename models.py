@@ -0,0 +1,70 @@
+import hashlib
+from itertools import zip_longest
+from operator import attrgetter
+
+from validators import BOOK_FIELDS
+
+# wersja goes up by one with every write, for optimistic checks by the edit form and the API;
+# zmieniono is the time of the last write in seconds since the epoch (books.TOUCH)
+BOOK_COLUMNS = ('id',) + BOOK_FIELDS + ('wersja', 'zmieniono')
+USER_COLUMNS = ('id', 'imie', 'nazwisko', 'numer_telefonu', 'email', 'nazwa_uzytkownika', 'haslo', 'verification_code')
+
+
+class Record:
+    """Row with named attributes; columns left out of a projection are None."""
+
+    __slots__ = ()
+    columns = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._values = attrgetter(*cls.columns)
+
+    def __init__(self, **values):
+        for column in self.columns:
+            setattr(self, column, values.get(column))
+
+    @classmethod
+    def from_row(cls, row, columns=None):
+        if row is None:
+            return None
+        record = cls.__new__(cls)
+        values = dict(zip(columns or cls.columns, row))
+        for column in cls.columns:
+            setattr(record, column, values.get(column))
+        return record
+
+    def to_dict(self, fields=None):
+        return {field: getattr(self, field) for field in fields or self.columns}
+
+    def digest(self):
+        """Short hash of the values; a different row version gives a different digest."""
+        return hashlib.blake2b(repr(self._values(self)).encode(), digest_size=8).hexdigest()
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"{type(self).__name__}(id={self.id!r})"
+
+    def __getstate__(self):
+        return self._values(self)
+
+    def __setstate__(self, state):
+        # rows pickled before a column was added leave it None
+        for column, value in zip_longest(self.columns, state):
+            setattr(self, column, value)
+
+
+class Book(Record):
+    __slots__ = BOOK_COLUMNS
+    columns = BOOK_COLUMNS
+
+
+class User(Record):
+    __slots__ = USER_COLUMNS
+    columns = USER_COLUMNS
+
+
+def column_list(columns):
+    return ', '.join(columns)
@@ -0,0 +1,105 @@
+import hashlib
+import hmac
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import metrics
+
+ALGORITHM = 'pbkdf2_sha256'
+SALT_SIZE = 32
+
+# hashes written before the self-describing format: hex(salt + digest), 10000 iterations
+LEGACY_ITERATIONS = 10000
+
+
+def _pbkdf2(password, salt, iterations):
+    return hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, iterations)
+
+
+def parse(stored_hash):
+    if stored_hash.startswith(ALGORITHM + '$'):
+        algorithm, iterations, salt, digest = stored_hash.split('$')
+        return algorithm, int(iterations), bytes.fromhex(salt), bytes.fromhex(digest)
+    return None, LEGACY_ITERATIONS, bytes.fromhex(stored_hash[:SALT_SIZE * 2]), bytes.fromhex(stored_hash[SALT_SIZE * 2:])
+
+
+def _start_context():
+    # the pool is started from a worker whose other threads may hold locks (logging, the DB pool); a
+    # forked child would inherit them held and hang, so the processes come from a clean forkserver
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return multiprocessing.get_context(method)
+
+
+class PasswordHasher:
+    """PBKDF2 hashing in a bounded process pool, so CPU work does not hold the GIL of request threads."""
+
+    def __init__(self, iterations=LEGACY_ITERATIONS, workers=None, max_pending=None):
+        self.iterations = iterations
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self._pending = threading.BoundedSemaphore(max_pending or max(self.workers, 1) * 4)
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+
+    def resize(self, workers):
+        """Sets the pool size for pools started from now on, e.g. in processes forked later."""
+        with self._lock:
+            self.workers = workers
+            self._pending = threading.BoundedSemaphore(max(workers, 1) * 4)
+
+    def _get_executor(self):
+        # a pool started before fork() belongs to the parent; each worker process starts its own
+        if self._executor is None or self._executor_pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._executor_pid != os.getpid():
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=_start_context())
+                    self._executor_pid = os.getpid()
+        return self._executor
+
+    def _compute(self, operation, password, salt, iterations):
+        with metrics.time_password_hash(operation):
+            if not self.workers:
+                return _pbkdf2(password, salt, iterations)
+            with self._pending:
+                return self._get_executor().submit(_pbkdf2, password, salt, iterations).result()
+
+    def hash(self, password):
+        salt = os.urandom(SALT_SIZE)
+        digest = self._compute('hash', password, salt, self.iterations)
+        return f'{ALGORITHM}${self.iterations}${salt.hex()}${digest.hex()}'
+
+    def verify(self, password, stored_hash):
+        try:
+            algorithm, iterations, salt, expected = parse(stored_hash)
+        except ValueError:
+            return False
+        digest = self._compute('verify', password, salt, iterations)
+        return hmac.compare_digest(digest, expected)
+
+    def needs_rehash(self, stored_hash):
+        algorithm, iterations, salt, digest = parse(stored_hash)
+        return algorithm != ALGORITHM or iterations != self.iterations
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._executor_pid == os.getpid():
+                self._executor.shutdown()
+            self._executor = None
+
+
+def pool_size(web_workers):
+    """Hashing processes for each of `web_workers` processes, so that together they use every CPU once."""
+    return max(1, (os.cpu_count() or 1) // max(web_workers, 1))
+
+
+def init_app(app):
+    app.config.setdefault('PASSWORD_ITERATIONS', LEGACY_ITERATIONS)
+    app.config.setdefault('WEB_WORKERS', 1)
+    # each web worker forks its own pool, so cpu_count processes apiece would oversubscribe the CPUs
+    app.config.setdefault('PASSWORD_HASH_WORKERS', pool_size(app.config['WEB_WORKERS']))
+    hasher = PasswordHasher(iterations=app.config['PASSWORD_ITERATIONS'],
+                            workers=app.config['PASSWORD_HASH_WORKERS'])
+    app.extensions['password_hasher'] = hasher
+    return hasher
@@ -0,0 +1,116 @@
+import re
+
+TEXT_FIELDS = ('tytul', 'autor', 'wydawnictwo', 'seria')
+NUMBER_FIELDS = ('rok_wydania', 'ilosc_stron', 'rzad', 'regal', 'polka')
+SEARCH_FIELDS = TEXT_FIELDS + ('oprawa',) + NUMBER_FIELDS
+
+# ngram_token_size of the FULLTEXT parser; shorter terms fall back to a prefix match
+MIN_TOKEN_SIZE = 2
+
+_BOOLEAN_OPERATORS = re.compile(r'[+\-<>()~*"@]+')
+_RANGE = re.compile(r'^\s*(\d*)\s*-\s*(\d*)\s*$')
+
+
+def split_range(value):
+    match = _RANGE.match(value)
+    if match and (match.group(1) or match.group(2)):
+        return match.group(1), match.group(2)
+    return value, value
+
+
+def criteria_from_form(form):
+    return {field: form.get(field, '').strip() for field in SEARCH_FIELDS}
+
+
+def _terms(text):
+    return _BOOLEAN_OPERATORS.sub(' ', text).split()
+
+
+def search_conditions(criteria, dialect='mysql', facets=None):
+    """(WHERE conditions, their values, relevance terms, their values) for the search `criteria`."""
+    where = []
+    values = []
+    score = []
+    score_values = []
+
+    for field in TEXT_FIELDS:
+        text = criteria.get(field)
+        if not text:
+            continue
+
+        terms = _terms(text)
+
+        if dialect != 'mysql':
+            # no FULLTEXT index: substring match on every term, results in id order
+            for term in terms:
+                where.append(f"{field} LIKE %s")
+                values.append('%' + term + '%')
+            continue
+
+        long_terms = [term for term in terms if len(term) >= MIN_TOKEN_SIZE]
+        short_terms = [term for term in terms if len(term) < MIN_TOKEN_SIZE]
+
+        if long_terms:
+            against = ' '.join('+' + term for term in long_terms)
+            where.append(f"MATCH({field}) AGAINST (%s IN BOOLEAN MODE)")
+            values.append(against)
+            score.append(f"MATCH({field}) AGAINST (%s IN BOOLEAN MODE)")
+            score_values.append(against)
+
+        # too short for the FULLTEXT index: matched at the start of any word, as MATCH matches words
+        for term in short_terms:
+            where.append(f"({field} LIKE %s OR {field} LIKE %s)")
+            values.extend((term + '%', '% ' + term + '%'))
+
+    if criteria.get('oprawa'):
+        # whole value, any case: the MySQL collation ignores case by itself and keeps the index usable
+        where.append("oprawa = %s" if dialect == 'mysql' else "LOWER(oprawa) = LOWER(%s)")
+        values.append(criteria['oprawa'])
+
+    # exact values picked from the facet counts (facets.selected_facets); a decade is ten years
+    for field, value in (facets or {}).items():
+        if field == 'dekada':
+            where.append("rok_wydania BETWEEN %s AND %s")
+            values.extend((value, value + 9))
+        else:
+            where.append(f"{field} = %s")
+            values.append(value)
+
+    for field in NUMBER_FIELDS:
+        value = criteria.get(field)
+        if not value:
+            continue
+
+        low, high = split_range(value)
+        if low == high:
+            where.append(f"{field} = %s")
+            values.append(int(low))
+        else:
+            if low:
+                where.append(f"{field} >= %s")
+                values.append(int(low))
+            if high:
+                where.append(f"{field} <= %s")
+                values.append(int(high))
+
+    return where, values, score, score_values
+
+
+def build_search_query(criteria, columns='*', limit=None, dialect='mysql', facets=None):
+    where, values, score, score_values = search_conditions(criteria, dialect, facets)
+
+    query = f"SELECT {columns} FROM ksiazki"
+    if where:
+        query += " WHERE " + " AND ".join(where)
+
+    if score:
+        query += " ORDER BY (" + " + ".join(score) + ") DESC, id"
+        values.extend(score_values)
+    else:
+        query += " ORDER BY id"
+
+    if limit:
+        query += " LIMIT %s"
+        values.append(limit)
+
+    return query, values
@@ -0,0 +1,225 @@
+import os
+import pickle
+import re
+import secrets
+import threading
+import time
+
+import click
+from flask.sessions import SecureCookieSession, SessionInterface
+
+from cache import LocalRedis, MemoryCache, redis
+
+# token_urlsafe(32) output; anything else in the cookie is ignored without touching the store
+SID_PATTERN = re.compile(r'[A-Za-z0-9_-]{43}')
+
+
+class ServerSideSession(SecureCookieSession):
+    """Session data kept in a SessionStore; the cookie only carries the session id."""
+
+    def __init__(self, initial=None, sid=None, new=False):
+        super().__init__(initial)
+        self.sid = sid
+        self.new = new
+
+    def regenerate(self):
+        """Issue a new id, e.g. after logging in, so an id known before login is useless."""
+        self.previous_sid = self.sid
+        self.sid = new_sid()
+        self.modified = True
+
+
+def new_sid():
+    return secrets.token_urlsafe(32)
+
+
+class MemorySessionStore:
+    """Sessions held in this process; only for a single worker or development."""
+
+    def __init__(self):
+        self._cache = MemoryCache(max_entries=float('inf'), default_ttl=0)
+
+    def load(self, sid):
+        return self._cache.get(sid)
+
+    def save(self, sid, data, ttl):
+        self._cache.set(sid, dict(data), ttl=ttl)
+
+    def delete(self, sid):
+        self._cache.delete(sid)
+
+    def sweep(self):
+        return self._cache.sweep()
+
+
+class FileSessionStore:
+    """One pickle file per session; the file's mtime is set to its expiry time."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, sid):
+        return os.path.join(self.directory, sid)
+
+    def load(self, sid):
+        path = self._path(sid)
+        try:
+            if os.stat(path).st_mtime <= time.time():
+                self.delete(sid)
+                return None
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def save(self, sid, data, ttl):
+        path = self._path(sid)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(dict(data), f, pickle.HIGHEST_PROTOCOL)
+        expires_at = time.time() + ttl
+        os.utime(tmp_path, (expires_at, expires_at))
+        os.replace(tmp_path, path)
+
+    def delete(self, sid):
+        try:
+            os.remove(self._path(sid))
+        except FileNotFoundError:
+            pass
+
+    def sweep(self):
+        removed = 0
+        now = time.time()
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.stat().st_mtime <= now:
+                        os.remove(entry.path)
+                        removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+
+class SharedSessionStore:
+    """Sessions in Redis (or LocalRedis), shared by all worker processes."""
+
+    def __init__(self, client, prefix='biblioteka:sesja:'):
+        self.client = client
+        self.prefix = prefix
+
+    def load(self, sid):
+        raw = self.client.get(self.prefix + sid)
+        return None if raw is None else pickle.loads(raw)
+
+    def save(self, sid, data, ttl):
+        self.client.set(self.prefix + sid, pickle.dumps(dict(data), pickle.HIGHEST_PROTOCOL), ex=ttl)
+
+    def delete(self, sid):
+        self.client.delete(self.prefix + sid)
+
+    def sweep(self):
+        sweep = getattr(self.client, 'sweep', None)
+        return sweep() if sweep is not None else 0
+
+
+class ServerSideSessionInterface(SessionInterface):
+
+    def __init__(self, store, sweep_interval=300):
+        self.store = store
+        self.sweep_interval = sweep_interval
+        self._next_sweep = time.monotonic() + sweep_interval
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid and SID_PATTERN.fullmatch(sid):
+            data = self.store.load(sid)
+            if data is not None:
+                return ServerSideSession(data, sid=sid)
+        return ServerSideSession(sid=new_sid(), new=True)
+
+    def _ttl(self, app):
+        return int(app.permanent_session_lifetime.total_seconds())
+
+    def save_session(self, app, session, response):
+        self._maybe_sweep()
+
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        previous_sid = getattr(session, 'previous_sid', None)
+        if previous_sid:
+            self.store.delete(previous_sid)
+
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+                response.vary.add('Cookie')
+            return
+
+        # unchanged sessions are not written back, so most requests cost one store read
+        if not session.modified:
+            return
+
+        self.store.save(session.sid, session, self._ttl(app))
+        response.set_cookie(
+            name,
+            session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+        response.vary.add('Cookie')
+
+    def _maybe_sweep(self):
+        now = time.monotonic()
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + self.sweep_interval
+        self.store.sweep()
+
+
+def create_store(app):
+    backend = app.config['SESSION_BACKEND']
+
+    if backend == 'memory':
+        return MemorySessionStore()
+    if backend == 'file':
+        return FileSessionStore(app.config.get('SESSION_FILE_DIR') or os.path.join(app.instance_path, 'sessions'))
+    if backend == 'local':
+        return SharedSessionStore(LocalRedis())
+    if backend == 'redis':
+        if redis is None:
+            raise RuntimeError("SESSION_BACKEND = 'redis' wymaga pakietu redis")
+        return SharedSessionStore(redis.Redis.from_url(app.config['SESSION_REDIS_URL']))
+    raise ValueError(f'Nieznany SESSION_BACKEND: {backend}')
+
+
+def init_app(app):
+    app.config.setdefault('SESSION_BACKEND', 'memory')
+    app.config.setdefault('SESSION_FILE_DIR', None)
+    app.config.setdefault('SESSION_REDIS_URL', 'redis://localhost:6379/0')
+    app.config.setdefault('SESSION_SWEEP_INTERVAL', 300)
+
+    if app.config['SESSION_BACKEND'] == 'cookie':
+        # Flask's signed cookie sessions, as before
+        return None
+
+    store = create_store(app)
+    app.session_interface = ServerSideSessionInterface(store, app.config['SESSION_SWEEP_INTERVAL'])
+
+    @app.cli.command('sweep-sessions')
+    def sweep_sessions_command():
+        """Usuwa wygasłe sesje."""
+        click.echo(store.sweep())
+
+    return store
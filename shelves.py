@@ -0,0 +1,112 @@
+from collections import Counter
+
+from books import fetch_books
+from cache import CatalogIndex
+from db import get_cursor
+from models import BOOK_COLUMNS, column_list
+from search import split_range
+
+LOCATION_FIELDS = ('rzad', 'regal', 'polka')
+
+
+def _bounds(value):
+    """(low, high) for "3", "1-4", "2-" or "-5"; None for a side left open."""
+    low, high = split_range(str(value))
+    return (int(low) if low else None), (int(high) if high else None)
+
+
+def build_location_query(criteria, columns='*', limit=None):
+    """Exact or range match on rzad/regal/polka, in the order of the (rzad, regal, polka) index."""
+    where = []
+    values = []
+    for field in LOCATION_FIELDS:
+        value = criteria.get(field)
+        if value in (None, ''):
+            continue
+        low, high = _bounds(value)
+        if low is not None and low == high:
+            where.append(f"{field} = %s")
+            values.append(low)
+            continue
+        if low is not None:
+            where.append(f"{field} >= %s")
+            values.append(low)
+        if high is not None:
+            where.append(f"{field} <= %s")
+            values.append(high)
+
+    query = f"SELECT {columns} FROM ksiazki"
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    query += " ORDER BY rzad, regal, polka, id"
+    if limit:
+        query += " LIMIT %s"
+        values.append(limit)
+    return query, values
+
+
+def fetch_location(criteria, columns=BOOK_COLUMNS, limit=None):
+    query, values = build_location_query(criteria, column_list(columns), limit)
+    return fetch_books(query, values, columns)
+
+
+def _matches(location, bounds):
+    for position, (low, high) in bounds:
+        if low is not None and location[position] < low:
+            return False
+        if high is not None and location[position] > high:
+            return False
+    return True
+
+
+class OccupancyMap(CatalogIndex):
+    """Number of books on every shelf, kept in memory and updated from catalog_changed."""
+
+    def __init__(self, catalog_cache):
+        super().__init__(catalog_cache)
+        self._locations = {}
+        self._counts = Counter()
+
+    def _load(self):
+        with get_cursor() as cursor:
+            cursor.execute("SELECT id, rzad, regal, polka FROM ksiazki")
+            rows = cursor.fetchall()
+        self._locations = {row[0]: tuple(row[1:]) for row in rows}
+        self._counts = Counter(self._locations.values())
+
+    def _update(self, book_id):
+        with get_cursor() as cursor:
+            cursor.execute("SELECT rzad, regal, polka FROM ksiazki WHERE id = %s", (book_id,))
+            row = cursor.fetchone()
+        self._move(book_id, tuple(row) if row else None)
+
+    def _move(self, book_id, location):
+        previous = self._locations.pop(book_id, None)
+        if previous is not None:
+            self._counts[previous] -= 1
+            if not self._counts[previous]:
+                del self._counts[previous]
+        if location is not None:
+            self._locations[book_id] = location
+            self._counts[location] += 1
+
+    def counts(self, criteria=None):
+        """[(rzad, regal, polka), liczba] for every occupied shelf matching criteria, in shelf order."""
+        bounds = [(position, _bounds(criteria[field])) for position, field in enumerate(LOCATION_FIELDS)
+                  if criteria and criteria.get(field) not in (None, '')]
+        with self._lock:
+            self._ensure_loaded()
+            counts = list(self._counts.items())
+        return sorted((location, count) for location, count in counts if _matches(location, bounds))
+
+    def location(self, book_id):
+        with self._lock:
+            self._ensure_loaded()
+            return self._locations.get(book_id)
+
+
+def init_app(app):
+    app.config.setdefault('LOCATION_MAX_RESULTS', 10000)
+    occupancy = OccupancyMap(app.extensions['catalog_cache'])
+    app.extensions['occupancy'] = occupancy
+    return occupancy
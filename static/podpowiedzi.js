@@ -0,0 +1,28 @@
+// Podpowiedzi dla pól formularza wyszukiwania: <input list="..." data-podpowiedzi="/api/v1/podpowiedzi/<pole>">
+document.querySelectorAll('input[data-podpowiedzi]').forEach(function (input) {
+    var list = document.getElementById(input.getAttribute('list'));
+    var controller = null;
+
+    input.addEventListener('input', function () {
+        var prefix = input.value.trim();
+        if (controller) {
+            controller.abort();
+        }
+        if (!prefix) {
+            list.replaceChildren();
+            return;
+        }
+        controller = new AbortController();
+        fetch(input.dataset.podpowiedzi + '?q=' + encodeURIComponent(prefix),
+              {credentials: 'same-origin', signal: controller.signal})
+            .then(function (response) { return response.ok ? response.json() : {items: []}; })
+            .then(function (data) {
+                list.replaceChildren.apply(list, data.items.map(function (item) {
+                    var option = document.createElement('option');
+                    option.value = item.wartosc;
+                    return option;
+                }));
+            })
+            .catch(function () {});
+    });
+});
@@ -0,0 +1,162 @@
+import bisect
+import heapq
+import logging
+import unicodedata
+from collections import Counter
+from html import unescape
+
+from cache import CatalogIndex
+from db import get_cursor
+from search import TEXT_FIELDS
+
+logger = logging.getLogger(__name__)
+
+SUGGEST_FIELDS = TEXT_FIELDS
+
+# letters NFKD does not decompose into a base letter and a combining mark
+_LETTERS = str.maketrans({'ł': 'l', 'Ł': 'L', 'ø': 'o', 'Ø': 'O', 'đ': 'd', 'Đ': 'D', 'ß': 'ss'})
+
+
+def fold(text):
+    """Lower case, without diacritics and with whitespace collapsed: "Żółw  Łukasz" -> "zolw lukasz"."""
+    decomposed = unicodedata.normalize('NFKD', text.translate(_LETTERS))
+    return ' '.join(''.join(char for char in decomposed if not unicodedata.combining(char)).casefold().split())
+
+
+def _keys(value):
+    # the whole value and every word onwards, so "prus" finds "Bolesław Prus"
+    words = fold(value).split()
+    return {' '.join(words[start:]) for start in range(len(words))}
+
+
+class PrefixIndex:
+    """Distinct values of one column in a sorted array of (folded key, value), searched with bisect.
+
+    A second array ranks the values by number of books, so a short prefix matching much of the
+    column finds its most common values without looking at every match.
+    """
+
+    # prefix ranges longer than this are answered from the ranking instead of being scanned
+    SCAN_LIMIT = 500
+
+    def __init__(self, values=()):
+        self._counts = Counter(values)
+        self._keys = {value: tuple(_keys(value)) for value in self._counts}
+        self._entries = sorted((key, value) for value, keys in self._keys.items() for key in keys)
+        self._ranked = sorted((-count, value) for value, count in self._counts.items())
+
+    def _rank(self, value, count):
+        if count:
+            bisect.insort(self._ranked, (-count, value))
+
+    def _unrank(self, value, count):
+        index = bisect.bisect_left(self._ranked, (-count, value))
+        del self._ranked[index]
+
+    def add(self, value):
+        count = self._counts[value]
+        if count:
+            self._unrank(value, count)
+        else:
+            self._keys[value] = tuple(_keys(value))
+            for key in self._keys[value]:
+                bisect.insort(self._entries, (key, value))
+        self._counts[value] = count + 1
+        self._rank(value, count + 1)
+
+    def remove(self, value):
+        count = self._counts[value]
+        self._unrank(value, count)
+        if count > 1:
+            self._counts[value] = count - 1
+            self._rank(value, count - 1)
+            return
+        del self._counts[value]
+        for key in self._keys.pop(value):
+            index = bisect.bisect_left(self._entries, (key, value))
+            if index < len(self._entries) and self._entries[index] == (key, value):
+                del self._entries[index]
+
+    def complete(self, prefix, limit=10):
+        """The `limit` values with the most books, as (value, number of books), whose whole text or a word
+        in it starts with `prefix`; ties in alphabetical order."""
+        prefix = fold(prefix)
+        if not prefix:
+            return []
+        start = bisect.bisect_left(self._entries, (prefix,))
+        end = bisect.bisect_left(self._entries, (prefix + '\U0010ffff',), start)
+        if end - start <= self.SCAN_LIMIT:
+            ranked = heapq.nsmallest(limit, {(-self._counts[value], value) for key, value in self._entries[start:end]})
+        else:
+            # a long range means many matching values, so the most common ones come up early in the ranking
+            ranked = []
+            for negative_count, value in self._ranked:
+                if any(key.startswith(prefix) for key in self._keys[value]):
+                    ranked.append((negative_count, value))
+                    if len(ranked) == limit:
+                        break
+        return [(value, -negative_count) for negative_count, value in ranked]
+
+    def __len__(self):
+        return len(self._counts)
+
+
+class Suggestions(CatalogIndex):
+    """Typeahead for the text columns of ksiazki, answered from memory."""
+
+    def __init__(self, catalog_cache):
+        super().__init__(catalog_cache)
+        self._books = {}
+        self._indexes = {field: PrefixIndex() for field in SUGGEST_FIELDS}
+
+    @staticmethod
+    def _values(row):
+        # stored values are HTML-escaped; suggestions are plain text that goes back into a form field
+        return tuple(unescape(value) if value else None for value in row)
+
+    def _load(self):
+        with get_cursor() as cursor:
+            cursor.execute(f"SELECT id, {', '.join(SUGGEST_FIELDS)} FROM ksiazki")
+            rows = cursor.fetchall()
+        self._books = {row[0]: self._values(row[1:]) for row in rows}
+        self._indexes = {field: PrefixIndex(values[position] for values in self._books.values() if values[position])
+                         for position, field in enumerate(SUGGEST_FIELDS)}
+
+    def _update(self, book_id):
+        with get_cursor() as cursor:
+            cursor.execute(f"SELECT {', '.join(SUGGEST_FIELDS)} FROM ksiazki WHERE id = %s", (book_id,))
+            row = cursor.fetchone()
+        previous = self._books.pop(book_id, (None,) * len(SUGGEST_FIELDS))
+        current = self._values(row) if row else (None,) * len(SUGGEST_FIELDS)
+        if row:
+            self._books[book_id] = current
+        for field, old, new in zip(SUGGEST_FIELDS, previous, current):
+            if old == new:
+                continue
+            if old:
+                self._indexes[field].remove(old)
+            if new:
+                self._indexes[field].add(new)
+
+    def complete(self, field, prefix, limit=10):
+        with self._lock:
+            self._ensure_loaded()
+            return self._indexes[field].complete(prefix, limit)
+
+    def warm(self):
+        """Builds the index up front, e.g. in the master before gunicorn forks its workers."""
+        try:
+            with self._lock:
+                self._ensure_loaded()
+        except Exception:
+            # connection errors come straight from the driver, not as db.Error
+            logger.warning("Nie udało się zbudować indeksu podpowiedzi; zostanie zbudowany przy pierwszym użyciu",
+                           exc_info=True)
+
+
+def init_app(app):
+    app.config.setdefault('SUGGEST_LIMIT', 10)
+    app.config.setdefault('SUGGEST_MAX_LIMIT', 50)
+    suggestions = Suggestions(app.extensions['catalog_cache'])
+    app.extensions['suggestions'] = suggestions
+    return suggestions
@@ -0,0 +1,104 @@
+import unittest
+from unittest import mock
+
+import db
+from app import create_app
+from testing import AppTestCase
+
+BOOKS = [
+    (1, 'Władca Pierścieni', 'J.R.R. Tolkien', 'Allen & Unwin', 'Władca Pierścieni', 'Miękka', 1954, 1178, 1, 1, 2),
+    (2, 'Harry Potter i Kamień Filozoficzny', 'J.K. Rowling', 'Bloomsbury', 'Harry Potter', 'Twarda', 1997, 223, 2, 3, 4),
+]
+
+app = create_app({'DB_BACKEND': 'mysql', 'SESSION_BACKEND': 'memory', 'MAIL_TRANSPORT': 'memory'})
+catalog_cache = app.extensions['catalog_cache']
+
+
+class ApiTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.client = app.test_client()
+        self.cursor = mock.Mock()
+        self.cursor.fetchall.return_value = list(BOOKS)
+        self.cursor.fetchone.return_value = BOOKS[0]
+        conn = mock.Mock()
+        conn.cursor.return_value = self.cursor
+        self.pool = mock.patch.dict(db._pools, {app.config['DB_POOL_NAME']: mock.Mock(**{'get_connection.return_value': conn})})
+        self.pool.start()
+        catalog_cache.backend.clear()
+        with self.client.session_transaction() as session:
+            session['logged_in'] = True
+
+    def tearDown(self):
+        self.pool.stop()
+        catalog_cache.backend.clear()
+
+    def test_requires_login(self):
+        with self.client.session_transaction() as session:
+            session.clear()
+        self.assertEqual(self.client.get('/api/v1/ksiazki').status_code, 401)
+
+    def test_list_with_field_selection(self):
+        response = self.client.get('/api/v1/ksiazki?fields=tytul,autor')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['items'][0], {'id': 1, 'tytul': 'Władca Pierścieni', 'autor': 'J.R.R. Tolkien'})
+        self.assertTrue(self.cursor.execute.call_args[0][0].startswith('SELECT id, tytul, autor FROM'))
+
+    def test_unknown_field(self):
+        self.assertEqual(self.client.get('/api/v1/ksiazki?fields=haslo').status_code, 400)
+
+    def test_conditional_get(self):
+        response = self.client.get('/api/v1/ksiazki/1')
+        etag = response.headers['ETag']
+
+        response = self.client.get('/api/v1/ksiazki/1', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+        self.cursor.execute.assert_called_once()
+
+    def test_create_validates_payload(self):
+        response = self.client.post('/api/v1/ksiazki', json={'tytul': 'Lalka'})
+        self.assertEqual(response.status_code, 422)
+
+
+class RoundTripTestCase(AppTestCase):
+
+    def test_text_is_plain_in_and_out(self):
+        book_id = self.add(tytul='Tom & Jerry', wydawnictwo='"Iskry" <PL>')
+        url = f'/api/v1/ksiazki/{book_id}'
+        book = self.client.get(url).json
+        self.assertEqual((book['tytul'], book['wydawnictwo']), ('Tom & Jerry', '"Iskry" <PL>'))
+
+        # a GET payload written back with PUT, PATCH or POST keeps its text unchanged
+        self.assertEqual(self.client.put(url, json=book).json['tytul'], 'Tom & Jerry')
+        self.assertEqual(self.client.patch(url, json={'polka': 4}).json['tytul'], 'Tom & Jerry')
+        copy = {field: value for field, value in book.items() if field not in ('id', 'wersja')}
+        copy_id = self.client.post('/api/v1/ksiazki', json=copy).json['id']
+
+        self.assertEqual([item['tytul'] for item in self.client.get('/api/v1/ksiazki?fields=tytul').json['items']],
+                         ['Tom & Jerry', 'Tom & Jerry'])
+        self.assertEqual(self.client.get(f'/api/v1/ksiazki/{copy_id}').json['wydawnictwo'], '"Iskry" <PL>')
+        self.assertEqual(self.client.get('/api/v1/zmiany').json['items'][0]['ksiazka']['tytul'], 'Tom & Jerry')
+
+    def test_edits_within_one_second_are_not_hidden(self):
+        book_id = self.add()
+        url = f'/api/v1/ksiazki/{book_id}'
+        first = self.client.get(url)
+        self.assertEqual(self.client.get(url, headers={'If-Modified-Since': first.headers['Last-Modified']})
+                         .status_code, 304)
+
+        # two edits within the same second still move Last-Modified on, for clients sending only If-Modified-Since
+        for shelf in (4, 5):
+            self.client.patch(url, json={'polka': shelf})
+            response = self.client.get(url, headers={'If-Modified-Since': first.headers['Last-Modified']})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json['polka'], shelf)
+            self.assertGreater(response.last_modified, first.last_modified)
+            first = response
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': response.headers['ETag']}).status_code, 304)
+        # a list has no row to date a deletion by and is left to the ETag
+        self.assertNotIn('Last-Modified', self.client.get('/api/v1/ksiazki').headers)
+
+
+if __name__ == '__main__':
+    unittest.main()
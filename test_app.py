@@ -1,22 +1,39 @@
-import unittest, mysql.connector
+import os
+import unittest
 from markupsafe import escape
-from app import app, validate_name, validate_phone_number, validate_email, validate_password, validate_book_year, validate_positive_number, validate
+import db
+import migrate
+from app import create_app, validate_name, validate_phone_number, validate_email, validate_password, validate_book_year, validate_positive_number, validate
+
+BAZA_SQL = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baza.sql')
 
 class AppTestCase(unittest.TestCase):
 
+    @classmethod
+    def setUpClass(cls):
+        # in-memory SQLite with the schema from migrations and the sample books from baza.sql
+        cls.flask_app = create_app({'DB_BACKEND': 'sqlite', 'DB_PATH': ':memory:',
+                                    'SESSION_BACKEND': 'memory', 'MAIL_TRANSPORT': 'memory'})
+        cls.backend = db.backend(cls.flask_app)
+        conn = cls.backend.connect_direct()
+        migrate.upgrade(conn, dialect='sqlite')
+        with open(BAZA_SQL, encoding='utf-8') as f:
+            sample_books = 'INSERT INTO ksiazki' + f.read().split('INSERT INTO ksiazki', 1)[1]
+        conn.execute(sample_books)
+        conn.commit()
+        conn.close()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.flask_app.extensions['lifecycle'].shutdown()
+
     def setUp(self):
-        self.app = app.test_client()
-        db = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password="",
-            database="biblioteka"
-        )
-        cursor = db.cursor()
-        cursor.execute("DELETE FROM uzytkownicy WHERE nazwa_uzytkownika = 'johnsmith'")
-        db.commit()
-        cursor.close()
-        db.close()
+        self.app = self.flask_app.test_client()
+        self.flask_app.extensions['catalog_cache'].backend.clear()
+        with self.flask_app.app_context():
+            with db.get_cursor() as cursor:
+                cursor.execute("DELETE FROM uzytkownicy WHERE nazwa_uzytkownika = 'johnsmith'")
+            db.commit()
 
     def test_validate_name(self):
         valid_name = "John"
@@ -103,6 +120,19 @@ class AppTestCase(unittest.TestCase):
         response = self.app.get("/strona_glowna")
         self.assertEqual(response.status_code, 200)
 
+    def test_strona_glowna_pagination(self):
+        with self.app.session_transaction() as session:
+            session['logged_in'] = True
+            session['nazwa_uzytkownika'] = 'example_user'
+
+        response = self.app.get("/strona_glowna?limit=2")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("after=2".encode(), response.data)
+
+        response = self.app.get("/strona_glowna?after=2&limit=2")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("before=3".encode(), response.data)
+
     def test_strona_glowna_not_logged_in(self):
         response = self.app.get("/strona_glowna", follow_redirects=True)
 
@@ -0,0 +1,200 @@
+import asyncio
+import json
+import threading
+import time
+import unittest
+from unittest import mock
+from urllib.parse import urlencode
+
+import books
+from aio import create_asgi_app
+from cache import SharedCache
+from sessions import MemorySessionStore
+from testing import BOOK, AppTestCase
+
+
+class Response:
+
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    @property
+    def json(self):
+        return json.loads(self.body)
+
+    @property
+    def text(self):
+        return self.body.decode()
+
+
+async def call(application, method, path, query=None, body=b'', headers=(), chunk_size=None):
+    """One request to an ASGI application, with the body sent in chunks of chunk_size."""
+    chunks = [body[start:start + chunk_size] for start in range(0, len(body), chunk_size)] if chunk_size else [body]
+    messages = [{'type': 'http.request', 'body': chunk, 'more_body': index < len(chunks) - 1}
+                for index, chunk in enumerate(chunks)]
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'http_version': '1.1', 'method': method, 'scheme': 'http', 'path': path,
+             'root_path': '', 'query_string': urlencode(query or {}).encode(), 'server': ('localhost', 80),
+             'client': ('127.0.0.1', 5000), 'headers': [(name.encode(), value.encode()) for name, value in headers]}
+    await application(scope, receive, send)
+    start = sent[0]
+    return Response(start['status'], {name.decode(): value.decode() for name, value in start['headers']},
+                    b''.join(message.get('body', b'') for message in sent[1:]))
+
+
+class ASGITestCase(AppTestCase):
+
+    config = {'ASYNC_DB_POOL_SIZE': 2, 'FEED_POLL_INTERVAL': 0.05}
+
+    def setUp(self):
+        super().setUp()
+        self.application = create_asgi_app(self.app)
+        self.runner = asyncio.Runner()
+        self.cookie = f"session={self.client.get_cookie('session').value}"
+        self.ids = [self.add(tytul=f'Tom {number}') for number in range(3)]
+
+    def tearDown(self):
+        # close() also shuts the app down
+        self.runner.run(self.application.close())
+        self.runner.close()
+
+    def request(self, method, path, query=None, body=b'', headers=(), cookie=True, **kwargs):
+        headers = list(headers) + ([('Cookie', self.cookie)] if cookie else [])
+        return self.runner.run(call(self.application, method, path, query, body, headers, **kwargs))
+
+    def test_read_views_answer_like_their_sync_twins(self):
+        with mock.patch.object(books, 'fetch_books') as fetch_books:
+            responses = [
+                self.request('GET', '/api/v1/ksiazki', {'limit': 2, 'fields': 'tytul'}),
+                self.request('GET', f'/api/v1/ksiazki/{self.ids[1]}'),
+                self.request('GET', '/api/v1/ksiazki/szukaj', {'tytul': 'Tom 2'}),
+                self.request('GET', '/api/v1/podpowiedzi/tytul', {'q': 'to'}),
+                self.request('GET', '/api/v1/zmiany', {'after': self.ids[0]}),
+            ]
+        # the sync query path was never used
+        fetch_books.assert_not_called()
+
+        sync = [
+            self.client.get('/api/v1/ksiazki?limit=2&fields=tytul'),
+            self.client.get(f'/api/v1/ksiazki/{self.ids[1]}'),
+            self.client.get('/api/v1/ksiazki/szukaj?tytul=Tom+2'),
+            self.client.get('/api/v1/podpowiedzi/tytul?q=to'),
+            self.client.get(f'/api/v1/zmiany?after={self.ids[0]}'),
+        ]
+        for response, expected in zip(responses, sync):
+            self.assertEqual(response.status, 200)
+            self.assertEqual(response.json, expected.json)
+        self.assertEqual(responses[0].json['items'], [{'id': self.ids[0], 'tytul': 'Tom 0'},
+                                                      {'id': self.ids[1], 'tytul': 'Tom 1'}])
+        self.assertEqual(responses[0].headers['etag'], sync[0].headers['ETag'])
+
+    def test_errors_and_login(self):
+        self.assertEqual(self.request('GET', '/api/v1/ksiazki/999').status, 404)
+        self.assertEqual(self.request('GET', '/api/v1/ksiazki', {'fields': 'haslo'}).status, 400)
+        self.assertEqual(self.request('GET', '/api/v1/ksiazki/szukaj', {'rok_wydania': 'x'}).status, 422)
+        self.assertEqual(self.request('GET', '/api/v1/ksiazki', cookie=False).status, 401)
+        response = self.request('GET', '/strona_glowna', cookie=False)
+        self.assertEqual(response.status, 302)
+        self.assertTrue(response.headers['location'].endswith('/login'))
+
+    def test_pages_render_the_shared_templates(self):
+        page = self.request('GET', '/strona_glowna', {'limit': 2})
+        self.assertEqual(page.status, 200)
+        self.assertIn('Tom 1', page.text)
+        self.assertNotIn('Tom 2', page.text)
+
+        page = self.request('GET', '/strona_glowna', {'seria': 'Klasyka', 'after': self.ids[1]})
+        self.assertIn('Tom 2', page.text)
+        self.assertNotIn('Tom 1', page.text)
+
+        form = urlencode({**dict.fromkeys(BOOK, ''), 'tytul': 'Tom 1'}).encode()
+        page = self.request('POST', '/wyszukaj_ksiazke', body=form,
+                            headers=[('Content-Type', 'application/x-www-form-urlencoded')])
+        self.assertEqual(page.status, 200)
+        self.assertIn('Tom 1', page.text)
+        self.assertNotIn('Tom 2', page.text)
+
+    def test_other_routes_run_on_the_wsgi_app(self):
+        self.request('GET', '/api/v1/ksiazki')
+        body = json.dumps({**BOOK, 'tytul': 'Nowa'}).encode()
+        response = self.request('POST', '/api/v1/ksiazki', body=body, chunk_size=7,
+                                headers=[('Content-Type', 'application/json')])
+        self.assertEqual(response.status, 201, response.body)
+        # the write invalidated the page the async view had cached
+        self.assertEqual(self.request('GET', '/api/v1/ksiazki').json['items'][-1]['tytul'], 'Nowa')
+
+        self.assertEqual(self.request('GET', '/nie_ma_takiej_strony').status, 404)
+        self.assertEqual(self.request('GET', '/healthz', cookie=False).status, 200)
+
+    def test_many_requests_share_a_small_pool(self):
+        async def many():
+            return await asyncio.gather(*(call(self.application, 'GET', f'/api/v1/ksiazki/{self.ids[number % 3]}',
+                                               {'fields': 'tytul'}, headers=[('Cookie', self.cookie)])
+                                          for number in range(50)))
+
+        responses = self.runner.run(many())
+        self.assertEqual({response.status for response in responses}, {200})
+
+    def test_long_poll_waits_without_a_thread(self):
+        cursor = self.request('GET', '/api/v1/zmiany').json['cursor']
+
+        async def poll_then_write():
+            poll = asyncio.ensure_future(call(self.application, 'GET', '/api/v1/zmiany', {'after': cursor, 'wait': 10},
+                                              headers=[('Cookie', self.cookie)]))
+            await asyncio.sleep(0.2)
+            self.assertFalse(poll.done())
+            await call(self.application, 'DELETE', f'/api/v1/ksiazki/{self.ids[0]}',
+                       headers=[('Cookie', self.cookie)])
+            return await poll
+
+        started = time.monotonic()
+        response = self.runner.run(poll_then_write())
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual([(item['id'], item['usunieta']) for item in response.json['items']], [(self.ids[0], True)])
+
+    def test_blocking_clients_stay_off_the_loop(self):
+        # a redis client and a session store that record the thread they were called on
+        threads = []
+
+        def recorded(function):
+            def called(*args, **kwargs):
+                threads.append(threading.current_thread())
+                return function(*args, **kwargs)
+            return called
+
+        client = mock.Mock(get=recorded(lambda key: None), set=recorded(lambda *args, **kwargs: True),
+                           mget=recorded(lambda keys: [None] * len(keys)))
+        self.app.extensions['catalog_cache'].backend = SharedCache(client)
+        with mock.patch.object(MemorySessionStore, 'load', recorded(lambda store, sid: {'logged_in': True})):
+            for path in ('/strona_glowna', f'/api/v1/ksiazki/{self.ids[0]}', '/api/v1/ksiazki'):
+                self.assertEqual(self.request('GET', path).status, 200, path)
+        self.assertTrue(threads)
+        self.assertNotIn(threading.main_thread(), threads)
+
+    def test_lifespan(self):
+        messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        self.runner.run(self.application({'type': 'lifespan'}, receive, send))
+        self.assertEqual(sent, ['lifespan.startup.complete', 'lifespan.shutdown.complete'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+
+from flask import render_template_string
+
+import assets
+from app import create_app
+from models import Book
+
+BUNDLES = {'vendor.css': ['vendor/lib/css/lib.min.css']}
+
+
+class MinifyTestCase(unittest.TestCase):
+
+    def test_whitespace_and_comments_removed(self):
+        self.assertEqual(assets.minify_css("/* x */\na , b > c {\n  color : red;\n}\n"), 'a,b>c{color :red}')
+
+    def test_strings_and_descendant_selectors_kept(self):
+        css = 'a :hover { content: "a , b"; }'
+        self.assertEqual(assets.minify_css(css), 'a :hover{content:"a , b"}')
+
+
+class BuilderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.static = tempfile.mkdtemp()
+        self.output = os.path.join(self.static, 'dist')
+        self.write('images/tlo.jpg', b'\xff\xd8jpeg')
+        self.write('strona.css', b'body {\n  background: url("/static/images/tlo.jpg");\n}\n' * 20)
+        self.write('vendor/lib/css/lib.min.css', b"@font-face{src:url('../fonts/ikony.woff2?v=1')}")
+        self.write('vendor/lib/fonts/ikony.woff2', b'woff2')
+        self.manifest = assets.Builder(self.static, self.output, bundles=BUNDLES).build()
+
+    def tearDown(self):
+        shutil.rmtree(self.static)
+
+    def write(self, name, content):
+        path = os.path.join(self.static, *name.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+
+    def read(self, name):
+        with open(os.path.join(self.output, self.manifest['assets'][name]), 'rb') as f:
+            return f.read()
+
+    def test_names_are_fingerprinted(self):
+        self.assertRegex(self.manifest['assets']['strona.css'], r'^strona\.[0-9a-f]{12}\.css$')
+        self.assertRegex(self.manifest['assets']['images/tlo.jpg'], r'^images/tlo\.[0-9a-f]{12}\.jpg$')
+
+    def test_css_points_at_fingerprinted_files(self):
+        css = self.read('strona.css').decode()
+        self.assertIn(f"url(/assets/{self.manifest['assets']['images/tlo.jpg']})", css)
+        self.assertNotIn('\n', css)
+        vendor_css = self.read('vendor.css').decode()
+        self.assertIn(f"url(/assets/{self.manifest['assets']['vendor/lib/fonts/ikony.woff2']})", vendor_css)
+        self.assertNotIn('vendor/lib/css/lib.min.css', self.manifest['assets'])
+
+    def test_text_files_are_precompressed(self):
+        built = self.manifest['assets']['strona.css']
+        self.assertEqual(self.manifest['compressed'][built], ['gzip'])
+        with gzip.open(os.path.join(self.output, built + '.gz')) as f:
+            self.assertEqual(f.read(), self.read('strona.css'))
+        self.assertNotIn(self.manifest['assets']['images/tlo.jpg'], self.manifest['compressed'])
+
+    def test_missing_bundle_source(self):
+        with self.assertRaises(Exception):
+            assets.Builder(self.static, self.output, bundles={'x.js': ['vendor/brak.js']}).build()
+
+
+class AssetsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.output = tempfile.mkdtemp()
+        self.app = create_app({'DB_BACKEND': 'sqlite', 'DB_PATH': ':memory:', 'SESSION_BACKEND': 'memory',
+                               'MAIL_TRANSPORT': 'memory', 'ASSETS_DIR': self.output})
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        self.app.extensions['lifecycle'].shutdown()
+        shutil.rmtree(self.output)
+
+    def render(self, source):
+        with self.app.test_request_context():
+            return render_template_string(source)
+
+    def test_unbuilt_assets_fall_back_to_sources(self):
+        html = self.render("{{ stylesheet('vendor.css') }}{{ stylesheet('style.css') }}")
+        self.assertIn('href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0-alpha3/dist/css/bootstrap.min.css" '
+                      'integrity="sha384-', html)
+        self.assertIn('href="/static/style.css"', html)
+
+    def test_built_assets(self):
+        assets.Builder(self.app.static_folder, self.output, bundles={}).build()
+        self.app.extensions['assets'].reload()
+        built = self.app.extensions['assets'].assets['style.css']
+
+        html = self.render("{{ stylesheet('style.css') }}<img src=\"{{ asset_url('images/search.png') }}\">")
+        self.assertIn(f'href="/assets/{built}"', html)
+        self.assertRegex(html, r'src="/assets/images/search\.[0-9a-f]{12}\.png"')
+
+        response = self.client.get(f'/assets/{built}', headers={'Accept-Encoding': 'gzip, br'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.mimetype, 'text/css')
+        self.assertIn('immutable', response.headers['Cache-Control'])
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertEqual(gzip.decompress(response.data), self.client.get(f'/assets/{built}').data)
+        response.close()
+
+        self.assertEqual(self.client.get('/assets/style.css').status_code, 404)
+
+
+class BookRowsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app({'DB_BACKEND': 'sqlite', 'DB_PATH': ':memory:', 'SESSION_BACKEND': 'memory',
+                               'MAIL_TRANSPORT': 'memory'})
+        self.cache = self.app.extensions['catalog_cache']
+
+    def tearDown(self):
+        self.app.extensions['lifecycle'].shutdown()
+
+    def render(self, books):
+        with self.app.test_request_context():
+            return render_template_string("{{ book_rows(books, '_wiersz_wyszukiwania.html') }}", books=books)
+
+    def test_rows_are_cached_per_book_version(self):
+        books = [Book(id=1, tytul='Lalka'), Book(id=2, tytul='Potop')]
+        html = self.render(books)
+        self.assertIn('Lalka', html)
+        self.assertEqual(self.cache.stats()['misses'], 2)
+
+        self.assertEqual(self.render(books), html)
+        self.assertEqual(self.cache.stats()['hits'], 2)
+
+        books[0].tytul = 'Faraon'
+        self.assertIn('Faraon', self.render(books))
+        self.assertEqual(self.cache.stats()['misses'], 3)
+
+    def test_rows_are_escaped(self):
+        self.assertIn('&lt;b&gt;', self.render([Book(id=1, tytul='<b>')]))
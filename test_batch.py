@@ -0,0 +1,97 @@
+import unittest
+from unittest import mock
+
+import db
+from facets import FacetIndex
+from testing import AppTestCase
+
+
+class BatchTestCase(AppTestCase):
+
+    config = {'BATCH_MAX_ITEMS': 5}
+
+    def setUp(self):
+        super().setUp()
+        self.ids = [self.add(tytul=f'Tom {number}') for number in range(3)]
+
+    def book(self, book_id):
+        return self.client.get(f'/api/v1/ksiazki/{book_id}').json
+
+    def test_set_fields_on_many_books(self):
+        self.client.get('/api/v1/fasety')
+        with mock.patch.object(FacetIndex, '_load') as load:
+            response = self.client.patch('/api/v1/ksiazki', json={'ids': self.ids[:2] + [999],
+                                                                   'zmiany': {'rzad': '4', 'seria': 'Nowa'}})
+            counts = self.client.get('/api/v1/fasety').json['seria']
+        load.assert_not_called()
+        self.assertEqual(counts, [{'wartosc': 'Nowa', 'liczba': 2}, {'wartosc': 'Klasyka', 'liczba': 1}])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['zmienione'], 2)
+        self.assertEqual(response.json['wyniki'][2], {'id': 999, 'ok': False, 'errors': ['Nie znaleziono książki']})
+        self.assertEqual((self.book(self.ids[0])['rzad'], self.book(self.ids[0])['seria']), (4, 'Nowa'))
+        self.assertEqual(self.book(self.ids[2])['rzad'], 1)
+
+    def test_invalid_values_write_nothing(self):
+        response = self.client.patch('/api/v1/ksiazki', json={'ids': self.ids, 'zmiany': {'rzad': 'x'}})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.json['zmienione'], 0)
+        self.assertEqual(response.json['wyniki'][0]['errors'], ['Nieprawidłowy numer rzędu!'])
+
+        response = self.client.patch('/api/v1/ksiazki', json={'ids': self.ids, 'zmiany': {'id': '5'}})
+        self.assertEqual(response.json['wyniki'][0]['errors'], ['Nieznane pola: id'])
+
+        response = self.client.patch('/api/v1/ksiazki', json={'ids': [self.ids[0], 'abc'], 'zmiany': {'rzad': '2'}})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.book(self.ids[0])['rzad'], 1)
+
+    def test_per_item_values(self):
+        items = [{'id': self.ids[0], 'rzad': '5', 'regal': '1'}, {'id': self.ids[1], 'rzad': '6', 'regal': '2'},
+                 {'id': self.ids[2], 'polka': '9'}]
+        response = self.client.patch('/api/v1/ksiazki', json={'items': items})
+        self.assertEqual(response.status_code, 200, response.json)
+        self.assertEqual([(self.book(book_id)['rzad'], self.book(book_id)['regal'], self.book(book_id)['polka'])
+                          for book_id in self.ids], [(5, 1, 3), (6, 2, 3), (1, 2, 9)])
+
+        response = self.client.patch('/api/v1/ksiazki', json={'items': [{'id': self.ids[0], 'rzad': '7'},
+                                                                         {'id': self.ids[0], 'rzad': '8'},
+                                                                         {'id': self.ids[1], 'polka': '0'}]})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual([result['errors'] for result in response.json['wyniki']],
+                         [['Powtórzony identyfikator'], ['Nieprawidłowy numer półki!']])
+        self.assertEqual(self.book(self.ids[0])['rzad'], 5)
+
+    def test_delete_many(self):
+        response = self.client.delete('/api/v1/ksiazki', json={'ids': self.ids[:2]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['zmienione'], 2)
+        self.assertEqual(self.client.get(f'/api/v1/ksiazki/{self.ids[0]}').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/v1/ksiazki/{self.ids[2]}').status_code, 200)
+
+    def test_limits(self):
+        self.assertEqual(self.client.delete('/api/v1/ksiazki', json={'ids': list(range(1, 7))}).status_code, 413)
+        self.assertEqual(self.client.delete('/api/v1/ksiazki', json={'ids': []}).status_code, 400)
+
+    def test_failed_commit_rolls_back_the_whole_batch(self):
+        with mock.patch('batch.db.commit', side_effect=db.Error('awaria')), self.assertLogs(self.app.logger, 'ERROR'):
+            response = self.client.patch('/api/v1/ksiazki', json={'ids': self.ids, 'zmiany': {'rzad': '9'}})
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual([self.book(book_id)['rzad'] for book_id in self.ids], [1, 1, 1])
+
+    def test_catalog_form(self):
+        response = self.client.post('/zaznaczone_ksiazki', data={'ids': self.ids[:2], 'akcja': 'zmien', 'polka': '7',
+                                                                  'rzad': '', 'powrot': '/strona_glowna?limit=2'})
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.location.endswith('/strona_glowna?limit=2'))
+        page = self.client.get('/strona_glowna').get_data(as_text=True)
+        self.assertIn('Zmieniono książek: 2.', page)
+        self.assertEqual(self.book(self.ids[1])['polka'], 7)
+
+        response = self.client.post('/zaznaczone_ksiazki', data={'ids': self.ids, 'akcja': 'usun',
+                                                                  'powrot': '//zly.example'})
+        self.assertTrue(response.location.endswith('/strona_glowna'))
+        self.assertIn('Usunięto książek: 3.', self.client.get('/strona_glowna').get_data(as_text=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
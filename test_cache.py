@@ -0,0 +1,92 @@
+import time
+import unittest
+
+from cache import CatalogCache, LocalRedis, MemoryCache, SharedCache
+
+
+class MemoryCacheTestCase(unittest.TestCase):
+
+    def test_lru_eviction(self):
+        cache = MemoryCache(max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_ttl_expiry(self):
+        cache = MemoryCache()
+        cache.set('a', 1, ttl=0.01)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get('a'))
+
+
+class CatalogCacheTestCase(unittest.TestCase):
+
+    def check_backend(self, backend):
+        catalog_cache = CatalogCache(backend)
+        loads = []
+
+        def loader():
+            loads.append(1)
+            return [[1, 'Władca Pierścieni']], None, None
+
+        catalog_cache.page((None, None, 50), loader)
+        catalog_cache.page((None, None, 50), loader)
+        self.assertEqual(len(loads), 1)
+
+        catalog_cache.invalidate(1)
+        books, prev_cursor, next_cursor = catalog_cache.page((None, None, 50), loader)
+        self.assertEqual(len(loads), 2)
+        self.assertEqual(books[0][1], 'Władca Pierścieni')
+        self.assertEqual(catalog_cache.stats()['hits'], 1)
+        self.assertEqual(catalog_cache.stats()['misses'], 2)
+
+    def test_memory_backend(self):
+        self.check_backend(MemoryCache())
+
+    def test_shared_backend(self):
+        self.check_backend(SharedCache(LocalRedis()))
+
+    def test_book_invalidation(self):
+        catalog_cache = CatalogCache(MemoryCache())
+        catalog_cache.book(1, lambda: (1, 'stary'))
+        catalog_cache.invalidate(1)
+        self.assertEqual(catalog_cache.book(1, lambda: (1, 'nowy')), (1, 'nowy'))
+
+    def test_row_read_before_a_write_is_not_kept(self):
+        catalog_cache = CatalogCache(MemoryCache())
+
+        def read_then_edit():
+            # the edit commits and invalidates after this reader has read the row
+            catalog_cache.invalidate(1)
+            return (1, 'stary')
+
+        self.assertEqual(catalog_cache.book(1, read_then_edit), (1, 'stary'))
+        self.assertEqual(catalog_cache.book(1, lambda: (1, 'nowy')), (1, 'nowy'))
+        self.assertEqual(catalog_cache.book(1, lambda: (1, 'inny')), (1, 'nowy'))
+
+    def check_fragments(self, backend):
+        catalog_cache = CatalogCache(backend)
+        rendered = []
+
+        def render(index):
+            rendered.append(index)
+            return f'<tr>{index}</tr>'
+
+        self.assertEqual(catalog_cache.fragments(['a', 'b'], render), ['<tr>0</tr>', '<tr>1</tr>'])
+        self.assertEqual(catalog_cache.fragments(['a', 'c'], render), ['<tr>0</tr>', '<tr>1</tr>'])
+        self.assertEqual(rendered, [0, 1, 1])
+        self.assertEqual(catalog_cache.stats()['hits'], 1)
+
+    def test_fragments_memory_backend(self):
+        self.check_fragments(MemoryCache())
+
+    def test_fragments_shared_backend(self):
+        self.check_fragments(SharedCache(LocalRedis()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import threading
+import time
+import unittest
+
+import db
+import migrate
+from testing import BOOK, AppTestCase, sqlite_app
+
+
+class ChangeFeedTestCase(AppTestCase):
+
+    config = {'FEED_POLL_INTERVAL': 0.05}
+
+    def setUp(self):
+        super().setUp()
+        self.ids = [self.add(tytul=f'Tom {number}') for number in range(3)]
+
+    def feed(self, after=0, **args):
+        return self.client.get('/api/v1/zmiany', query_string={'after': after, **args}).json
+
+    def test_full_copy_then_only_new_changes(self):
+        first = self.feed(limit=2)
+        self.assertTrue(first['has_more'])
+        rest = self.feed(first['cursor'], limit=2)
+        self.assertFalse(rest['has_more'])
+        items = first['items'] + rest['items']
+        self.assertEqual([item['id'] for item in items], self.ids)
+        self.assertEqual(items[0]['ksiazka']['tytul'], 'Tom 0')
+        self.assertEqual({item['wersja'] for item in items}, {1})
+
+        self.client.patch(f'/api/v1/ksiazki/{self.ids[1]}', json={'rzad': '5'})
+        self.client.delete(f'/api/v1/ksiazki/{self.ids[0]}')
+        changes = self.feed(rest['cursor'])
+        self.assertEqual([(item['id'], item['wersja'], item['usunieta']) for item in changes['items']],
+                         [(self.ids[1], 2, False), (self.ids[0], 2, True)])
+        self.assertEqual(changes['items'][0]['ksiazka']['rzad'], 5)
+        self.assertIsNone(changes['items'][1]['ksiazka'])
+
+        self.assertEqual(self.feed(changes['cursor']), {'items': [], 'cursor': changes['cursor'], 'has_more': False})
+        # a book changed again moves to its newest change instead of being listed twice
+        self.assertEqual([item['id'] for item in self.feed()['items']], [self.ids[2], self.ids[1], self.ids[0]])
+
+    def test_projection(self):
+        item = self.feed(fields='tytul')['items'][0]
+        self.assertEqual(item['ksiazka'], {'id': self.ids[0], 'tytul': 'Tom 0'})
+        self.assertEqual(item['wersja'], 1)
+
+    def test_batches_number_every_book(self):
+        cursor = self.feed()['cursor']
+        self.client.patch('/api/v1/ksiazki', json={'ids': self.ids[:2], 'zmiany': {'polka': '4'}})
+        self.client.patch('/api/v1/ksiazki', json={'items': [{'id': self.ids[2], 'polka': '5'}]})
+        self.client.delete('/api/v1/ksiazki', json={'ids': self.ids[1:]})
+        items = self.feed(cursor)['items']
+        self.assertEqual([(item['id'], item['usunieta']) for item in items],
+                         [(self.ids[0], False), (self.ids[1], True), (self.ids[2], True)])
+        self.assertEqual([item['wersja'] for item in items], [2, 3, 3])
+        self.assertEqual(len({item['zmiana'] for item in items}), 3)
+
+    def test_stale_version_is_refused(self):
+        url = f'/api/v1/ksiazki/{self.ids[0]}'
+        book = self.client.get(url).json
+        self.assertEqual(self.client.put(url, json={**book, 'polka': 7}).json['wersja'], 2)
+
+        response = self.client.put(url, json={**book, 'polka': 8})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json['wersja'], 2)
+        self.assertEqual(self.client.patch(url, json={'polka': 8, 'wersja': 1}).status_code, 409)
+        self.assertEqual(self.client.patch(url, json={'polka': 8, 'wersja': 'x'}).status_code, 422)
+        self.assertEqual(self.client.put('/api/v1/ksiazki/999', json={**book, 'wersja': 1}).status_code, 404)
+        self.assertEqual(self.client.get(url).json['polka'], 7)
+
+        self.assertEqual(self.client.patch(url, json={'polka': 8, 'wersja': 2}).json['wersja'], 3)
+
+    def test_edit_form_refuses_a_save_over_another_edit(self):
+        url = f'/edytuj_ksiazke/{self.ids[0]}'
+        self.assertIn('name="wersja" value="1"', self.client.get(url).get_data(as_text=True))
+        self.assertEqual(self.client.post(url, data={**BOOK, 'polka': '7', 'wersja': '1'}).status_code, 302)
+
+        response = self.client.post(url, data={**BOOK, 'polka': '8', 'wersja': '1'})
+        self.assertEqual(response.status_code, 409)
+        page = response.get_data(as_text=True)
+        self.assertIn('Ktoś zmienił tę książkę w międzyczasie', page)
+        self.assertIn('name="wersja" value="2"', page)
+        self.assertEqual(self.client.get(f'/api/v1/ksiazki/{self.ids[0]}').json['polka'], 7)
+
+    def test_long_poll_returns_on_the_next_write(self):
+        cursor = self.feed()['cursor']
+        writer = threading.Timer(0.2, lambda: self.login().delete(f'/api/v1/ksiazki/{self.ids[2]}'))
+        writer.start()
+        started = time.monotonic()
+        changes = self.feed(cursor, wait=10)
+        writer.join()
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual([item['id'] for item in changes['items']], [self.ids[2]])
+
+        started = time.monotonic()
+        self.assertEqual(self.feed(changes['cursor'], wait=0.2)['items'], [])
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+
+        self.app.extensions['change_feed'].stop()
+        started = time.monotonic()
+        self.assertEqual(self.feed(changes['cursor'], wait=10)['items'], [])
+        self.assertLess(time.monotonic() - started, 5)
+
+    def test_migration_numbers_existing_books(self):
+        app = sqlite_app(target='0002')
+        conn = db.backend(app).connect_direct()
+        conn.executemany("INSERT INTO ksiazki (tytul, autor, wydawnictwo, seria, oprawa, rok_wydania, ilosc_stron, "
+                         "rzad, regal, polka) VALUES (?, 'A', 'W', 'S', 'Twarda', 2000, 100, 1, 1, 1)", [('a',), ('b',)])
+        conn.commit()
+        migrate.upgrade(conn, dialect='sqlite')
+        conn.close()
+        try:
+            client = app.test_client()
+            with client.session_transaction() as session:
+                session['logged_in'] = True
+            client.post('/api/v1/ksiazki', json=BOOK)
+            items = client.get('/api/v1/zmiany').json['items']
+            self.assertEqual([(item['zmiana'], item['id']) for item in items], [(1, 1), (2, 2), (3, 3)])
+        finally:
+            app.extensions['lifecycle'].shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import threading
+import unittest
+from unittest import mock
+
+from flask import Flask
+from mysql.connector import errors
+
+import db
+import migrate
+
+
+class DbPoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['DB_POOL_NAME'] = 'test_pool'
+        self.app.config['DB_POOL_TIMEOUT'] = 0
+        db.init_app(self.app)
+        self.pool = mock.Mock()
+        db._pools['test_pool'] = self.pool
+
+    def tearDown(self):
+        db._pools.pop('test_pool', None)
+
+    def test_connection_checked_out_once_per_request(self):
+        with self.app.app_context():
+            self.assertIs(db.get_db(), db.get_db())
+            conn = db.get_db()
+        self.pool.get_connection.assert_called_once()
+        conn.ping.assert_called_once()
+        conn.close.assert_called_once()
+
+    def test_cursor_is_always_closed(self):
+        with self.app.app_context():
+            with self.assertRaises(RuntimeError):
+                with db.get_cursor() as cursor:
+                    raise RuntimeError()
+            cursor.close.assert_called_once()
+
+    def test_exhausted_pool_raises_after_timeout(self):
+        self.pool.get_connection.side_effect = errors.PoolError()
+        with self.app.app_context():
+            with self.assertRaises(errors.PoolError):
+                db.get_db()
+
+
+class SQLiteBackendTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['DB_BACKEND'] = 'sqlite'
+        self.app.config['DB_PATH'] = ':memory:'
+        db.init_app(self.app)
+        self.backend = db.backend(self.app)
+        conn = self.backend.connect_direct()
+        migrate.upgrade(conn, dialect='sqlite')
+        conn.close()
+
+    def tearDown(self):
+        self.backend.close()
+
+    def _insert_user(self, nazwa):
+        with db.get_cursor() as cursor:
+            cursor.execute("INSERT INTO uzytkownicy (imie, nazwisko, numer_telefonu, email, nazwa_uzytkownika, haslo, "
+                           "verification_code) VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                           ('Jan', 'Kowalski', '123456789', f'{nazwa}@example.com', nazwa, 'x', '1234'))
+        db.commit()
+
+    def test_placeholders_are_translated(self):
+        with self.app.app_context():
+            self._insert_user('jan')
+            with db.get_cursor() as cursor:
+                cursor.execute("SELECT email FROM uzytkownicy WHERE nazwa_uzytkownika = %s", ('jan',))
+                self.assertEqual(cursor.fetchone(), ('jan@example.com',))
+
+    def test_unique_violation_raises_integrity_error(self):
+        with self.app.app_context():
+            self._insert_user('jan')
+            with self.assertRaises(db.IntegrityError):
+                self._insert_user('jan')
+
+    def test_memory_database_is_shared_between_threads(self):
+        with self.app.app_context():
+            self._insert_user('jan')
+
+        counts = []
+
+        def count_users():
+            with self.app.app_context():
+                with db.get_cursor() as cursor:
+                    cursor.execute("SELECT COUNT(*) FROM uzytkownicy")
+                    counts.append(cursor.fetchone()[0])
+
+        thread = threading.Thread(target=count_users)
+        thread.start()
+        thread.join()
+        self.assertEqual(counts, [1])
+
+    def test_uncommitted_work_is_rolled_back_at_teardown(self):
+        with self.app.app_context():
+            with db.get_cursor() as cursor:
+                cursor.execute("INSERT INTO uzytkownicy (imie, nazwisko, numer_telefonu, email, nazwa_uzytkownika, "
+                               "haslo, verification_code) VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                               ('Jan', 'Kowalski', '123456789', 'jan@example.com', 'jan', 'x', '1234'))
+        with self.app.app_context():
+            with db.get_cursor() as cursor:
+                cursor.execute("SELECT COUNT(*) FROM uzytkownicy")
+                self.assertEqual(cursor.fetchone()[0], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
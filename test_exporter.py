@@ -0,0 +1,64 @@
+import csv
+import gzip
+import io
+import json
+import unittest
+
+from exporter import EXPORT_COLUMNS, csv_chunks, encode_chunks, gzip_chunks, json_chunks, ndjson_chunks, plain_rows
+from testing import AppTestCase
+
+ROWS = [
+    (1, 'Władca Pierścieni', 'J.R.R. Tolkien', 'Allen & Unwin', 'Władca Pierścieni', 'Miękka', 1954, 1178, 1, 1, 2),
+    (2, 'Zawód: Pisarz', 'John Doe, Jane Smith', 'J.B. Lippincott & Co.', 'Brak', 'Twarda', 2022, 400, 2, 3, 1),
+]
+
+
+def batches():
+    yield ROWS[:1]
+    yield ROWS[1:]
+
+
+class ExporterTestCase(unittest.TestCase):
+
+    def test_csv(self):
+        chunks = list(csv_chunks(batches()))
+        self.assertEqual(len(chunks), 3)
+        rows = list(csv.reader(io.StringIO(''.join(chunks))))
+        self.assertEqual(tuple(rows[0]), EXPORT_COLUMNS)
+        self.assertEqual(rows[2][2], 'John Doe, Jane Smith')
+
+    def test_json(self):
+        books = json.loads(''.join(json_chunks(batches())))
+        self.assertEqual([book['id'] for book in books], [1, 2])
+        self.assertEqual(json.loads(''.join(json_chunks(iter([])))), [])
+
+    def test_ndjson(self):
+        lines = ''.join(ndjson_chunks(batches())).splitlines()
+        self.assertEqual(json.loads(lines[1])['tytul'], 'Zawód: Pisarz')
+
+    def test_gzip_stream(self):
+        data = b''.join(gzip_chunks(encode_chunks(ndjson_chunks(batches()))))
+        self.assertEqual(len(gzip.decompress(data).splitlines()), 2)
+
+    def test_plain_rows(self):
+        rows = [(1, 'Tom &amp; Jerry', '&quot;Iskry&quot; &lt;PL&gt;', 1954)]
+        self.assertEqual(list(plain_rows([rows])), [[(1, 'Tom & Jerry', '"Iskry" <PL>', 1954)]])
+
+
+class RoundTripTestCase(AppTestCase):
+
+    def test_export_then_import_keeps_the_text(self):
+        self.add(tytul='Tom & Jerry', wydawnictwo='"Iskry" <PL>')
+        for fmt in ('csv', 'json', 'ndjson'):
+            with self.subTest(fmt=fmt):
+                exported = self.client.get(f'/eksport/ksiazki.{fmt}').get_data()
+                response = self.client.post('/importuj_ksiazki', data={'plik': (io.BytesIO(exported), f'ksiazki.{fmt}')},
+                                            headers={'Accept': 'application/json'})
+                self.assertEqual(response.json['inserted'], 1)
+                book = self.client.get('/api/v1/ksiazki').json['items'][-1]
+                self.assertEqual((book['tytul'], book['wydawnictwo']), ('Tom & Jerry', '"Iskry" <PL>'))
+                self.client.delete(f"/api/v1/ksiazki/{book['id']}")
+
+
+if __name__ == '__main__':
+    unittest.main()
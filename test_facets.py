@@ -0,0 +1,133 @@
+import unittest
+from unittest import mock
+
+from facets import FacetIndex, build_counts_query, page_ids, selected_facets
+from testing import AppTestCase
+
+
+class PageIdsTestCase(unittest.TestCase):
+
+    ids = [2, 3, 5, 7, 11, 13, 17]
+
+    def test_forward(self):
+        self.assertEqual(page_ids(self.ids, limit=3), ([2, 3, 5], None, 5))
+        self.assertEqual(page_ids(self.ids, after=5, limit=3), ([7, 11, 13], 7, 13))
+        self.assertEqual(page_ids(self.ids, after=13, limit=3), ([17], 17, None))
+
+    def test_backward(self):
+        self.assertEqual(page_ids(self.ids, before=17, limit=3), ([7, 11, 13], 7, 13))
+        self.assertEqual(page_ids(self.ids, before=7, limit=3), ([2, 3, 5], None, 5))
+
+    def test_selected_facets(self):
+        self.assertEqual(selected_facets({'autor': ' Lem ', 'dekada': '1990', 'seria': ''}),
+                         {'autor': 'Lem', 'dekada': 1990})
+        self.assertEqual(selected_facets({'dekada': 'lata 90.'}), {})
+
+
+class CountsQueryTestCase(unittest.TestCase):
+
+    def test_groups_without_ranking_or_limit(self):
+        query, values = build_counts_query({'tytul': 'lalka'}, facets={'dekada': 1890})
+        self.assertEqual(query.count('GROUP BY'), 5)
+        self.assertNotIn('ORDER BY', query)
+        self.assertNotIn('LIMIT', query)
+        self.assertEqual(values, ['+lalka', 1890, 1899] * 5)
+
+
+class FacetsTestCase(AppTestCase):
+
+    def counts(self, **selected):
+        response = self.client.get('/api/v1/fasety', query_string=selected)
+        self.assertEqual(response.status_code, 200)
+        return {field: [(item['wartosc'], item['liczba']) for item in items]
+                for field, items in response.json.items() if field != 'wybrane'}
+
+    def test_counts_follow_writes_without_reloading(self):
+        first = self.add()
+        self.counts()
+
+        with mock.patch.object(FacetIndex, '_load') as load:
+            self.add(tytul='Faraon', rok_wydania='1897', oprawa='Miękka')
+            self.add(autor='Stanisław Lem', seria='Fantastyka', rok_wydania='1961')
+            counts = self.counts()
+            self.assertEqual(counts['autor'], [('Bolesław Prus', 2), ('Stanisław Lem', 1)])
+            self.assertEqual(counts['dekada'], [(1890, 2), (1960, 1)])
+
+            self.client.patch(f'/api/v1/ksiazki/{first}', json={'oprawa': 'Miękka'})
+            self.assertEqual(self.counts()['oprawa'], [('Miękka', 2), ('Twarda', 1)])
+
+            self.client.delete(f'/api/v1/ksiazki/{first}')
+            self.assertEqual(self.counts()['autor'], [('Bolesław Prus', 1), ('Stanisław Lem', 1)])
+        load.assert_not_called()
+
+    def test_counts_within_selection(self):
+        self.add()
+        self.add(tytul='Faraon', oprawa='Miękka', rok_wydania='1897')
+        self.add(autor='Stanisław Lem', seria='Fantastyka', rok_wydania='1961')
+
+        counts = self.counts(autor='Bolesław Prus', dekada='1890')
+        self.assertEqual(counts['oprawa'], [('Miękka', 1), ('Twarda', 1)])
+        self.assertEqual(counts['seria'], [('Klasyka', 2)])
+        self.assertEqual(self.counts(autor='Nikt')['autor'], [])
+
+    def test_catalog_page_is_narrowed_by_facets(self):
+        for year in ('1890', '1961', '1995', '1891'):
+            self.add(tytul=f'Wydanie {year}', rok_wydania=year)
+
+        response = self.client.get('/strona_glowna?dekada=1890&limit=1')
+        self.assertEqual(response.status_code, 200)
+        page = response.get_data(as_text=True)
+        self.assertIn('Wydanie 1890', page)
+        self.assertNotIn('Wydanie 1891', page)
+        self.assertIn('dekada=1890', page)
+        self.assertIn('1890–1899', page)
+
+        response = self.client.get('/strona_glowna?dekada=1890&limit=1&after=1')
+        self.assertIn('Wydanie 1891', response.get_data(as_text=True))
+        self.assertNotIn('Wydanie 1961', response.get_data(as_text=True))
+
+    def test_search_results_show_counts(self):
+        self.add()
+        self.add(autor='Stanisław Lem')
+        response = self.client.post('/wyszukaj_ksiazke', data={'tytul': 'Lalka'})
+        page = response.get_data(as_text=True)
+        self.assertIn('Stanisław Lem</a>', page)
+        # the facet links narrow the search, keeping its criteria
+        self.assertIn('/wyszukaj_ksiazke?tytul=Lalka&amp;faseta_autor=Stanis', page)
+        self.assertNotIn('/strona_glowna?autor=', page)
+
+    def test_search_narrowed_by_facets(self):
+        self.add(tytul='Lalka', rok_wydania='1890')
+        self.add(tytul='Lalka', autor='Stanisław Lem', rok_wydania='1961')
+        self.add(tytul='Lalka', autor='Stanisław Lem', rok_wydania='1995', oprawa='Miękka')
+        self.add(tytul='Faraon', autor='Stanisław Lem', rok_wydania='1962')
+
+        response = self.client.get('/wyszukaj_ksiazke', query_string={'tytul': 'Lalka', 'faseta_autor': 'Stanisław Lem',
+                                                                      'faseta_dekada': '1990'})
+        self.assertEqual(response.status_code, 200)
+        page = response.get_data(as_text=True)
+        self.assertIn('Miękka', page)
+        self.assertNotIn('1961', page)
+        self.assertNotIn('Faraon', page)
+        # the form is filled in again and the export keeps the narrowing
+        self.assertIn('value="Lalka"', page)
+        self.assertIn('/eksport/ksiazki.csv?tytul=Lalka&amp;faseta_autor=', page)
+        # dropping a facet keeps the search and the other facet
+        self.assertIn('/wyszukaj_ksiazke?tytul=Lalka&amp;faseta_autor=Stanis%C5%82aw+Lem"', page)
+
+        export = self.client.get('/eksport/ksiazki.ndjson', query_string={'tytul': 'Lalka', 'faseta_dekada': '1960'})
+        self.assertEqual(export.get_data(as_text=True).count('\n'), 1)
+
+    def test_search_counts_every_result(self):
+        self.app.config['SEARCH_MAX_RESULTS'] = 2
+        for number in range(5):
+            self.add(tytul=f'Lalka {number}', oprawa='Miękka' if number % 2 else 'Twarda')
+
+        page = self.client.post('/wyszukaj_ksiazke', data={'tytul': 'Lalka'}).get_data(as_text=True)
+        self.assertIn('Lalka 1', page)
+        self.assertNotIn('Lalka 2', page)
+        self.assertIn('Bolesław Prus</a>\n            <span class="text-muted">(5)</span>', page)
+        self.assertIn('Twarda</a>\n            <span class="text-muted">(3)</span>', page)
+
+if __name__ == '__main__':
+    unittest.main()
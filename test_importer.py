@@ -0,0 +1,72 @@
+import io
+import unittest
+from unittest import mock
+
+from flask import Flask
+
+import db
+from importer import import_books, iter_csv, iter_json
+
+CSV = """tytul,autor,wydawnictwo,seria,oprawa,rok_wydania,ilosc_stron,rzad,regal,polka
+Lalka,Bolesław Prus,Gebethner i Wolff,Brak,Twarda,1890,680,1,2,3
+Zły wiersz,Autor 123,Wydawnictwo,Brak,Twarda,1890,680,1,2,3
+Pan Tadeusz,Adam Mickiewicz,Aleksander Jełowicki,Brak,Miękka,1834,340,2,1,1
+"""
+
+
+class ImporterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['DB_POOL_NAME'] = 'test_import'
+        db.init_app(self.app)
+        self.conn = mock.Mock()
+        self.cursor = self.conn.cursor.return_value
+        # the change counter read by reserve_changes
+        self.cursor.fetchone.return_value = (10,)
+        pool = mock.Mock()
+        pool.get_connection.return_value = self.conn
+        db._pools['test_import'] = pool
+
+    def tearDown(self):
+        db._pools.pop('test_import', None)
+
+    def test_iter_json_array_and_ndjson(self):
+        self.assertEqual(list(iter_json(io.StringIO('[{"a": 1}, {"b": "]"}]'))), [{'a': 1}, {'b': ']'}])
+        self.assertEqual(list(iter_json(io.StringIO('{"a": 1}\n{"b": 2}\n'))), [{'a': 1}, {'b': 2}])
+
+    def test_valid_rows_are_inserted_in_batches(self):
+        with self.app.app_context():
+            report = import_books(iter_csv(io.StringIO(CSV)), batch_size=1)
+
+        self.assertEqual(report.read, 3)
+        self.assertEqual(report.inserted, 2)
+        self.assertEqual(report.rejected, 1)
+        self.assertEqual(report.errors[0][0], 2)
+        self.assertEqual(self.cursor.executemany.call_count, 2)
+        # every row is written with the change number reserved for it
+        self.assertEqual(self.cursor.executemany.call_args[0][1][0][-2], 10)
+        self.assertEqual(self.conn.commit.call_count, 2)
+
+    def test_failed_batch_is_retried_row_by_row(self):
+        self.cursor.executemany.side_effect = db.Error("Duplicate entry")
+        # two statements reserve change numbers before the batch and again before the retry
+        self.cursor.execute.side_effect = [None, None, None, None, None, db.Error("Duplicate entry")]
+
+        with self.app.app_context():
+            report = import_books(iter_csv(io.StringIO(CSV)))
+
+        self.conn.rollback.assert_called_once()
+        self.assertEqual(report.inserted, 1)
+        self.assertEqual([row for row, errors in report.errors], [2, 3])
+
+    def test_malformed_file_keeps_imported_rows(self):
+        with self.app.app_context():
+            report = import_books(iter_json(io.StringIO('[{"tytul": "x"}, {"tytul": ')))
+
+        self.assertEqual(report.read, 1)
+        self.assertIsNotNone(report.fatal_error)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import threading
+import unittest
+from unittest import mock
+
+import db
+from app import create_app
+from lifecycle import check_workers
+
+
+class LifecycleTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app({'DB_BACKEND': 'sqlite', 'DB_PATH': ':memory:',
+                               'SESSION_BACKEND': 'memory', 'MAIL_TRANSPORT': 'memory'})
+        self.lifecycle = self.app.extensions['lifecycle']
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        self.lifecycle.shutdown(timeout=1)
+
+    def test_liveness(self):
+        response = self.client.get('/healthz')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, {'status': 'ok'})
+
+    def test_ready_when_database_answers(self):
+        self.assertEqual(self.client.get('/readyz').status_code, 200)
+
+    def test_not_ready_without_database(self):
+        with mock.patch.object(db.backend(self.app), 'connect', side_effect=db.Error('brak połączenia')), \
+                self.assertLogs('lifecycle', 'ERROR'):
+            response = self.client.get('/readyz')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json['status'], 'error')
+
+    def test_not_ready_while_draining(self):
+        self.lifecycle.drain()
+        response = self.client.get('/readyz')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json['status'], 'draining')
+        self.assertEqual(self.client.get('/healthz').status_code, 200)
+
+    def test_drain_waits_for_in_flight_requests(self):
+        entered = threading.Event()
+        release = threading.Event()
+
+        @self.app.route('/wolne')
+        def slow():
+            entered.set()
+            release.wait(5)
+            return 'ok'
+
+        thread = threading.Thread(target=self.client.get, args=('/wolne',))
+        thread.start()
+        entered.wait(5)
+        self.assertEqual(self.lifecycle.in_flight, 1)
+        self.assertFalse(self.lifecycle.drain(timeout=0.05))
+
+        release.set()
+        self.assertTrue(self.lifecycle.drain(timeout=5))
+        thread.join()
+        self.assertEqual(self.lifecycle.in_flight, 0)
+
+    def test_sqlite_reconnects_after_fork(self):
+        backend = db.backend(self.app)
+        conn = backend.connect(self.app.config)
+        self.assertIs(backend.connect(self.app.config), conn)
+        # what a forked worker sees: a connection opened by another process
+        backend._local.pid = -1
+        self.assertIsNot(backend.connect(self.app.config), conn)
+        conn.close()
+
+    def test_several_workers_need_shared_state(self):
+        check_workers(self.app, 1)
+        with self.assertRaisesRegex(RuntimeError, "CACHE_BACKEND = 'memory'.*SESSION_BACKEND = 'memory'"):
+            check_workers(self.app, 4)
+
+        self.app.config.update(CACHE_BACKEND='redis', SESSION_BACKEND='file', THROTTLE_ENABLED=False)
+        check_workers(self.app, 4)
+        self.app.config['THROTTLE_ENABLED'] = True
+        with self.assertRaisesRegex(RuntimeError, "THROTTLE_BACKEND = 'memory'"):
+            check_workers(self.app, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import tempfile
+import time
+import unittest
+
+from flask import Flask
+from flask_mail import Mail
+
+from mailer import MailDispatcher, MailQueue, MemorySink
+from testing import sqlite_app
+
+
+class MailDispatcherTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.app = Flask(__name__)
+        self.app.config['MAIL_DEFAULT_SENDER'] = 'biblioteka@example.com'
+        Mail(self.app)
+        self.queue = MailQueue(os.path.join(self.tmp.name, 'queue.sqlite3'))
+        self.sink = MemorySink()
+        self.dispatcher = MailDispatcher(self.app, self.queue, self.sink, batch_size=10, retry_delay=0)
+
+    def tearDown(self):
+        self.dispatcher.stop(timeout=1)
+        self.tmp.cleanup()
+
+    def test_batch_reuses_one_connection(self):
+        for i in range(3):
+            self.queue.enqueue('Kod weryfikacyjny', [f'user{i}@example.com'], 'Kod: 1234')
+
+        self.assertEqual(self.dispatcher.flush(), 3)
+        self.assertEqual(self.sink.connections, 1)
+        self.assertEqual([m.recipients for m in self.sink.outbox],
+                         [['user0@example.com'], ['user1@example.com'], ['user2@example.com']])
+        self.assertEqual(self.queue.counts(), {})
+
+    def test_failed_send_is_retried(self):
+        self.queue.enqueue('Kod weryfikacyjny', ['user@example.com'], 'Kod: 1234')
+        self.sink.fail_next = 1
+
+        self.assertEqual(self.dispatcher.dispatch_batch(), 0)
+        self.assertEqual(self.queue.counts(), {'pending': 1})
+
+        self.assertEqual(self.dispatcher.flush(), 1)
+        self.assertEqual(len(self.sink.outbox), 1)
+
+    def test_gives_up_after_max_attempts(self):
+        self.dispatcher.max_attempts = 1
+        self.queue.enqueue('Kod weryfikacyjny', ['user@example.com'], 'Kod: 1234')
+        self.sink.fail_next = 1
+
+        self.dispatcher.flush()
+        self.assertEqual(self.queue.counts(), {'failed': 1})
+
+    def test_background_worker_delivers(self):
+        self.dispatcher.send('Kod weryfikacyjny', ['user@example.com'], 'Kod: 1234')
+        for _ in range(100):
+            if self.sink.outbox:
+                break
+            time.sleep(0.01)
+        self.assertEqual(len(self.sink.outbox), 1)
+
+    def test_first_request_delivers_mail_left_by_another_process(self):
+        path = os.path.join(self.tmp.name, 'app_queue.sqlite3')
+        MailQueue(path).enqueue('Kod weryfikacyjny', ['user@example.com'], 'Kod: 1234')
+        app = sqlite_app({'MAIL_QUEUE_PATH': path, 'MAIL_DEFAULT_SENDER': 'biblioteka@example.com'})
+        try:
+            sink = app.extensions['mail_dispatcher'].transport
+            app.test_client().get('/healthz')
+            for _ in range(100):
+                if sink.outbox:
+                    break
+                time.sleep(0.01)
+            self.assertEqual(len(sink.outbox), 1)
+        finally:
+            app.extensions['lifecycle'].shutdown()
+
+    def test_stopped_dispatcher_is_not_restarted(self):
+        self.dispatcher.stop()
+        self.dispatcher.send('Kod weryfikacyjny', ['user@example.com'], 'Kod: 1234')
+        self.assertIsNone(self.dispatcher._thread)
+        self.assertEqual(self.queue.counts(), {'pending': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
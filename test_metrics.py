@@ -0,0 +1,82 @@
+import unittest
+from unittest import mock
+
+import metrics
+from testing import sqlite_app
+
+
+class RegistryTestCase(unittest.TestCase):
+
+    def test_render(self):
+        registry = metrics.Registry()
+        requests = registry.counter('x_requests_total', 'Żądania.', ('endpoint',))
+        duration = registry.histogram('x_duration_seconds', 'Czas.', buckets=(0.1, 1))
+        requests.inc('strona_glowna')
+        requests.inc('strona_glowna')
+        duration.observe(0.05)
+        duration.observe(0.5)
+
+        text = registry.render()
+        self.assertIn('# TYPE x_requests_total counter\n', text)
+        self.assertIn('x_requests_total{endpoint="strona_glowna"} 2\n', text)
+        self.assertIn('x_duration_seconds_bucket{le="0.1"} 1\n', text)
+        self.assertIn('x_duration_seconds_bucket{le="+Inf"} 2\n', text)
+        self.assertIn('x_duration_seconds_count 2\n', text)
+
+    def test_statement_labels(self):
+        self.assertEqual(metrics.statement_labels("SELECT id FROM ksiazki WHERE id = %s"), ('SELECT', 'ksiazki'))
+        self.assertEqual(metrics.statement_labels("UPDATE uzytkownicy SET haslo = %s"), ('UPDATE', 'uzytkownicy'))
+        self.assertEqual(metrics.statement_labels("INSERT INTO ksiazki (tytul) VALUES (%s)"), ('INSERT', 'ksiazki'))
+
+
+class InstrumentedCursorTestCase(unittest.TestCase):
+
+    def test_rows_and_slow_query_log(self):
+        raw = mock.Mock()
+        raw.fetchall.return_value = [(1,), (2,)]
+        cursor = metrics.InstrumentedCursor(raw, slow_query_seconds=0)
+        rows_before = metrics.QUERY_ROWS.value('SELECT', 'test_tabela')
+        queries_before = metrics.QUERY_DURATION.count('SELECT', 'test_tabela')
+
+        with self.assertLogs('biblioteka.sql', 'WARNING') as logs:
+            cursor.execute("SELECT id FROM test_tabela WHERE id > %s", ('tajne@example.com', 7, None))
+        self.assertEqual(cursor.fetchall(), [(1,), (2,)])
+
+        raw.execute.assert_called_once_with("SELECT id FROM test_tabela WHERE id > %s", ('tajne@example.com', 7, None))
+        self.assertIn("SELECT id FROM test_tabela WHERE id > %s; parametry: (<str:17>, 7, None)", logs.output[0])
+        self.assertEqual(metrics.QUERY_ROWS.value('SELECT', 'test_tabela') - rows_before, 2)
+        self.assertEqual(metrics.QUERY_DURATION.count('SELECT', 'test_tabela') - queries_before, 1)
+
+
+class MetricsViewTestCase(unittest.TestCase):
+
+    def app(self, config=None):
+        app = sqlite_app(config)
+        self.addCleanup(app.extensions['lifecycle'].shutdown)
+        return app
+
+    def test_allowed_addresses_or_token(self):
+        local = self.app().test_client()
+        response = local.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('# TYPE biblioteka_http_requests_total counter', response.get_data(as_text=True))
+
+        remote = self.app().test_client()
+        remote.environ_base['REMOTE_ADDR'] = '10.0.0.5'
+        self.assertEqual(remote.get('/metrics').status_code, 403)
+
+        remote = self.app({'METRICS_TOKEN': 'sekret'}).test_client()
+        remote.environ_base['REMOTE_ADDR'] = '10.0.0.5'
+        self.assertEqual(remote.get('/metrics').status_code, 403)
+        self.assertEqual(remote.get('/metrics', headers={'Authorization': 'Bearer inny'}).status_code, 403)
+        self.assertEqual(remote.get('/metrics', headers={'Authorization': 'Bearer sekret'}).status_code, 200)
+
+    def test_collectors_belong_to_their_app(self):
+        apps = [self.app() for _ in range(3)]
+        text = apps[-1].test_client().get('/metrics').get_data(as_text=True)
+        self.assertEqual(text.count('# TYPE biblioteka_catalog_cache_hits_total counter'), 1)
+        self.assertEqual(text.count('# TYPE biblioteka_mail_queue_messages gauge'), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
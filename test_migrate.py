@@ -0,0 +1,73 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import migrate
+
+
+class FakeConnection:
+
+    def __init__(self, applied=()):
+        self.applied = set(applied)
+        self.executed = []
+        self.cursor_obj = mock.Mock()
+        self.cursor_obj.execute.side_effect = self._execute
+        self.cursor_obj.fetchall.side_effect = lambda: [(version,) for version in sorted(self.applied)]
+
+    def _execute(self, statement, values=None):
+        self.executed.append(statement)
+        if statement.startswith("INSERT INTO schema_migrations"):
+            self.applied.add(values[0])
+        elif statement.startswith("DELETE FROM schema_migrations"):
+            self.applied.discard(values[0])
+
+    def cursor(self):
+        return self.cursor_obj
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class MigrateTestCase(unittest.TestCase):
+
+    def test_migrations_have_up_and_down_scripts(self):
+        migrations = migrate.available_migrations()
+        self.assertEqual([m.version for m in migrations], sorted(m.version for m in migrations))
+        for migration in migrations:
+            self.assertTrue(migration.statements('up'))
+            self.assertTrue(migration.statements('down'))
+
+    def test_upgrade_skips_applied_and_downgrade_reverts(self):
+        conn = FakeConnection(applied={'0001'})
+        done = migrate.upgrade(conn)
+        self.assertNotIn('0001', [m.version for m in done])
+        self.assertIn('0002', conn.applied)
+        self.assertTrue(any('ux_uzytkownicy_nazwa_uzytkownika' in s for s in conn.executed))
+
+        migrate.downgrade(conn, '0000')
+        self.assertEqual(conn.applied, set())
+
+    def test_command_line_creates_and_reports_the_schema(self):
+        with tempfile.TemporaryDirectory() as directory:
+            environ = {'DB_BACKEND': 'sqlite', 'DB_PATH': os.path.join(directory, 'biblioteka.db'),
+                       'SESSION_BACKEND': 'memory', 'MAIL_TRANSPORT': 'memory'}
+            output = io.StringIO()
+            with mock.patch.dict(os.environ, environ), contextlib.redirect_stdout(output):
+                migrate.main(['status'])
+                migrate.main(['up'])
+                migrate.main(['status'])
+            lines = output.getvalue().splitlines()
+            versions = [m.version for m in migrate.available_migrations('sqlite')]
+            self.assertEqual(len(lines), 3 * len(versions))
+            self.assertTrue(all(line.endswith('oczekuje') for line in lines[:len(versions)]))
+            self.assertTrue(all(line.endswith('zastosowana') for line in lines[-len(versions):]))
+
+
+if __name__ == '__main__':
+    unittest.main()
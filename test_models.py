@@ -0,0 +1,42 @@
+import pickle
+import unittest
+
+from cache import LocalRedis, SharedCache
+from models import BOOK_COLUMNS, Book, User
+
+ROW = (1, 'Władca Pierścieni', 'J.R.R. Tolkien', 'Allen & Unwin', 'Władca Pierścieni', 'Miękka', 1954, 1178, 1, 1, 2, 1, 1700000000)
+
+
+class ModelsTestCase(unittest.TestCase):
+
+    def test_from_row(self):
+        book = Book.from_row(ROW)
+        self.assertEqual(book.tytul, 'Władca Pierścieni')
+        self.assertEqual(book.polka, 2)
+        self.assertEqual(tuple(book.to_dict().values()), ROW)
+        self.assertIsNone(Book.from_row(None))
+
+    def test_projection(self):
+        user = User.from_row((3, 'hash', '1234'), ('id', 'haslo', 'verification_code'))
+        self.assertEqual(user.haslo, 'hash')
+        self.assertIsNone(user.email)
+
+    def test_slots(self):
+        book = Book.from_row(ROW)
+        self.assertFalse(hasattr(book, '__dict__'))
+        with self.assertRaises(AttributeError):
+            book.opis = 'x'
+
+    def test_pickle_and_shared_cache(self):
+        book = Book.from_row(ROW)
+        self.assertEqual(pickle.loads(pickle.dumps(book)), book)
+
+        cache = SharedCache(LocalRedis())
+        cache.set('ksiazka:1', book)
+        self.assertEqual(cache.get('ksiazka:1').to_dict(BOOK_COLUMNS[:2]), {'id': 1, 'tytul': 'Władca Pierścieni'})
+        cache.incr('generacja')
+        self.assertEqual(cache.counter('generacja'), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
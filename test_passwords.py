@@ -0,0 +1,53 @@
+import hashlib
+import os
+import unittest
+from unittest import mock
+
+from passwords import PasswordHasher, pool_size
+
+
+class PasswordHasherTestCase(unittest.TestCase):
+
+    def test_hash_and_verify_inline(self):
+        hasher = PasswordHasher(iterations=1000, workers=0)
+        stored = hasher.hash("Passw0rd")
+        self.assertTrue(stored.startswith("pbkdf2_sha256$1000$"))
+        self.assertTrue(hasher.verify("Passw0rd", stored))
+        self.assertFalse(hasher.verify("Passw0rd1", stored))
+        self.assertFalse(hasher.needs_rehash(stored))
+
+    def test_hash_in_process_pool(self):
+        hasher = PasswordHasher(iterations=1000, workers=1)
+        try:
+            self.assertTrue(hasher.verify("Passw0rd", hasher.hash("Passw0rd")))
+            # not forked from a worker whose other threads may hold locks
+            self.assertEqual(hasher._get_executor()._mp_context.get_start_method(), 'forkserver')
+        finally:
+            hasher.shutdown()
+
+    def test_legacy_hash_is_verified_and_rehashed(self):
+        salt = os.urandom(32)
+        legacy = (salt + hashlib.pbkdf2_hmac("sha256", b"Passw0rd", salt, 10000)).hex()
+        hasher = PasswordHasher(iterations=1000, workers=0)
+        self.assertTrue(hasher.verify("Passw0rd", legacy))
+        self.assertTrue(hasher.needs_rehash(legacy))
+
+    def test_changed_iterations_need_rehash(self):
+        stored = PasswordHasher(iterations=1000, workers=0).hash("Passw0rd")
+        self.assertTrue(PasswordHasher(iterations=2000, workers=0).needs_rehash(stored))
+
+    def test_pool_size_shares_the_cpus_between_web_workers(self):
+        with mock.patch('os.cpu_count', return_value=8):
+            self.assertEqual(pool_size(1), 8)
+            self.assertEqual(pool_size(4), 2)
+            self.assertEqual(pool_size(17), 1)
+
+        hasher = PasswordHasher(iterations=1000, workers=8)
+        hasher.resize(2)
+        self.assertEqual(hasher.workers, 2)
+        self.assertTrue(hasher.verify("Passw0rd", hasher.hash("Passw0rd")))
+        hasher.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+
+from search import build_search_query, split_range
+from testing import AppTestCase
+
+
+class SearchTestCase(unittest.TestCase):
+
+    def test_split_range(self):
+        self.assertEqual(split_range("1990-1999"), ("1990", "1999"))
+        self.assertEqual(split_range("1990-"), ("1990", ""))
+        self.assertEqual(split_range("1990"), ("1990", "1990"))
+
+    def test_empty_criteria_lists_whole_catalog(self):
+        query, values = build_search_query({})
+        self.assertEqual(query, "SELECT * FROM ksiazki ORDER BY id")
+        self.assertEqual(values, [])
+
+    def test_text_fields_use_fulltext_and_relevance_order(self):
+        query, values = build_search_query({'tytul': 'Harry (Potter)'})
+        self.assertIn("WHERE MATCH(tytul) AGAINST (%s IN BOOLEAN MODE)", query)
+        self.assertIn("ORDER BY (MATCH(tytul) AGAINST (%s IN BOOLEAN MODE)) DESC", query)
+        self.assertEqual(values, ['+Harry +Potter', '+Harry +Potter'])
+
+    def test_short_terms_match_the_start_of_a_word(self):
+        query, values = build_search_query({'autor': 'K'})
+        self.assertIn("(autor LIKE %s OR autor LIKE %s)", query)
+        self.assertEqual(values, ['K%', '% K%'])
+
+    def test_binding_ignores_case(self):
+        self.assertIn("WHERE oprawa = %s", build_search_query({'oprawa': 'twarda'})[0])
+        query, values = build_search_query({'oprawa': 'twarda'}, dialect='sqlite')
+        self.assertIn("WHERE LOWER(oprawa) = LOWER(%s)", query)
+        self.assertEqual(values, ['twarda'])
+
+    def test_numbers_are_exact_not_like(self):
+        query, values = build_search_query({'polka': '1', 'rok_wydania': '1990-1999'}, limit=10)
+        self.assertIn("rok_wydania >= %s AND rok_wydania <= %s AND polka = %s", query)
+        self.assertNotIn("LIKE", query)
+        self.assertEqual(values, [1990, 1999, 1, 10])
+
+    def test_sqlite_matches_every_term_with_like(self):
+        query, values = build_search_query({'tytul': 'Harry (Potter)'}, dialect='sqlite')
+        self.assertIn("WHERE tytul LIKE %s AND tytul LIKE %s ORDER BY id", query)
+        self.assertNotIn("MATCH", query)
+        self.assertEqual(values, ['%Harry%', '%Potter%'])
+
+
+
+class SearchOnSQLiteTestCase(AppTestCase):
+
+    def found(self, **criteria):
+        response = self.client.get('/api/v1/ksiazki/szukaj', query_string={**criteria, 'fields': 'tytul'})
+        self.assertEqual(response.status_code, 200)
+        return [item['tytul'] for item in response.json['items']]
+
+    def test_binding_ignores_case(self):
+        self.add(tytul='Lalka', oprawa='Twarda')
+        self.add(tytul='Kordian', oprawa='Miękka')
+        self.assertEqual(self.found(oprawa='twarda'), ['Lalka'])
+        self.assertEqual(self.found(oprawa='TWARDA'), ['Lalka'])
+
+
+if __name__ == '__main__':
+    unittest.main()
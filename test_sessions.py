@@ -0,0 +1,101 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from flask import Flask, session
+
+import auth
+import sessions
+from cache import LocalRedis
+
+
+class StoreTestCase(unittest.TestCase):
+
+    def check_store(self, store):
+        store.save('a', {'logged_in': True}, ttl=60)
+        self.assertEqual(store.load('a'), {'logged_in': True})
+        store.delete('a')
+        self.assertIsNone(store.load('a'))
+
+        store.save('b', {'x': 1}, ttl=0.01)
+        time.sleep(0.02)
+        store.sweep()
+        self.assertIsNone(store.load('b'))
+
+    def test_memory(self):
+        self.check_store(sessions.MemorySessionStore())
+
+    def test_local_shared(self):
+        self.check_store(sessions.SharedSessionStore(LocalRedis()))
+
+    def test_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = sessions.FileSessionStore(directory)
+            self.check_store(store)
+            store.save('c', {'x': 1}, ttl=-1)
+            self.assertEqual(store.sweep(), 1)
+            self.assertEqual(os.listdir(directory), [])
+
+
+class SessionInterfaceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['SESSION_BACKEND'] = 'memory'
+        self.store = sessions.init_app(self.app)
+
+        @self.app.route('/zaloguj/<name>')
+        def login_as(name):
+            auth.login_user(1, name)
+            return 'ok'
+
+        @self.app.route('/login', endpoint='strony.login')
+        def login_form():
+            return 'login'
+
+        @self.app.route('/profil')
+        @auth.login_required
+        def profil():
+            auth.current_user()
+            return auth.current_user().nazwa_uzytkownika
+
+        self.client = self.app.test_client()
+
+    def test_login_required(self):
+        response = self.client.get('/profil')
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.location.endswith('/login'))
+
+    def test_cookie_carries_only_the_id(self):
+        self.client.get('/zaloguj/jan')
+        cookie = self.client.get_cookie('session')
+        self.assertRegex(cookie.value, sessions.SID_PATTERN)
+        self.assertEqual(self.store.load(cookie.value)['nazwa_uzytkownika'], 'jan')
+
+    def test_login_regenerates_id(self):
+        with self.client.session_transaction() as sess:
+            sess['verification_code'] = '1234'
+        old_sid = self.client.get_cookie('session').value
+
+        self.client.get('/zaloguj/jan')
+        self.assertNotEqual(self.client.get_cookie('session').value, old_sid)
+        self.assertIsNone(self.store.load(old_sid))
+
+    def test_current_user_loaded_once_per_request(self):
+        self.client.get('/zaloguj/jan')
+        user = mock.Mock(nazwa_uzytkownika='jan')
+        with mock.patch.object(auth, 'find_user', return_value=user) as find_user, \
+                mock.patch.object(self.store, 'save') as save:
+            self.assertEqual(self.client.get('/profil').data, b'jan')
+        find_user.assert_called_once()
+        save.assert_not_called()
+
+    def test_forged_id_is_ignored(self):
+        self.client.set_cookie('session', '../../etc/passwd')
+        self.assertEqual(self.client.get('/profil').status_code, 302)
+
+
+if __name__ == '__main__':
+    unittest.main()
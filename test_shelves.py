@@ -0,0 +1,73 @@
+import unittest
+from unittest import mock
+
+import db
+from shelves import OccupancyMap, build_location_query
+from testing import AppTestCase
+
+
+class LocationQueryTestCase(unittest.TestCase):
+
+    def test_exact_location_uses_equality(self):
+        query, values = build_location_query({'rzad': '1', 'regal': '2', 'polka': '1'})
+        self.assertIn("WHERE rzad = %s AND regal = %s AND polka = %s ORDER BY rzad, regal, polka, id", query)
+        self.assertEqual(values, [1, 2, 1])
+
+    def test_ranges(self):
+        query, values = build_location_query({'rzad': '1', 'regal': '2-4', 'polka': '3-'}, limit=10)
+        self.assertIn("rzad = %s AND regal >= %s AND regal <= %s AND polka >= %s", query)
+        self.assertNotIn("LIKE", query)
+        self.assertEqual(values, [1, 2, 4, 3, 10])
+
+
+class ShelvesTestCase(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.occupancy = self.app.extensions['occupancy']
+
+    def counts(self, query=''):
+        return {(item['rzad'], item['regal'], item['polka']): item['liczba']
+                for item in self.client.get('/api/v1/lokalizacje' + query).json['items']}
+
+    def test_shelf_one_does_not_match_shelf_eleven(self):
+        self.add(polka='1')
+        self.add(polka='11')
+        response = self.client.get('/api/v1/lokalizacje/1/2/1?fields=polka')
+        self.assertEqual([item['polka'] for item in response.json['items']], [1])
+
+    def test_aisle_with_range(self):
+        for regal in ('1', '2', '3', '4'):
+            self.add(regal=regal)
+        response = self.client.get('/api/v1/lokalizacje/1?regal=2-3&fields=regal')
+        self.assertEqual([item['regal'] for item in response.json['items']], [2, 3])
+        self.assertFalse(response.json['truncated'])
+        self.assertEqual(self.client.get('/api/v1/lokalizacje/1?regal=x').status_code, 422)
+
+    def test_occupancy_follows_writes_without_reloading(self):
+        first = self.add()
+        self.add()
+        self.assertEqual(self.counts(), {(1, 2, 3): 2})
+
+        with mock.patch.object(OccupancyMap, '_load') as load:
+            self.add(polka='4')
+            self.client.patch(f'/api/v1/ksiazki/{first}', json={'rzad': '5'})
+            self.assertEqual(self.counts(), {(1, 2, 3): 1, (1, 2, 4): 1, (5, 2, 3): 1})
+            self.client.delete(f'/api/v1/ksiazki/{first}')
+            self.assertEqual(self.counts('?rzad=1&polka=4'), {(1, 2, 4): 1})
+            self.assertEqual(self.occupancy.location(first), None)
+        load.assert_not_called()
+
+    def test_bulk_change_reloads(self):
+        self.add()
+        self.assertEqual(self.counts(), {(1, 2, 3): 1})
+        with self.app.app_context():
+            with db.get_cursor() as cursor:
+                cursor.execute("UPDATE ksiazki SET polka = 9")
+            db.commit()
+            self.app.extensions['catalog_cache'].invalidate()
+        self.assertEqual(self.counts(), {(1, 2, 9): 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
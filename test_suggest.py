@@ -0,0 +1,121 @@
+import time
+import unittest
+from unittest import mock
+
+import books
+import db
+from suggest import PrefixIndex, Suggestions, fold
+from testing import BOOK, AppTestCase
+
+
+class PrefixIndexTestCase(unittest.TestCase):
+
+    def test_fold(self):
+        self.assertEqual(fold('  Żółw   ŁUKASZ '), 'zolw lukasz')
+        self.assertEqual(fold('Gößling'), 'gossling')
+
+    def test_matches_value_and_word_prefixes_without_diacritics(self):
+        index = PrefixIndex(['Bolesław Prus', 'Bolesław Leśmian', 'Stanisław Lem', 'Bolesław Prus'])
+        self.assertEqual(index.complete('bol'), [('Bolesław Prus', 2), ('Bolesław Leśmian', 1)])
+        self.assertEqual(index.complete('boleslaw p'), [('Bolesław Prus', 2)])
+        self.assertEqual(index.complete('LES'), [('Bolesław Leśmian', 1)])
+        self.assertEqual(index.complete('le', limit=1), [('Bolesław Leśmian', 1)])
+        self.assertEqual(index.complete('  '), [])
+
+    def test_add_and_remove_count_books(self):
+        index = PrefixIndex(['Lem'])
+        index.add('Lem')
+        index.remove('Lem')
+        self.assertEqual(index.complete('lem'), [('Lem', 1)])
+        index.remove('Lem')
+        self.assertEqual(index.complete('lem'), [])
+        self.assertEqual(len(index), 0)
+
+    def test_most_common_values_first(self):
+        values = [f'Autor {number:04d}' for number in range(2000)] + ['Autor 1500'] * 3 + ['Autor 0999'] * 2
+        built = PrefixIndex(values)
+        updated = PrefixIndex(values[:1000])
+        for value in values[1000:] + ['Autor 0005']:
+            updated.add(value)
+        updated.remove('Autor 0005')
+        for index in (built, updated):
+            # 'a' and 'autor 1' match more entries than SCAN_LIMIT and are answered from the ranking
+            self.assertEqual(index.complete('a', 3), [('Autor 1500', 4), ('Autor 0999', 3), ('Autor 0000', 1)])
+            self.assertEqual(index.complete('autor 1', 2), [('Autor 1500', 4), ('Autor 1000', 1)])
+            self.assertEqual(index.complete('autor 09', 2), [('Autor 0999', 3), ('Autor 0900', 1)])
+
+    def test_lookup_is_fast(self):
+        index = PrefixIndex(f'Autor {number:05d} Nazwisko{number % 97}' for number in range(50000))
+        for prefix in ('nazwisko4', 'a', 'autor 0001'):
+            started = time.perf_counter()
+            for _ in range(1000):
+                index.complete(prefix, 10)
+            self.assertLess((time.perf_counter() - started) / 1000, 0.001, prefix)
+
+
+class SuggestionsTestCase(AppTestCase):
+
+    def suggest(self, field, prefix):
+        response = self.client.get(f'/api/v1/podpowiedzi/{field}', query_string={'q': prefix})
+        self.assertEqual(response.status_code, 200)
+        return [(item['wartosc'], item['liczba']) for item in response.json['items']]
+
+    def test_unknown_field(self):
+        self.assertEqual(self.client.get('/api/v1/podpowiedzi/oprawa?q=t').status_code, 404)
+
+    def test_requires_login(self):
+        with self.client.session_transaction() as session:
+            session.clear()
+        self.assertEqual(self.client.get('/api/v1/podpowiedzi/autor?q=p').status_code, 401)
+
+    def test_values_are_unescaped(self):
+        self.add(tytul='Tom & Jerry')
+        self.assertEqual(self.suggest('tytul', 'tom &'), [('Tom & Jerry', 1)])
+
+    def test_follows_writes_without_reloading(self):
+        first = self.add()
+        self.assertEqual(self.suggest('autor', 'pru'), [('Bolesław Prus', 1)])
+
+        with mock.patch.object(Suggestions, '_load') as load:
+            second = self.add(autor='Stanisław Lem', seria='Fantastyka')
+            self.client.patch(f'/api/v1/ksiazki/{first}', json={'autor': 'Stanisław Lem'})
+            self.assertEqual(self.suggest('autor', 'pru'), [])
+            self.assertEqual(self.suggest('autor', 'stanislaw'), [('Stanisław Lem', 2)])
+            self.client.delete(f'/api/v1/ksiazki/{second}')
+            self.assertEqual(self.suggest('autor', 'lem'), [('Stanisław Lem', 1)])
+            self.assertEqual(self.suggest('seria', 'k'), [('Klasyka', 1)])
+        load.assert_not_called()
+
+    def test_warm_survives_missing_database(self):
+        suggestions = self.app.extensions['suggestions']
+        with self.app.app_context(), self.assertLogs('suggest', 'WARNING'), \
+                mock.patch.object(db.backend(self.app), 'connect', side_effect=db.Error('brak połączenia')):
+            suggestions.warm()
+        self.assertIsNone(suggestions.last_change)
+
+    def test_picks_up_writes_of_other_workers_from_the_change_numbers(self):
+        first = self.add()
+        self.assertEqual(self.suggest('autor', 'pru'), [('Bolesław Prus', 1)])
+        catalog_cache = self.app.extensions['catalog_cache']
+
+        # unchanged generation: answered without a query
+        with mock.patch('changes.fetch_changes') as fetch_changes:
+            self.suggest('autor', 'pru')
+        fetch_changes.assert_not_called()
+
+        with mock.patch.object(Suggestions, '_load') as load:
+            # another worker's write: committed with a change number, announced only by the shared generation
+            with self.app.app_context():
+                books.update_book(first, [{**BOOK, 'autor': 'Stanisław Lem'}[field] for field in BOOK])
+                db.commit()
+            catalog_cache.backend.incr(catalog_cache.GENERATION_KEY)
+            # a write in this worker right after must not hide it
+            self.add(autor='Olga Tokarczuk')
+            self.assertEqual(self.suggest('autor', 'pru'), [])
+            self.assertEqual(self.suggest('autor', 'lem'), [('Stanisław Lem', 1)])
+            self.assertEqual(self.suggest('autor', 'tok'), [('Olga Tokarczuk', 1)])
+        load.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
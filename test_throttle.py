@@ -0,0 +1,122 @@
+import unittest
+from unittest import mock
+
+import app as app_module
+import db
+import migrate
+from app import create_app
+from cache import LocalRedis, MemoryCache, SharedCache
+from throttle import REJECTED, Throttle
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class ThrottleTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.throttle = Throttle(MemoryCache(), backoff_after=3, backoff_base=2.0, backoff_max=60, clock=self.clock)
+
+    def test_bucket_refills_over_its_period(self):
+        for _ in range(3):
+            self.assertEqual(self.throttle.take([('ip:1', 3, 60)]), 0)
+        self.assertAlmostEqual(self.throttle.take([('ip:1', 3, 60)]), 20.0)
+        self.assertEqual(self.throttle.take([('ip:2', 3, 60)]), 0)
+
+        self.clock.now += 20
+        self.assertEqual(self.throttle.take([('ip:1', 3, 60)]), 0)
+        self.assertGreater(self.throttle.take([('ip:1', 3, 60)]), 0)
+
+    def test_rejection_spends_no_token(self):
+        self.assertEqual(self.throttle.take([('konto:jan', 1, 60)]), 0)
+        self.assertEqual(self.throttle.take([('ip:1', 2, 60), ('konto:jan', 1, 60)]), 60)
+        self.assertEqual(self.throttle.take([('ip:1', 2, 60), ('konto:anna', 1, 60)]), 0)
+        self.assertEqual(self.throttle.take([('ip:1', 2, 60), ('konto:ewa', 1, 60)]), 0)
+        self.assertEqual(self.throttle.take([('ip:1', 2, 60), ('konto:ola', 1, 60)]), 30)
+
+    def test_backoff_doubles_and_resets_on_success(self):
+        self.throttle.failure('konto:jan')
+        self.throttle.failure('konto:jan')
+        self.assertEqual(self.throttle.blocked('konto:jan'), 0)
+        self.throttle.failure('konto:jan')
+        self.assertEqual(self.throttle.blocked('konto:jan'), 2.0)
+        self.throttle.failure('konto:jan')
+        self.assertEqual(self.throttle.blocked('konto:jan'), 4.0)
+        for _ in range(10):
+            self.throttle.failure('konto:jan')
+        self.assertEqual(self.throttle.blocked('konto:jan'), 60)
+
+        self.clock.now += 61
+        self.assertEqual(self.throttle.blocked('konto:jan'), 0)
+        self.throttle.success('konto:jan')
+        self.throttle.failure('konto:jan')
+        self.assertEqual(self.throttle.blocked('konto:jan'), 0)
+
+    def test_shared_store(self):
+        throttle = Throttle(SharedCache(LocalRedis(), prefix='test:'), clock=self.clock)
+        self.assertEqual(throttle.take([('ip:1', 1, 10)]), 0)
+        self.assertAlmostEqual(throttle.take([('ip:1', 1, 10)]), 10.0)
+
+
+class LoginThrottleTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app({'DB_BACKEND': 'sqlite', 'DB_PATH': ':memory:', 'SESSION_BACKEND': 'memory',
+                               'MAIL_TRANSPORT': 'memory', 'THROTTLE_LOGIN_IP': (4, 60),
+                               'THROTTLE_LOGIN_ACCOUNT': (3, 60), 'THROTTLE_BACKOFF_AFTER': 10})
+        conn = db.backend(self.app).connect_direct()
+        migrate.upgrade(conn, dialect='sqlite')
+        conn.close()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        self.app.extensions['lifecycle'].shutdown()
+
+    def login(self, name, address='10.0.0.1'):
+        return self.client.post('/login', data={'nazwa_uzytkownika': name, 'haslo': 'Passw0rd',
+                                                'verification_code': '1234'},
+                                environ_base={'REMOTE_ADDR': address})
+
+    def test_rejected_before_any_database_or_hashing_work(self):
+        for _ in range(3):
+            self.assertEqual(self.login('jan').status_code, 200)
+
+        before = REJECTED.value('logowanie', 'limit')
+        with mock.patch.object(app_module, 'find_user') as find_user:
+            response = self.login('jan')
+        find_user.assert_not_called()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers['Retry-After'], '20')
+        self.assertIn('Zbyt wiele prób', response.get_data(as_text=True))
+        self.assertEqual(REJECTED.value('logowanie', 'limit'), before + 1)
+
+        # the rejected attempt spent nothing, so the address still has a token for another account
+        self.assertEqual(self.login('anna').status_code, 200)
+        self.assertEqual(self.login('ewa').status_code, 429)
+        self.assertEqual(self.login('ewa', address='10.0.0.2').status_code, 200)
+
+    def test_repeated_failures_block_the_account(self):
+        self.app.config.update(THROTTLE_LOGIN_ACCOUNT=(100, 60), THROTTLE_LOGIN_IP=(100, 60))
+        self.app.extensions['throttle'].backoff_after = 2
+        self.login('jan')
+        self.assertEqual(self.login('jan', address='10.0.0.2').status_code, 200)
+        response = self.login('jan', address='10.0.0.3')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers['Retry-After'], '1')
+        self.assertGreater(REJECTED.value('logowanie', 'blokada'), 0)
+
+    def test_disabled(self):
+        self.app.config['THROTTLE_ENABLED'] = False
+        for _ in range(6):
+            self.assertEqual(self.login('jan').status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+
+from validators import BOOK_SCHEMA, SEARCH_SCHEMA, USER_SCHEMA
+
+BOOK = {'tytul': 'Lalka', 'autor': 'Bolesław Prus', 'wydawnictwo': 'Gebethner & Wolff', 'seria': 'Brak',
+        'oprawa': 'Twarda', 'rok_wydania': '1890', 'ilosc_stron': '680', 'rzad': '1', 'regal': '2', 'polka': '3'}
+
+
+class SchemaTestCase(unittest.TestCase):
+
+    def test_valid_book_is_escaped_after_validation(self):
+        values, errors = BOOK_SCHEMA.row(BOOK)
+        self.assertEqual(errors, [])
+        self.assertEqual(values[2], 'Gebethner &amp; Wolff')
+
+    def test_all_errors_in_one_pass(self):
+        values, errors = BOOK_SCHEMA.row({**BOOK, 'autor': 'Autor 123', 'ilosc_stron': 'abc', 'polka': '0', 'seria': ''})
+        self.assertIsNone(values)
+        self.assertEqual(errors, ["Brak pól: seria", "Nieprawidłowy autor książki!",
+                                  "Nieprawidłowa liczba stron!", "Nieprawidłowy numer półki!"])
+
+    def test_rows(self):
+        results = BOOK_SCHEMA.rows([BOOK, {**BOOK, 'rok_wydania': '3000'}])
+        self.assertEqual([errors for values, errors in results], [[], ["Niepoprawny rok wydania książki!"]])
+
+    def test_search_fields_are_optional(self):
+        self.assertEqual(SEARCH_SCHEMA.validate({'rok_wydania': '1800-1900'}), [])
+        self.assertEqual(SEARCH_SCHEMA.validate({'rok_wydania': '1800-abc'}), ["Niepoprawny rok wydania książki!"])
+
+    def test_duplicate_messages_are_reported_once(self):
+        errors = USER_SCHEMA.validate({'imie': 'J0hn', 'nazwisko': 'Sm1th', 'numer_telefonu': '668753201',
+                                       'email': 'john@mail.com', 'nazwa_uzytkownika': 'john', 'haslo': 'Passw0rdd'})
+        self.assertEqual(errors, ["Niepoprawne imię lub nazwisko!"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+"""Shared fixture for the tests that run the whole app on an in-memory SQLite database."""
+import unittest
+
+import db
+import migrate
+from app import create_app
+
+BOOK = {'tytul': 'Lalka', 'autor': 'Bolesław Prus', 'wydawnictwo': 'Gebethner', 'seria': 'Klasyka',
+        'oprawa': 'Twarda', 'rok_wydania': '1890', 'ilosc_stron': '700', 'rzad': '1', 'regal': '2', 'polka': '3'}
+
+
+def sqlite_app(config=None, target=None):
+    """create_app on a fresh in-memory database, migrated up to `target` (all migrations by default)."""
+    app = create_app({'DB_BACKEND': 'sqlite', 'DB_PATH': ':memory:', 'SESSION_BACKEND': 'memory',
+                      'MAIL_TRANSPORT': 'memory', **(config or {})})
+    conn = db.backend(app).connect_direct()
+    migrate.upgrade(conn, target=target, dialect='sqlite')
+    conn.close()
+    return app
+
+
+class AppTestCase(unittest.TestCase):
+    """self.app from sqlite_app(self.config) and self.client, a test client that is logged in."""
+
+    config = {}
+
+    def setUp(self):
+        self.app = sqlite_app(self.config)
+        self.client = self.login()
+
+    def tearDown(self):
+        self.app.extensions['lifecycle'].shutdown()
+
+    def login(self):
+        client = self.app.test_client()
+        with client.session_transaction() as session:
+            session['logged_in'] = True
+        return client
+
+    def add(self, **values):
+        response = self.client.post('/api/v1/ksiazki', json={**BOOK, **values})
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.json['id']
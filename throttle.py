@@ -0,0 +1,155 @@
+import math
+import threading
+import time
+
+from flask import current_app, render_template, request
+
+import metrics
+from cache import LocalRedis, MemoryCache, SharedCache, redis
+
+# action -> (template answering a rejected request, config keys of its buckets)
+ACTIONS = {
+    'logowanie': ('login.html', ('THROTTLE_LOGIN_IP', 'THROTTLE_LOGIN_ACCOUNT')),
+    'rejestracja': ('register.html', ('THROTTLE_REGISTER_IP', 'THROTTLE_REGISTER_ACCOUNT')),
+}
+
+REJECTED = metrics.REGISTRY.counter(
+    'biblioteka_throttle_rejected_total', 'Żądania odrzucone przez limity przed haszowaniem hasła.', ('action', 'reason'))
+FAILURES = metrics.REGISTRY.counter(
+    'biblioteka_throttle_failures_total', 'Nieudane próby liczone do progresywnej blokady.', ('action',))
+
+
+class Throttle:
+    """Token buckets and progressive back-off, with state in a MemoryCache or SharedCache.
+
+    A bucket (capacity, period) holds `capacity` tokens and refills completely in `period`
+    seconds. After `backoff_after` failures in a row a key is blocked for backoff_base seconds,
+    doubling with every further failure up to backoff_max; a success clears it.
+    """
+
+    def __init__(self, store, backoff_after=5, backoff_base=1.0, backoff_max=900, clock=time.time):
+        self.store = store
+        self.backoff_after = backoff_after
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.clock = clock
+        # makes the read-modify-write of a bucket atomic within this process; across processes
+        # sharing a backend, racing requests may each spend the same last token
+        self._lock = threading.Lock()
+
+    def blocked(self, key):
+        """Seconds until `key` may try again after too many failures; 0 when it is not blocked."""
+        state = self.store.get('blokada:' + key)
+        return max(0.0, state[1] - self.clock()) if state else 0.0
+
+    def take(self, buckets):
+        """Spends a token from every (key, capacity, period) bucket, or from none of them.
+
+        Returns 0, or the seconds until all of them will have a token again.
+        """
+        with self._lock:
+            now = self.clock()
+            refilled = []
+            wait = 0.0
+            for key, capacity, period in buckets:
+                rate = capacity / period
+                state = self.store.get('kubelek:' + key)
+                tokens, updated = state if state else (capacity, now)
+                tokens = min(capacity, tokens + (now - updated) * rate)
+                if tokens < 1:
+                    wait = max(wait, (1 - tokens) / rate)
+                refilled.append((key, tokens, period))
+            if wait:
+                return wait
+            for key, tokens, period in refilled:
+                # a bucket untouched for `period` is full again, so its entry can expire
+                self.store.set('kubelek:' + key, (tokens - 1, now), ttl=math.ceil(period))
+        return 0.0
+
+    def failure(self, key):
+        with self._lock:
+            state = self.store.get('blokada:' + key)
+            failures, until = state if state else (0, 0.0)
+            failures += 1
+            if failures >= self.backoff_after:
+                until = self.clock() + min(self.backoff_max, self.backoff_base * 2 ** (failures - self.backoff_after))
+            # failures are forgotten after backoff_max seconds without another one
+            self.store.set('blokada:' + key, (failures, until), ttl=math.ceil(self.backoff_max))
+
+    def success(self, key):
+        self.store.delete('blokada:' + key)
+
+
+def create_store(config):
+    backend = config['THROTTLE_BACKEND']
+
+    if backend == 'memory':
+        return MemoryCache(max_entries=config['THROTTLE_MAX_KEYS'], default_ttl=0)
+    if backend == 'local':
+        return SharedCache(LocalRedis(), prefix='biblioteka:limit:')
+    if backend == 'redis':
+        if redis is None:
+            raise RuntimeError("THROTTLE_BACKEND = 'redis' wymaga pakietu redis")
+        return SharedCache(redis.Redis.from_url(config['THROTTLE_REDIS_URL']), prefix='biblioteka:limit:')
+    raise ValueError(f'Nieznany THROTTLE_BACKEND: {backend}')
+
+
+def _keys(action, username):
+    # one bucket per client address and one per account name, whichever address it is tried from
+    return f'{action}:ip:{request.remote_addr}', f'{action}:konto:{username.strip().casefold()}'
+
+
+def reject(action, username):
+    """The response for a request over its limits, or None; costs a few cache lookups and no hashing."""
+    if not current_app.config['THROTTLE_ENABLED']:
+        return None
+    throttle = current_app.extensions['throttle']
+    template, limits = ACTIONS[action]
+    keys = _keys(action, username)
+
+    retry_after = max(throttle.blocked(key) for key in keys)
+    reason = 'blokada'
+    if not retry_after:
+        reason = 'limit'
+        retry_after = throttle.take([(key, *current_app.config[limit]) for key, limit in zip(keys, limits)])
+    if not retry_after:
+        return None
+
+    REJECTED.inc(action, reason)
+    seconds = math.ceil(retry_after)
+    return (render_template(template, error=f"Zbyt wiele prób. Spróbuj ponownie za {seconds} s."),
+            429, {'Retry-After': str(seconds)})
+
+
+def failed(action, username):
+    if current_app.config['THROTTLE_ENABLED']:
+        FAILURES.inc(action)
+        for key in _keys(action, username):
+            current_app.extensions['throttle'].failure(key)
+
+
+def succeeded(action, username):
+    if current_app.config['THROTTLE_ENABLED']:
+        for key in _keys(action, username):
+            current_app.extensions['throttle'].success(key)
+
+
+def init_app(app):
+    app.config.setdefault('THROTTLE_ENABLED', True)
+    app.config.setdefault('THROTTLE_BACKEND', 'memory')
+    app.config.setdefault('THROTTLE_REDIS_URL', app.config.get('CACHE_REDIS_URL'))
+    # bounds the memory an attacker cycling through addresses and names can make us hold
+    app.config.setdefault('THROTTLE_MAX_KEYS', 100000)
+    # (capacity, seconds to refill it)
+    app.config.setdefault('THROTTLE_LOGIN_IP', (20, 60))
+    app.config.setdefault('THROTTLE_LOGIN_ACCOUNT', (5, 60))
+    app.config.setdefault('THROTTLE_REGISTER_IP', (5, 3600))
+    app.config.setdefault('THROTTLE_REGISTER_ACCOUNT', (3, 3600))
+    app.config.setdefault('THROTTLE_BACKOFF_AFTER', 5)
+    app.config.setdefault('THROTTLE_BACKOFF_BASE', 1.0)
+    app.config.setdefault('THROTTLE_BACKOFF_MAX', 900)
+
+    throttle = Throttle(create_store(app.config), app.config['THROTTLE_BACKOFF_AFTER'],
+                        app.config['THROTTLE_BACKOFF_BASE'], app.config['THROTTLE_BACKOFF_MAX'])
+    app.extensions['throttle'] = throttle
+    return throttle
@@ -0,0 +1,37 @@
+from db import get_cursor
+from models import USER_COLUMNS, User, column_list
+
+# what each page actually needs from uzytkownicy
+LOGIN_COLUMNS = ('id', 'haslo', 'verification_code')
+PROFILE_COLUMNS = ('id', 'imie', 'nazwisko', 'numer_telefonu', 'email', 'nazwa_uzytkownika')
+PASSWORD_COLUMNS = ('id', 'haslo')
+
+
+def find_user(nazwa_uzytkownika, columns=USER_COLUMNS):
+    with get_cursor() as cursor:
+        query = f"SELECT {column_list(columns)} FROM uzytkownicy WHERE nazwa_uzytkownika = %s"
+        values = (nazwa_uzytkownika,)
+        cursor.execute(query, values)
+        return User.from_row(cursor.fetchone(), columns)
+
+
+def insert_user(imie, nazwisko, numer_telefonu, email, nazwa_uzytkownika, haslo, verification_code):
+    with get_cursor() as cursor:
+        query = "INSERT INTO uzytkownicy (imie, nazwisko, numer_telefonu, email, nazwa_uzytkownika, haslo, verification_code) VALUES (%s, %s, %s, %s, %s, %s, %s)"
+        values = (imie, nazwisko, numer_telefonu, email, nazwa_uzytkownika, haslo, verification_code)
+        cursor.execute(query, values)
+        return cursor.lastrowid
+
+
+def update_password(user_id, haslo):
+    with get_cursor() as cursor:
+        query = "UPDATE uzytkownicy SET haslo = %s WHERE id = %s"
+        values = (haslo, user_id)
+        cursor.execute(query, values)
+
+
+def update_profile(nazwa_uzytkownika, imie, nazwisko, numer_telefonu, email):
+    with get_cursor() as cursor:
+        query = "UPDATE uzytkownicy SET imie = %s, nazwisko = %s, numer_telefonu = %s, email = %s WHERE nazwa_uzytkownika = %s"
+        values = (imie, nazwisko, numer_telefonu, email, nazwa_uzytkownika)
+        cursor.execute(query, values)
@@ -0,0 +1,180 @@
+import re
+from datetime import date
+from html import escape
+
+from search import split_range
+
+BOOK_FIELDS = ('tytul', 'autor', 'wydawnictwo', 'seria', 'oprawa', 'rok_wydania', 'ilosc_stron', 'rzad', 'regal', 'polka')
+
+NAME_PATTERN = re.compile(r'[A-Za-zęĘóÓąĄśŚłŁżŻźŹćĆńŃ]+')
+TEXT_PATTERN = re.compile(r'[A-Za-z\s.,ęĘóÓąĄśŚłŁżŻźŹćĆńŃ]+')
+PHONE_PATTERN = re.compile(r'\d{9}')
+EMAIL_PATTERN = re.compile(r'[\w\.-]+@[\w\.-]+\.\w+')
+PASSWORD_PATTERN = re.compile(r'(?=.*[a-z])(?=.*[A-Z])(?=.*\d).{8,}')
+ESCAPE_PATTERN = re.compile(r'[&<>"\']')
+
+def validate_name(name):
+    return NAME_PATTERN.fullmatch(name) is not None
+
+def validate(name):
+    return TEXT_PATTERN.fullmatch(name) is not None
+
+def validate_phone_number(number):
+    return PHONE_PATTERN.fullmatch(number) is not None
+
+def validate_email(email):
+    return EMAIL_PATTERN.fullmatch(email) is not None
+
+def validate_password(password):
+    return PASSWORD_PATTERN.fullmatch(password) is not None
+
+def validate_book_year(year_str):
+    try:
+        year = int(year_str)
+        current_year = date.today().year
+        return year > 0 and year <= current_year
+    except ValueError:
+        return False
+
+def validate_positive_number(number_str):
+    try:
+        number = int(number_str)
+        return number > 0
+    except ValueError:
+        return False
+
+def validate_search_range(value, validator):
+    low, high = split_range(value)
+    return all(validator(bound) for bound in (low, high) if bound)
+
+def search_range(validator):
+    return lambda value: validate_search_range(value, validator)
+
+
+class Field:
+    __slots__ = ('name', 'check', 'message', 'required')
+
+    def __init__(self, name, check=None, message=None, required=True):
+        self.name = name
+        self.check = check
+        self.message = message
+        self.required = required
+
+
+class Schema:
+    """Declarative field checks; one pass collects every error for a payload.
+
+    Values are validated as submitted and HTML-escaped afterwards, which is
+    how they are stored in the database.
+    """
+
+    def __init__(self, *fields, strip=False):
+        self.fields = fields
+        self.names = tuple(field.name for field in fields)
+        self.strip = strip
+
+    def _check(self, data):
+        values = []
+        errors = []
+        missing = []
+
+        for field in self.fields:
+            value = data.get(field.name)
+            if value is None:
+                value = ''
+            elif not isinstance(value, str):
+                value = str(value)
+            if self.strip:
+                value = value.strip()
+
+            if not value:
+                if field.required:
+                    missing.append(field.name)
+            elif field.check is not None and not field.check(value) and field.message not in errors:
+                errors.append(field.message)
+            # most values contain nothing to escape; skip the five str.replace calls for those
+            values.append(escape(value) if ESCAPE_PATTERN.search(value) else value)
+
+        if missing:
+            errors.insert(0, "Brak pól: " + ", ".join(missing))
+        return values, errors
+
+    def clean(self, data):
+        values, errors = self._check(data)
+        if errors:
+            return None, errors
+        return dict(zip(self.names, values)), errors
+
+    def validate(self, data):
+        return self._check(data)[1]
+
+    def row(self, data):
+        values, errors = self._check(data)
+        if errors:
+            return None, errors
+        return tuple(values), errors
+
+    def rows(self, records):
+        return [self.row(record) for record in records]
+
+    def partial(self, names):
+        """The same checks restricted to `names`, e.g. for changing a few fields of many books."""
+        return Schema(*(field for field in self.fields if field.name in names), strip=self.strip)
+
+
+BOOK_SCHEMA = Schema(
+    Field('tytul'),
+    Field('autor', validate, "Nieprawidłowy autor książki!"),
+    Field('wydawnictwo'),
+    Field('seria'),
+    Field('oprawa', validate_name, "Nieprawidłowy rodzaj oprawy książki!"),
+    Field('rok_wydania', validate_book_year, "Niepoprawny rok wydania książki!"),
+    Field('ilosc_stron', validate_positive_number, "Nieprawidłowa liczba stron!"),
+    Field('rzad', validate_positive_number, "Nieprawidłowy numer rzędu!"),
+    Field('regal', validate_positive_number, "Nieprawidłowy numer regału!"),
+    Field('polka', validate_positive_number, "Nieprawidłowy numer półki!"),
+    strip=True,
+)
+
+SEARCH_SCHEMA = Schema(
+    Field('tytul', required=False),
+    Field('autor', validate, "Nieprawidłowy autor książki!", required=False),
+    Field('wydawnictwo', required=False),
+    Field('seria', required=False),
+    Field('oprawa', validate_name, "Nieprawidłowy rodzaj oprawy książki!", required=False),
+    Field('rok_wydania', search_range(validate_book_year), "Niepoprawny rok wydania książki!", required=False),
+    Field('ilosc_stron', search_range(validate_positive_number), "Nieprawidłowa liczba stron!", required=False),
+    Field('rzad', search_range(validate_positive_number), "Nieprawidłowy numer rzędu!", required=False),
+    Field('regal', search_range(validate_positive_number), "Nieprawidłowy numer regału!", required=False),
+    Field('polka', search_range(validate_positive_number), "Nieprawidłowy numer półki!", required=False),
+)
+
+LOCATION_SCHEMA = Schema(
+    Field('rzad', search_range(validate_positive_number), "Nieprawidłowy numer rzędu!", required=False),
+    Field('regal', search_range(validate_positive_number), "Nieprawidłowy numer regału!", required=False),
+    Field('polka', search_range(validate_positive_number), "Nieprawidłowy numer półki!", required=False),
+)
+
+PROFILE_SCHEMA = Schema(
+    Field('imie', validate_name, "Niepoprawne imię lub nazwisko!"),
+    Field('nazwisko', validate_name, "Niepoprawne imię lub nazwisko!"),
+    Field('numer_telefonu', validate_phone_number, "Niepoprawny numer telefonu!"),
+    Field('email', validate_email, "Niepoprawny adres email!"),
+    Field('nazwa_uzytkownika'),
+)
+
+USER_SCHEMA = Schema(
+    *PROFILE_SCHEMA.fields,
+    Field('haslo', validate_password, "Niepoprawne hasło! Powinno posiadać conajmniej 8 znaków, w tym przynajmniej jedną małą literę, dużą literę oraz cyfrę."),
+)
+
+PASSWORD_SCHEMA = Schema(
+    Field('stare_haslo', validate_password, "Niepoprawne stare hasło! Powinno posiadać co najmniej 8 znaków, w tym przynajmniej jedną małą literę, dużą literę oraz cyfrę."),
+    Field('nowe_haslo', validate_password, "Niepoprawne nowe hasło! Powinno posiadać co najmniej 8 znaków, w tym przynajmniej jedną małą literę, dużą literę oraz cyfrę."),
+)
+
+def validate_book(book):
+    return BOOK_SCHEMA.validate(book)
+
+def validate_search(criteria):
+    return SEARCH_SCHEMA.validate(criteria)
@@ -0,0 +1,26 @@
+"""Production entry point: one application per worker process.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Settings come from the environment (SECRET_KEY, DB_*, CACHE_*, SESSION_*,
+MAIL_TRANSPORT, ...). More than one worker needs CACHE_BACKEND = 'redis'
+and THROTTLE_BACKEND = 'redis'; gunicorn.conf.py starts one per core only
+then, and a single worker otherwise. Database pools, the password hashing
+pool and the mail thread are opened lazily in each worker, so the app can
+be preloaded in the master before forking. Set SECRET_KEY whenever more
+than one process serves the app.
+
+With SUGGEST_WARM (on by default) the typeahead index is built here, so
+preloaded workers inherit it instead of each reading the whole catalog.
+The master's connection is closed afterwards, and a database that cannot
+be reached only postpones the index to the first request.
+"""
+from app import create_app
+
+app = application = create_app()
+
+if app.config['SUGGEST_WARM']:
+    with app.app_context():
+        app.extensions['suggestions'].warm()
+    # the workers open connections of their own after the fork
+    app.extensions['db'].close()